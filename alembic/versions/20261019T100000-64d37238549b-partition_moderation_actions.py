@@ -0,0 +1,177 @@
+"""Partition moderation actions by timestamp
+
+Revision ID: 64d37238549b
+Revises: 91a4a0ccfc81
+Create Date: 2026-10-19 10:00:00.000000
+
+On PostgreSQL `moderation_actions` becomes a table range-partitioned by month on
+`timestamp`, with a default partition catching anything outside the monthly ranges.
+Partitioned tables need the partition key in every unique constraint, so the primary
+key becomes `(id, timestamp)` and the foreign keys from the temporary and linked action
+tables are dropped; the ORM still joins on `id` alone.
+
+Every dialect gets `moderation_actions_archive`, which receives partitions once they
+are older than the configured age.
+
+"""
+
+import enum
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, Text, text
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "64d37238549b"
+down_revision = "91a4a0ccfc81"
+branch_labels = None
+depends_on = None
+
+
+@enum.unique
+class ActionType(enum.Enum):
+    """Enum at the time the migration was written"""
+
+    TEMPMUTE = enum.auto()
+    TIMEOUT = enum.auto()
+    MUTE = enum.auto()
+    UNMUTE = enum.auto()
+    WARN = enum.auto()
+    REMOVE_WARN = enum.auto()
+    AUTOWARN = enum.auto()
+    REMOVE_AUTOWARN = enum.auto()
+    AUTOMUTE = enum.auto()
+    REMOVE_AUTOMUTE = enum.auto()
+    KICK = enum.auto()
+    TEMPBAN = enum.auto()
+    BAN = enum.auto()
+    UNBAN = enum.auto()
+
+
+FOREIGN_KEYS = [
+    ("moderation_temporary_actions", "moderation_temporary_actions_id_fkey", "id"),
+    ("moderation_linked_actions", "moderation_linked_actions_id_fkey", "id"),
+    (
+        "moderation_linked_actions",
+        "moderation_linked_actions_linked_id_fkey",
+        "linked_id",
+    ),
+]
+
+
+def months(start: datetime, end: datetime):
+    """Yield the bounds of each month from the one containing `start` to `end`."""
+    month = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month <= end:
+        following = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+        yield month, following
+        month = following
+
+
+def upgrade():
+    op.create_table(
+        "moderation_actions_archive",
+        Column("id", Integer, primary_key=True, nullable=False),
+        Column("timestamp", DateTime, nullable=False),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("moderator_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column(
+            "action",
+            # The type already exists on PostgreSQL, so must not be created again
+            Enum(ActionType).with_variant(
+                postgresql.ENUM(name="actiontype", create_type=False), "postgresql"
+            ),
+            nullable=False,
+        ),
+        Column("reason", Text, nullable=True),
+    )
+
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    for table, constraint, _ in FOREIGN_KEYS:
+        op.drop_constraint(constraint, table, type_="foreignkey")
+
+    op.rename_table("moderation_actions", "moderation_actions_unpartitioned")
+    op.execute(
+        "ALTER TABLE moderation_actions_unpartitioned "
+        "RENAME CONSTRAINT moderation_actions_pkey "
+        "TO moderation_actions_unpartitioned_pkey"
+    )
+    op.execute("""
+        CREATE TABLE moderation_actions (
+            id INTEGER NOT NULL DEFAULT nextval('moderation_actions_id_seq'),
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            moderator_id INTEGER NOT NULL REFERENCES users (id),
+            action actiontype NOT NULL,
+            reason TEXT,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+        """)
+    # The sequence is owned by the old table, and would be dropped along with it
+    op.execute(
+        "ALTER SEQUENCE moderation_actions_id_seq OWNED BY moderation_actions.id"
+    )
+    op.execute(
+        "CREATE TABLE moderation_actions_default PARTITION OF moderation_actions DEFAULT"
+    )
+
+    oldest = bind.execute(
+        text("SELECT min(timestamp) FROM moderation_actions_unpartitioned")
+    ).scalar()
+    now = datetime.utcnow()
+    # Create partitions up to three months ahead; maintenance keeps that window moving
+    ahead = datetime(now.year + (now.month + 2) // 12, (now.month + 2) % 12 + 1, 1)
+    for start, end in months(oldest or now, ahead):
+        name = f"moderation_actions_y{start.year}m{start.month:02}"
+        op.execute(
+            f"CREATE TABLE {name} PARTITION OF moderation_actions "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+
+    op.execute(
+        "INSERT INTO moderation_actions SELECT * FROM moderation_actions_unpartitioned"
+    )
+    op.drop_table("moderation_actions_unpartitioned")
+    op.create_index(
+        "ix_moderation_actions_user_id_action",
+        "moderation_actions",
+        ["user_id", "action"],
+    )
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.rename_table("moderation_actions", "moderation_actions_partitioned")
+        op.execute("""
+            CREATE TABLE moderation_actions (
+                id INTEGER NOT NULL DEFAULT nextval('moderation_actions_id_seq'),
+                timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                user_id INTEGER NOT NULL REFERENCES users (id),
+                moderator_id INTEGER NOT NULL REFERENCES users (id),
+                action actiontype NOT NULL,
+                reason TEXT
+            )
+            """)
+        op.execute(
+            "ALTER SEQUENCE moderation_actions_id_seq OWNED BY moderation_actions.id"
+        )
+        op.execute(
+            "INSERT INTO moderation_actions "
+            "SELECT * FROM moderation_actions_partitioned "
+            "UNION ALL SELECT * FROM moderation_actions_archive"
+        )
+        # Dropping a partitioned table drops all of its partitions too
+        op.drop_table("moderation_actions_partitioned")
+        op.create_primary_key("moderation_actions_pkey", "moderation_actions", ["id"])
+        for table, constraint, column in FOREIGN_KEYS:
+            op.create_foreign_key(
+                constraint, table, "moderation_actions", [column], ["id"]
+            )
+
+    op.drop_table("moderation_actions_archive")
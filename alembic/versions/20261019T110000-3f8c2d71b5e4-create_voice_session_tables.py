@@ -0,0 +1,47 @@
+"""Create voice session tables
+
+Revision ID: 3f8c2d71b5e4
+Revises: 64d37238549b
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+
+from sqlalchemy import BigInteger, Column, Date, DateTime, ForeignKey, Integer
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3f8c2d71b5e4"
+down_revision = "64d37238549b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "voice_sessions",
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("channel_id", BigInteger, nullable=False),
+        Column("started_at", DateTime, nullable=False),
+        Column("ended_at", DateTime, nullable=False),
+    )
+    op.create_index(
+        "ix_voice_sessions_user_id_started_at",
+        "voice_sessions",
+        ["user_id", "started_at"],
+    )
+    op.create_table(
+        "voice_daily_aggregates",
+        Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+        Column("day", Date, primary_key=True),
+        Column("channel_id", BigInteger, primary_key=True),
+        Column("seconds", Integer, nullable=False),
+        Column("sessions", Integer, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("voice_daily_aggregates")
+    op.drop_index("ix_voice_sessions_user_id_started_at", "voice_sessions")
+    op.drop_table("voice_sessions")
@@ -0,0 +1,36 @@
+"""Create avatar history table
+
+Revision ID: 8b1e5a0c9d27
+Revises: 3f8c2d71b5e4
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8b1e5a0c9d27"
+down_revision = "3f8c2d71b5e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "avatar_history",
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("seen_at", DateTime, nullable=False),
+        Column("digest", String(length=64), nullable=False),
+        Column("extension", String(length=8), nullable=False),
+    )
+    op.create_index(
+        "ix_avatar_history_user_id_seen_at", "avatar_history", ["user_id", "seen_at"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_avatar_history_user_id_seen_at", "avatar_history")
+    op.drop_table("avatar_history")
@@ -0,0 +1,52 @@
+"""Add guild settings and the guild of moderation actions
+
+Revision ID: c4a7e2d91f36
+Revises: 8b1e5a0c9d27
+Create Date: 2026-10-19 13:00:00.000000
+
+Existing moderation actions are left with a null guild, which is read as the home
+guild, the only one there was when they were taken.
+
+"""
+
+import sqlalchemy as sa
+from sqlalchemy import JSON, BigInteger, Column, DateTime
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c4a7e2d91f36"
+down_revision = "8b1e5a0c9d27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "guild_settings",
+        Column("guild_id", BigInteger, primary_key=True, autoincrement=False),
+        Column("exec_roles", JSON, nullable=True),
+        Column("muted_role", BigInteger, nullable=True),
+        Column("lockdown_extra_roles", JSON, nullable=True),
+        Column("log_channels", JSON, nullable=True),
+        Column("forbidden_words", JSON, nullable=True),
+        Column(
+            "updated_at",
+            DateTime,
+            nullable=False,
+            server_default=sa.func.current_timestamp(),
+        ),
+    )
+    # On PostgreSQL, adding the column to the partitioned table adds it to every
+    # partition, and it is added last to the archive too, so rows still move
+    # between them column for column
+    op.add_column("moderation_actions", Column("guild_id", BigInteger, nullable=True))
+    op.add_column(
+        "moderation_actions_archive", Column("guild_id", BigInteger, nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column("moderation_actions_archive", "guild_id")
+    op.drop_column("moderation_actions", "guild_id")
+    op.drop_table("guild_settings")
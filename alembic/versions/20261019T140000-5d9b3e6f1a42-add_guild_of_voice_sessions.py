@@ -0,0 +1,33 @@
+"""Add the guild of voice sessions and their daily totals
+
+Revision ID: 5d9b3e6f1a42
+Revises: c4a7e2d91f36
+Create Date: 2026-10-19 14:00:00.000000
+
+Existing sessions and totals are left with a null guild, which is read as the home
+guild, as for moderation actions. The guild is not added to the primary key of the
+totals, as channel IDs are already unique across guilds.
+
+"""
+
+from sqlalchemy import BigInteger, Column
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5d9b3e6f1a42"
+down_revision = "c4a7e2d91f36"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("voice_sessions", Column("guild_id", BigInteger, nullable=True))
+    op.add_column(
+        "voice_daily_aggregates", Column("guild_id", BigInteger, nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column("voice_daily_aggregates", "guild_id")
+    op.drop_column("voice_sessions", "guild_id")
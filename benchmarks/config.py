@@ -0,0 +1,44 @@
+"""Time per-event configuration lookups through confuse and through the snapshot.
+
+Run from the repository root with `python -m benchmarks.config`, with the
+configuration files in place.
+"""
+
+from timeit import timeit
+
+from config import CONFIG, snapshot
+
+EVENTS = 20_000
+
+
+def confuse_lookups():
+    # What a logged event and an automod check used to read per message
+    section = CONFIG["discord_logging"]["voice_join"]
+    channels = CONFIG["discord_logging"]["channels"]
+    channel_id = channels[section["channel"].get(str)].get(int)
+    title = section["head"].get(str)
+    description = section["desc"].get(str)
+    colour = section["colour"].get(int)
+    footer = CONFIG["discord_logging"]["footer"].get(str)
+    words = CONFIG["forbidden_words"].as_str_seq()
+    return channel_id, title, description, colour, footer, words
+
+
+def snapshot_lookups():
+    config = snapshot()
+    channel_id, title, description, colour = config.logging.sections["voice_join"]
+    footer = config.logging.footer
+    words = config.forbidden_words
+    return channel_id, title, description, colour, footer, words
+
+
+def main():
+    old, new = confuse_lookups(), snapshot_lookups()
+    assert old[:5] == new[:5] and list(old[5]) == list(new[5])
+    for name, lookups in (("confuse", confuse_lookups), ("snapshot", snapshot_lookups)):
+        seconds = timeit(lookups, number=EVENTS)
+        print(f"{name:>8}: {seconds / EVENTS * 1e6:8.2f} µs per event")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Time parsing the times moderators give tempmute and tempban, before and after the
+fast paths.
+
+Run from the repository root with `python -m benchmarks.datetime_parsing`.
+"""
+
+from timeit import timeit
+
+import dateparser
+
+from utils.DateTimeConverter import (
+    DATEPARSER_SETTINGS,
+    natural_offset,
+    parse_duration,
+    parse_time,
+)
+
+# Inputs as moderators have typed them
+CORPUS = [
+    "1h",
+    "30m",
+    "1d",
+    "2d12h",
+    "1h30m",
+    "10m",
+    "24h",
+    "7d",
+    "3d",
+    "1d 12h",
+    "45s",
+    "12:00",
+    "18:30",
+    "23:59:59",
+    "2021-11-01 12:00",
+    "11-01 09:00",
+    "tomorrow",
+    "in 2 hours",
+    "next friday",
+    "1 week",
+    "3 days",
+    "friday 6pm",
+    "1 Dec 2021",
+    "end of term",
+]
+REPEATS = 20
+
+
+def before(time: str):
+    """The previous parser's cost, which always started with dateparser."""
+    return dateparser.parse(time, settings=DATEPARSER_SETTINGS)
+
+
+def main():
+    # dateparser loads its language data on first use
+    before("tomorrow")
+    parse_time("tomorrow")
+    print(f"{'input':>18} {'before':>10} {'cold':>10} {'memoised':>10}")
+    total_before = total_cold = total_warm = 0.0
+    for time in CORPUS:
+        old = timeit(lambda: before(time), number=REPEATS) / REPEATS
+
+        def cold():
+            parse_duration.cache_clear()
+            natural_offset.cache_clear()
+            parse_time(time)
+
+        new = timeit(cold, number=REPEATS) / REPEATS
+        warm = timeit(lambda: parse_time(time), number=REPEATS) / REPEATS
+        total_before += old
+        total_cold += new
+        total_warm += warm
+        print(f"{time:>18} {old * 1e3:8.3f}ms {new * 1e3:8.3f}ms {warm * 1e3:8.3f}ms")
+    print(
+        f"{'mean':>18} {total_before / len(CORPUS) * 1e3:8.3f}ms "
+        f"{total_cold / len(CORPUS) * 1e3:8.3f}ms "
+        f"{total_warm / len(CORPUS) * 1e3:8.3f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Time rendering message edit diffs, against difflib for comparison.
+
+Run from the repository root with `python -m benchmarks.diff`.
+"""
+
+import difflib
+import random
+import string
+from timeit import timeit
+
+from utils.diff import TOKEN, render_diff
+
+REPEATS = 20
+# difflib is quadratic here, so it is timed fewer times
+DIFFLIB_REPEATS = 3
+
+
+def words(count: int):
+    return [
+        "".join(random.choices(string.ascii_lowercase, k=random.randint(1, 9)))
+        for _ in range(count)
+    ]
+
+
+def edit(text: list, changes: int) -> list:
+    edited = list(text)
+    for _ in range(changes):
+        i = random.randrange(len(edited))
+        edited[i] = random.choice(["", "changed", f"{edited[i]} inserted"])
+    return edited
+
+
+def measure(length: int, changes: int):
+    text = words(length)
+    before = " ".join(text)
+    after = " ".join(edit(text, changes))
+    ours = timeit(lambda: render_diff(before, after), number=REPEATS) / REPEATS
+    theirs = (
+        timeit(
+            lambda: difflib.SequenceMatcher(
+                None, TOKEN.findall(before), TOKEN.findall(after), autojunk=False
+            ).get_opcodes(),
+            number=DIFFLIB_REPEATS,
+        )
+        / DIFFLIB_REPEATS
+    )
+    print(
+        f"{len(before):>7} chars, {changes:>4} changes: "
+        f"{ours * 1000:8.2f} ms render_diff, {theirs * 1000:8.2f} ms difflib"
+    )
+
+
+def main():
+    random.seed(0)
+    for length in (50, 700, 3000):
+        for changes in (1, 10, 200):
+            measure(length, changes)
+
+
+if __name__ == "__main__":
+    main()
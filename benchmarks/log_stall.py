@@ -0,0 +1,83 @@
+"""Measure how long bursts of logging stall the event loop.
+
+Run from the repository root with `python -m benchmarks.log_stall`. Compares handlers
+attached directly to a logger, as `setup_logging` used to, with the queue it uses now.
+Each run logs bursts of records from the loop while a ticker measures how late its
+1 ms sleeps wake up. Writing to a local file is fast, so a second sink stands in for
+stdout piped to a slow consumer, or a file on a slow disk.
+"""
+
+import asyncio
+import atexit
+import io
+import logging
+import tempfile
+import time
+from logging import StreamHandler
+from pathlib import Path
+from statistics import quantiles
+
+from utils.logging import build_handlers, start_queue
+
+RECORDS = 20_000
+BURST = 100
+TICK = 0.001
+FORMATTER = logging.Formatter("{asctime}:{name}:{levelname}:{message}", style="{")
+
+
+class SlowStream(io.StringIO):
+    """A stream that blocks for 50 µs on every write."""
+
+    def write(self, text: str) -> int:
+        time.sleep(50e-6)
+        return super().write(text)
+
+
+async def measure(logger: logging.Logger):
+    loop = asyncio.get_event_loop()
+    lateness = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = loop.time()
+            await asyncio.sleep(TICK)
+            lateness.append(loop.time() - start - TICK)
+
+    task = asyncio.ensure_future(ticker())
+    await asyncio.sleep(TICK)
+    for burst in range(RECORDS // BURST):
+        for i in range(BURST):
+            logger.info("Burst %d record %d: %s", burst, i, "x" * 80)
+        await asyncio.sleep(TICK)
+    done.set()
+    await task
+    return max(lateness), quantiles(lateness, n=100)[98]
+
+
+def run(name: str, handler: logging.Handler):
+    logger = logging.getLogger(f"parnassius.benchmarks.log_stall.{name}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    worst, p99 = asyncio.run(measure(logger))
+    logger.removeHandler(handler)
+    print(f"{name:>20}: worst stall {worst * 1000:7.2f} ms, p99 {p99 * 1000:6.2f} ms")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        file_handler = build_handlers(Path(directory, "a.log"), suffix="%Y_%m_%d")[0]
+        slow_handler = StreamHandler(SlowStream())
+        slow_handler.setFormatter(FORMATTER)
+        for sink, handler in (("file", file_handler), ("slow stream", slow_handler)):
+            run(f"{sink}, direct", handler)
+            queue_handler, listener = start_queue([handler])
+            run(f"{sink}, queued", queue_handler)
+            listener.stop()
+            atexit.unregister(listener.stop)
+        file_handler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""CPU time the bot's process spends sending log embeds and journalling messages.
+
+Run from the repository root with `python -m benchmarks.log_worker`. Logs bursts of
+message events, each an embed and a message to journal, first sent and written in
+the bot's process as by default, then handed to a worker process over a Unix socket.
+Discord is replaced by a local HTTP server in a process of its own, so the requests
+are made with aiohttp much as discord.py makes them, less TLS. The events are built
+beforehand, so the difference is the cost of the sends and journal writes themselves.
+"""
+
+import asyncio
+import multiprocessing
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+from discord import Embed
+
+import utils.log_worker
+from utils.log_dispatcher import LogDispatcher
+from utils.log_worker import (
+    LogWorker,
+    RemoteDispatcher,
+    RemoteJournal,
+    WorkerConnection,
+)
+from utils.message_journal import MessageJournal
+from utils.message_store import StoredMessage
+
+EVENTS = 20_000
+BURST = 100
+CHANNELS = (1, 2, 3)
+
+
+def discord_stub(ports: multiprocessing.Queue):
+    async def create_message(request: web.Request) -> web.Response:
+        await request.read()
+        return web.json_response({})
+
+    async def run():
+        app = web.Application()
+        app.router.add_post("/channels/{channel_id}/messages", create_message)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        ports.put(site._server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+class LocalHTTP:
+    """Stands in for discord.py's HTTP client, sending to the local server."""
+
+    def __init__(self, port: int):
+        self.base = f"http://127.0.0.1:{port}"
+        self.session = None
+        self.sent = 0
+
+    async def request(self, route, json=None):
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        url = f"{self.base}/channels/{route.channel_id}/messages"
+        async with self.session.post(url, json=json) as response:
+            await response.read()
+        self.sent += len(json["embeds"])
+
+
+def dispatcher(http: LocalHTTP) -> LogDispatcher:
+    return LogDispatcher(http, queue_size=EVENTS, linger=0)
+
+
+def journal(directory: Path) -> MessageJournal:
+    return MessageJournal(directory, retention_days=1, flush_interval=0.05)
+
+
+def event(i: int):
+    content = f"Message {i} " + "lorem ipsum " * 20
+    embed = Embed(
+        title="**Message deleted in #general**",
+        description=f"<@{10**17 + i}>\n{content}",
+        colour=0xFF0000,
+    )
+    embed.set_author(name=f"member{i}#0001", icon_url="https://cdn.example/a.png")
+    embed.set_footer(text=f"ID: {10**17 + i}")
+    embed.timestamp = datetime.utcnow()
+    return CHANNELS[i % len(CHANNELS)], embed, StoredMessage(i, 1, i, content)
+
+
+async def produce(events, enqueue, record):
+    for start in range(0, EVENTS, BURST):
+        for channel_id, embed, message in events[start : start + BURST]:
+            enqueue(channel_id, embed)
+            record(message)
+        await asyncio.sleep(0.001)
+
+
+async def in_process(directory: Path, port: int) -> float:
+    events = [event(i) for i in range(EVENTS)]
+    http = LocalHTTP(port)
+    sends, writes = dispatcher(http), journal(directory)
+    writes.start()
+    start = time.process_time()
+    await produce(events, sends.enqueue, writes.record)
+    while http.sent < EVENTS:
+        await asyncio.sleep(0.01)
+    writes.close()
+    elapsed = time.process_time() - start
+    sends.close()
+    await http.session.close()
+    return elapsed
+
+
+def serve(path: Path, directory: Path, port: int):
+    async def run():
+        utils.log_worker.STATS_INTERVAL = 0.05
+        writes = journal(directory)
+        writes.start()
+        await LogWorker(dispatcher(LocalHTTP(port)), writes).serve(
+            path, asyncio.Event()
+        )
+
+    asyncio.run(run())
+
+
+async def with_worker(directory: Path, port: int) -> float:
+    events = [event(i) for i in range(EVENTS)]
+    path = directory / "worker.sock"
+    worker = multiprocessing.Process(
+        target=serve, args=(path, directory, port), daemon=True
+    )
+    worker.start()
+    while not path.exists():
+        await asyncio.sleep(0.01)
+    connections = [WorkerConnection(path, max_buffer=2**30)]
+    sends = RemoteDispatcher(connections)
+    writes = RemoteJournal(connections, journal(directory))
+    start = time.process_time()
+    await produce(events, sends.enqueue, writes.record)
+    while sum(s.sent_embeds for _, s in sends.stats().values()) < EVENTS:
+        await asyncio.sleep(0.01)
+    elapsed = time.process_time() - start
+    sends.close()
+    worker.terminate()
+    worker.join()
+    return elapsed
+
+
+def main():
+    ports = multiprocessing.Queue()
+    stub = multiprocessing.Process(target=discord_stub, args=(ports,), daemon=True)
+    stub.start()
+    port = ports.get()
+    print(f"{EVENTS} events, CPU time of the bot's process")
+    for name, measure in (("in process", in_process), ("worker", with_worker)):
+        with tempfile.TemporaryDirectory() as directory:
+            elapsed = asyncio.run(measure(Path(directory), port))
+        print(f"{name:>10}: {elapsed:.2f}s, {elapsed / EVENTS * 1e6:.0f} µs per event")
+    stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
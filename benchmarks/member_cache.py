@@ -0,0 +1,145 @@
+"""Memory and time to start with a simulated 100k-member guild, by cache policy.
+
+`all` chunks the guild as discord.py does by default, receiving every member in
+chunks of 1000 and keeping them all, all before the bot is ready. `active` does not
+chunk, so is ready at once, and keeps the authors of a day of simulated messages in
+`RecentMembers`, as `cogs.member_cache` does. Its time is that of handling the
+messages' authors over the day, most of it discord.py building them.
+
+Run from the repository root with `python -m benchmarks.member_cache`.
+"""
+
+import asyncio
+import random
+import tracemalloc
+from time import perf_counter
+
+from discord import Guild, Intents, Member, MemberCacheFlags
+from discord.state import ChunkRequest, ConnectionState
+
+from utils.member_cache import RecentMembers
+
+GUILD_ID = 1
+MEMBERS = 100_000
+CHUNK = 1000
+# Messages in the simulated day, by authors picked with a long tail
+MESSAGES = 50_000
+ACTIVE = 20_000
+CAPACITY = 5000
+
+
+def member_data(i: int) -> dict:
+    return {
+        "user": {
+            "id": str(10**17 + i),
+            "username": f"member{i}",
+            "discriminator": f"{i % 10000:04}",
+            "avatar": None,
+        },
+        "roles": [],
+        "joined_at": "2021-10-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "nick": None,
+    }
+
+
+def guild_data() -> dict:
+    everyone = {
+        "id": str(GUILD_ID),
+        "name": "@everyone",
+        "permissions": "0",
+        "position": 0,
+        "color": 0,
+        "hoist": False,
+        "managed": False,
+        "mentionable": False,
+    }
+    return {
+        "id": str(GUILD_ID),
+        "name": "Simulated",
+        "member_count": MEMBERS,
+        "large": True,
+        "members": [],
+        "channels": [],
+        "roles": [everyone],
+        "voice_states": [],
+    }
+
+
+def connection(loop, flags: MemberCacheFlags) -> ConnectionState:
+    intents = Intents.default()
+    intents.members = True
+    return ConnectionState(
+        dispatch=lambda *args: None,
+        handlers={},
+        hooks={},
+        syncer=None,
+        http=None,
+        loop=loop,
+        intents=intents,
+        member_cache_flags=flags,
+        chunk_guilds_at_startup=False,
+    )
+
+
+def chunked(loop) -> Guild:
+    state = connection(loop, MemberCacheFlags(online=False, joined=True, voice=True))
+    guild = Guild(data=guild_data(), state=state)
+    state._add_guild(guild)
+    request = ChunkRequest(GUILD_ID, loop, state._get_guild, cache=True)
+    state._chunk_requests[request.nonce] = request
+    count = MEMBERS // CHUNK
+    for index in range(count):
+        state.parse_guild_members_chunk(
+            {
+                "guild_id": str(GUILD_ID),
+                "members": [
+                    member_data(i) for i in range(index * CHUNK, (index + 1) * CHUNK)
+                ],
+                "chunk_index": index,
+                "chunk_count": count,
+                "nonce": request.nonce,
+            }
+        )
+    return guild
+
+
+def active(loop) -> Guild:
+    state = connection(loop, MemberCacheFlags(online=False, joined=False, voice=True))
+    guild = Guild(data=guild_data(), state=state)
+    state._add_guild(guild)
+    recent = RecentMembers(guild, CAPACITY)
+    authors = random.Random(0)
+    for _ in range(MESSAGES):
+        # Most messages come from a few of the members who are active at all
+        i = int(ACTIVE * authors.random() ** 3)
+        # discord.py builds each message's author from the message's data
+        recent.touch(Member(data=member_data(i), guild=guild, state=state))
+    return guild
+
+
+def measure(name, build, loop):
+    tracemalloc.start()
+    start = perf_counter()
+    guild = build(loop)
+    elapsed = perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:>6}: {len(guild._members):>6} members cached, "
+        f"{memory / 2 ** 20:7.1f} MiB, {elapsed:.2f}s"
+    )
+    return guild
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    print(f"Simulated guild of {MEMBERS} members")
+    measure("all", chunked, loop)
+    measure("active", active, loop)
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Measure the memory used per message by `MessageStore`.
+
+Run from the repository root with `python -m benchmarks.message_store`.
+"""
+
+import random
+import string
+import tracemalloc
+from types import SimpleNamespace
+
+from utils.message_store import MessageStore, StoredMessage
+
+MESSAGES = 100_000
+
+
+def fake_message(i: int, content_length: int) -> SimpleNamespace:
+    content = "".join(random.choices(string.ascii_letters + " ", k=content_length))
+    attachments = [SimpleNamespace(url=f"https://cdn.discordapp.com/{i}/a.png")] * (
+        i % 20 == 0
+    )
+    return SimpleNamespace(
+        id=900_000_000_000_000_000 + i,
+        channel=SimpleNamespace(id=800_000_000_000_000_000 + i % 50),
+        author=SimpleNamespace(id=700_000_000_000_000_000 + i % 5000),
+        content=content,
+        attachments=attachments,
+    )
+
+
+def measure(content_length: int):
+    store = MessageStore(max_bytes=2**40)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # Each message is discarded once stored, as discord.py's would be once evicted,
+    # so only what the store keeps alive is counted
+    for i in range(MESSAGES):
+        store.add(StoredMessage.from_message(fake_message(i, content_length)))
+    actual = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(
+        f"content {content_length:>4} chars: "
+        f"{actual / MESSAGES:7.1f} bytes/message measured, "
+        f"{store.bytes / MESSAGES:7.1f} estimated, "
+        f"{actual / MESSAGES - content_length:7.1f} beyond the content"
+    )
+
+
+def main():
+    random.seed(0)
+    for content_length in (0, 40, 200, 2000):
+        measure(content_length)
+
+
+if __name__ == "__main__":
+    main()
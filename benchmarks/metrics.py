@@ -0,0 +1,67 @@
+"""Time the overhead metrics add to each event, and the cost of a scrape.
+
+Run from the repository root with `python -m benchmarks.metrics`.
+"""
+
+import asyncio
+from time import perf_counter
+from timeit import timeit
+
+from cogs.metrics import Metrics
+from utils.metrics import Counter, Histogram, Registry
+
+EVENTS = 200_000
+# Roughly the listeners and cogs in the bot, for the scrape
+COGS = 8
+LISTENERS_PER_COG = 10
+
+
+async def listener(message):
+    return message
+
+
+def time_events(handle) -> float:
+    async def events():
+        for i in range(EVENTS):
+            await handle(i)
+
+    loop = asyncio.new_event_loop()
+    start = perf_counter()
+    loop.run_until_complete(events())
+    elapsed = perf_counter() - start
+    loop.close()
+    return elapsed / EVENTS
+
+
+def main():
+    registry = Registry()
+    seconds = registry.register(Histogram("listener_seconds", "", ["cog", "listener"]))
+    errors = registry.register(Counter("listener_errors", "", ["cog", "listener"]))
+    labels = ("Logging", "on_message")
+    timed = Metrics.timed(listener, seconds.labels(*labels), errors.labels(*labels))
+
+    baseline = min(time_events(listener) for _ in range(3))
+    wrapped = min(time_events(timed) for _ in range(3))
+    print(f"{'undecorated listener':>28}: {baseline * 1e6:6.3f} µs per event")
+    print(
+        f"{'timed listener':>28}: {wrapped * 1e6:6.3f} µs per event, "
+        f"{(wrapped - baseline) * 1e6:6.3f} µs added"
+    )
+    child = seconds.labels(*labels)
+    observe = timeit(lambda: child.observe(0.003), number=EVENTS) / EVENTS
+    print(f"{'histogram observe':>28}: {observe * 1e6:6.3f} µs")
+
+    for cog in range(COGS):
+        for method in range(LISTENERS_PER_COG):
+            seconds.labels(f"Cog{cog}", f"on_event{method}").observe(0.001)
+            errors.labels(f"Cog{cog}", f"on_event{method}")
+    scrape = timeit(registry.render, number=100) / 100
+    size = len(registry.render())
+    print(
+        f"{'scrape':>28}: {scrape * 1000:6.3f} ms for "
+        f"{COGS * LISTENERS_PER_COG} listeners, {size} bytes"
+    )
+
+
+if __name__ == "__main__":
+    main()
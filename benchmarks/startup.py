@@ -0,0 +1,65 @@
+"""Cold start time of the bot, each run in a fresh interpreter.
+
+By default this times importing everything and loading the extensions, which needs
+the database and logging configuration but no connection to Discord. With `--ready`,
+it times `parnassius.py --exit-on-ready` from starting to exiting once connected,
+which needs the bot token configured.
+
+Run from the repository root with `python -m benchmarks.startup [--ready] [--runs N]`.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+
+LOAD = """
+from time import perf_counter
+start = perf_counter()
+import sys
+import parnassius
+parnassius.setup_logging()
+parnassius.load_extensions()
+print(perf_counter() - start, "dateparser" in sys.modules)
+"""
+
+
+def time_load():
+    output = subprocess.run(
+        [sys.executable, "-c", LOAD], capture_output=True, check=True, text=True
+    ).stdout.split()
+    return float(output[-2]), output[-1] == "True"
+
+
+def time_ready():
+    start = perf_counter()
+    subprocess.run(
+        [sys.executable, "parnassius.py", "--exit-on-ready"],
+        capture_output=True,
+        check=True,
+    )
+    return perf_counter() - start, None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ready", action="store_true")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    measure = time_ready if args.ready else time_load
+    times = []
+    for _ in range(args.runs):
+        seconds, imported = measure()
+        times.append(seconds)
+    label = "start to ready" if args.ready else "import and load extensions"
+    print(
+        f"{label}: median {statistics.median(times):.3f}s, "
+        f"min {min(times):.3f}s, max {max(times):.3f}s over {args.runs} runs"
+    )
+    if imported is not None:
+        print(f"dateparser imported while starting: {imported}")
+
+
+if __name__ == "__main__":
+    main()
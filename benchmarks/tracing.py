@@ -0,0 +1,81 @@
+"""Time the overhead of tracing decorators on calls made while handling an event.
+
+Run from the repository root with `python -m benchmarks.tracing`. Logging is at
+INFO throughout, as in production, except where a row says otherwise.
+"""
+
+import asyncio
+import logging
+from timeit import timeit
+
+from AtLog.atlog import log_func
+
+from models import User
+from utils.logging import set_trace_sampling, trace_func
+
+CALLS = 20_000
+# Decorated calls made while logging a single voice join
+CALLS_PER_EVENT = 6
+
+logger = logging.getLogger("parnassius.benchmarks.tracing")
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+
+def handler(user, channel_id, *, reason=None):
+    return channel_id
+
+
+async def async_handler(user, channel_id, *, reason=None):
+    return channel_id
+
+
+def time_calls(decorated, async_decorated) -> float:
+    user = User(id=1, discord_id=2**60, username="user#0001")
+    sync = timeit(lambda: decorated(user, 1, reason="r"), number=CALLS)
+
+    async def calls():
+        for _ in range(CALLS):
+            await async_decorated(user, 1, reason="r")
+
+    loop = asyncio.new_event_loop()
+    start = loop.time()
+    loop.run_until_complete(calls())
+    elapsed = loop.time() - start
+    loop.close()
+    return (sync + elapsed) / (2 * CALLS)
+
+
+def main():
+    logger.setLevel(logging.INFO)
+    baseline = time_calls(handler, async_handler)
+    cases = [
+        ("AtLog log_func", log_func(logger)),
+        ("trace_func, DEBUG not configured", trace_func(logger, enabled=False)),
+        ("trace_func, DEBUG configured, INFO now", trace_func(logger, enabled=True)),
+    ]
+    print(f"{'undecorated':>40}: {baseline * 1e6:7.2f} µs per call")
+    for name, decorator in cases:
+        per_call = max(
+            0.0, time_calls(decorator(handler), decorator(async_handler)) - baseline
+        )
+        print(
+            f"{name:>40}: {per_call * 1e6:7.2f} µs per call, "
+            f"{per_call * CALLS_PER_EVENT * 1e6:7.2f} µs per event added"
+        )
+
+    logger.setLevel(logging.DEBUG)
+    decorator = trace_func(logger, enabled=True)
+    for every in (1, 100):
+        set_trace_sampling(every)
+        per_call = max(
+            0.0, time_calls(decorator(handler), decorator(async_handler)) - baseline
+        )
+        print(
+            f"{f'trace_func at DEBUG, 1 in {every}':>40}: {per_call * 1e6:7.2f} µs "
+            f"per call, {per_call * CALLS_PER_EVENT * 1e6:7.2f} µs per event added"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
 import logging
+import re
 import unicodedata
-from typing import List, Optional
+from functools import lru_cache
+from typing import Optional, Pattern, Tuple
 
 from discord import Message
 from discord.ext.commands import Bot, Cog
@@ -11,16 +13,25 @@ from sqlalchemy.future import select
 
 from cogs.commands.moderation import Moderation
 from cogs.database import Database
-from cogs.logging import Logging
-from config import CONFIG
-from models import ActionType, ModerationAction, ModerationLinkedAction, User
-from utils.logging import log_func
+from config import guild_config
+from models import ActionType, ModerationLinkedAction, User
+from utils.logging import trace_func
 
 __all__ = ["Automod"]
 
 
 logger = logging.getLogger("parnassius.cogs.automod")
-log = log_func(logger)
+log = trace_func(logger)
+
+
+@lru_cache(maxsize=64)
+def matcher(words: Tuple[str, ...]) -> Optional[Pattern]:
+    """One pattern finding any of the words, shared by guilds with the same list."""
+    if not words:
+        return None
+    # Longest first, so a word is not cut short by another it starts with
+    ordered = sorted(set(words), key=len, reverse=True)
+    return re.compile("|".join(map(re.escape, ordered)))
 
 
 class Automod(Cog):
@@ -29,66 +40,72 @@ class Automod(Cog):
         self.bot = bot
         self._engine = None
 
-    @property
-    @log
-    def forbidden_words(self) -> List[str]:
-        return CONFIG["forbidden_words"].as_str_seq()
-
     @log
-    def matches(self, content) -> Optional[str]:
+    def matches(self, guild_id: int, content) -> Optional[str]:
+        if (pattern := matcher(guild_config(guild_id).forbidden_words)) is None:
+            return None
         content = content.casefold()
         content = unicodedata.normalize("NFKD", content)
         content = "".join(c for c in content if not unicodedata.combining(c))
-        return next((w for w in self.forbidden_words if w in content), None)
+        return match.group() if (match := pattern.search(content)) else None
 
     @Cog.listener()
     @log
     async def on_message(self, message: Message):
-        if message.author.bot or (word := self.matches(message.content)) is None:
+        if message.guild is None or message.author.bot:
+            return
+        if (word := self.matches(message.guild.id, message.content)) is None:
+            return
+        config = guild_config(message.guild.id)
+        if (
+            channel := self.bot.get_channel(config.log_channels.get("moderation"))
+        ) is None:
+            # Actions are reported there, so there is no automod without one
+            logger.warning(f"{message.guild} has no moderation channel for automod")
             return
 
         await message.delete()
         moderation = await Moderation.get(self.bot)
-        logging_cog = await Logging.get(self.bot)
-        channel = self.bot.get_channel(logging_cog.channels["moderation"].get(int))
+        muted_role = moderation.muted_role(message.guild)
         moderator = self.bot.user
         reason = f"Automod: {message.content}"
 
         db = await Database.get(self.bot)
         with db.session() as session:
             user_id = db.get_or_create_user(message.author).id
+            actions = db.moderation_actions()
             query = (
                 select(ModerationLinkedAction.linked_id)
-                .join(ModerationLinkedAction.moderation_action)
+                .join(actions, ModerationLinkedAction.id == actions.id)
                 .where(
-                    ModerationAction.user_id == user_id,
-                    ModerationAction.action == ActionType.REMOVE_AUTOWARN,
+                    actions.user_id == user_id,
+                    actions.action == ActionType.REMOVE_AUTOWARN,
                 )
             )
             removed = session.execute(query).scalars().all()
             logger.debug(removed)
             query = (
-                select(func.count(ModerationAction.id))
-                .join(ModerationAction.user)
+                select(func.count(actions.id))
+                .join(actions.user)
                 .where(
                     User.id == user_id,
-                    ModerationAction.action.in_(
-                        [ActionType.AUTOWARN, ActionType.AUTOMUTE]
-                    ),
-                    ModerationAction.id.notin_(removed),
+                    actions.action.in_([ActionType.AUTOWARN, ActionType.AUTOMUTE]),
+                    actions.id.notin_(removed),
+                    db.in_guild(actions, message.guild.id),
                 )
             )
             number_warnings = session.execute(query).scalars().one()
             logger.debug(number_warnings)
 
-        if number_warnings < 2:
+        # Guilds without a muted role warn instead of muting
+        if number_warnings < 2 or (number_warnings < 4 and muted_role is None):
             action_type = ActionType.AUTOWARN
 
             async def action(member):
                 dms = member.dm_channel or await member.create_dm()
                 warning = (
                     f"{action_type.emoji} **AUTOMATIC WARNING** {action_type.emoji}\n"
-                    f"You have been automatically warned in UWCS for saying {word}."
+                    f"You have been automatically warned in {member.guild} for saying {word}."
                 )
                 await dms.send(warning)
                 await moderation.add_moderation_history_item(
@@ -100,11 +117,11 @@ class Automod(Cog):
             action_type = ActionType.AUTOMUTE
 
             async def action(member):
-                await member.add_roles(moderation.muted_role, reason=reason)
+                await member.add_roles(muted_role, reason=reason)
                 dms = member.dm_channel or await member.create_dm()
                 warning = (
                     f"{action_type.emoji} **AUTOMATIC MUTE** {action_type.emoji}\n"
-                    f"You have been automatically muted in UWCS for saying {word}."
+                    f"You have been automatically muted in {member.guild} for saying {word}."
                 )
                 await dms.send(warning)
                 await moderation.add_moderation_history_item(
@@ -0,0 +1,205 @@
+import logging
+from datetime import datetime, timedelta
+from io import BytesIO
+from typing import Dict
+
+from confuse import ConfigError
+from discord import File
+from discord.ext import tasks
+from discord.ext.commands import Bot, Cog, Context, command, group
+
+from cogs.database import Database
+from cogs.logging import Logging
+from config import config_changed, reload_snapshot, snapshot
+from utils.checks import is_exec
+from utils.logging import trace_func
+from utils.partitions import archive_partitions, ensure_partitions, list_partitions
+from utils.profiler import memory_diff, sample
+
+__all__ = ["Admin"]
+
+logger = logging.getLogger("parnassius.cogs.commands.admin")
+log = trace_func(logger)
+
+MAX_PROFILE_SECONDS = 300
+# Rows in the tables of functions and allocations
+PROFILE_ROWS = 40
+
+
+class Admin(Cog):
+    @log
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.profiling = False
+        # Processes sharing the database leave maintenance to the one with shard 0
+        shard_ids = getattr(bot, "shard_ids", None)
+        if shard_ids is None or 0 in shard_ids:
+            self.maintain_partitions.start()
+        self.watch_config.start()
+
+    @log
+    def cog_unload(self):
+        self.maintain_partitions.cancel()
+        self.watch_config.cancel()
+
+    @log
+    async def cog_check(self, ctx: Context):
+        # These act on the whole bot, so are only for the home guild's exec
+        if ctx.guild is None or ctx.guild.id != snapshot().guild.id:
+            return False
+        return await is_exec().predicate(ctx)
+
+    @log
+    async def run_partition_maintenance(self):
+        config = snapshot().partitions
+        months_ahead = config.months_ahead
+        cutoff = datetime.utcnow() - timedelta(days=config.archive_after_days)
+        db = await Database.get(self.bot)
+        with db.engine.begin() as connection:
+            created = ensure_partitions(connection, months_ahead)
+            archived, rows = archive_partitions(connection, cutoff)
+        if archived:
+            # Queries over old history need to start including the archive
+            del db.archive_horizon
+        return created, archived, rows
+
+    @tasks.loop(hours=24)
+    @log
+    async def maintain_partitions(self):
+        await self.run_partition_maintenance()
+
+    @tasks.loop(seconds=5)
+    async def watch_config(self):
+        if not config_changed():
+            return
+        logger.info("Configuration files changed, reloading")
+        try:
+            reload_snapshot()
+        except ConfigError as e:
+            logger.error(f"Keeping the current configuration: {e}")
+
+    @command()
+    @log
+    async def reload(self, ctx: Context):
+        """Reload the configuration files."""
+        try:
+            reload_snapshot()
+        except ConfigError as e:
+            await ctx.send(f"The configuration is invalid, so was not reloaded: {e}")
+            return
+        await ctx.send("Reloaded the configuration.")
+
+    @group(invoke_without_command=True)
+    @log
+    async def partitions(self, ctx: Context):
+        """List the monthly partitions of the moderation history."""
+        db = await Database.get(self.bot)
+        with db.engine.connect() as connection:
+            partitions = list_partitions(connection)
+        if not partitions:
+            await ctx.send("The moderation history is not partitioned.")
+            return
+        names = ", ".join(f"`{p.name}`" for p in partitions)
+        horizon = db.archive_horizon
+        archived = "nothing" if horizon is None else f"everything up to {horizon}"
+        await ctx.send(f"Partitions: {names}\nThe archive holds {archived}.")
+
+    @partitions.command()
+    @log
+    async def maintain(self, ctx: Context):
+        """Create upcoming partitions and archive old ones."""
+        created, archived, rows = await self.run_partition_maintenance()
+        await ctx.send(
+            f"Created {len(created)} partition{'s' if len(created) != 1 else ''}, "
+            f"archived {len(archived)} partition{'s' if len(archived) != 1 else ''} "
+            f"({rows} action{'s' if rows != 1 else ''})."
+        )
+
+    @command()
+    @log
+    async def logqueue(self, ctx: Context):
+        """Show the depth and delivery statistics of the logging queues."""
+        logging_cog = await Logging.get(self.bot)
+        lines = []
+        for channel_id, (depth, stats) in logging_cog.dispatcher.stats().items():
+            lines.append(
+                f"<#{channel_id}>: {depth} queued, "
+                f"{stats.sent_embeds} sent in {stats.sent_messages} messages, "
+                f"{stats.dropped} dropped, {stats.aggregated} aggregated, "
+                f"{stats.failed} failed, latency {stats.mean_latency:.2f}s mean "
+                f"/ {stats.max_latency:.2f}s max"
+            )
+        await ctx.send("\n".join(lines) or "Nothing has been logged yet.")
+
+    @log
+    def state_sizes(self) -> Dict[str, int]:
+        """Sizes of the caches that grow with the guild."""
+        sizes = {
+            "users": len(self.bot.users),
+            "members": sum(len(g.members) for g in self.bot.guilds),
+            "cached messages": len(self.bot.cached_messages),
+        }
+        if (logging_cog := self.bot.get_cog(Logging.__name__)) is not None:
+            sizes["stored messages"] = len(logging_cog.messages)
+            sizes["stored message bytes"] = logging_cog.messages.bytes
+        return sizes
+
+    @log
+    async def check_profile_length(self, ctx: Context, seconds: int) -> bool:
+        if self.profiling:
+            await ctx.send("A profile is already being taken.")
+            return False
+        if not 0 < seconds <= MAX_PROFILE_SECONDS:
+            await ctx.send(f"Profiles can be up to {MAX_PROFILE_SECONDS} seconds long.")
+            return False
+        return True
+
+    @command()
+    @log
+    async def profile(self, ctx: Context, seconds: int = 30):
+        """Sample what every thread and task is doing for a number of seconds."""
+        if not await self.check_profile_length(ctx, seconds):
+            return
+        self.profiling = True
+        try:
+            await ctx.send(f"Profiling for {seconds} seconds.")
+            profile = await sample(seconds)
+        finally:
+            self.profiling = False
+        name = f"profile-{datetime.utcnow():%Y%m%dT%H%M%S}"
+        await ctx.send(
+            "Samples are in the collapsed stack format, for flamegraph tools.",
+            files=[
+                File(BytesIO(profile.collapsed().encode()), f"{name}.folded"),
+                File(BytesIO(profile.top(PROFILE_ROWS).encode()), f"{name}-top.txt"),
+            ],
+        )
+
+    @command()
+    @log
+    async def memprofile(self, ctx: Context, seconds: int = 60):
+        """Find where memory grows over a number of seconds."""
+        if not await self.check_profile_length(ctx, seconds):
+            return
+        self.profiling = True
+        try:
+            await ctx.send(f"Tracing allocations for {seconds} seconds.")
+            before = self.state_sizes()
+            table = await memory_diff(seconds, count=PROFILE_ROWS)
+            after = self.state_sizes()
+        finally:
+            self.profiling = False
+        sizes = "\n".join(
+            f"{name}: {before[name]} to {after[name]} ({after[name] - before[name]:+})"
+            for name in after
+        )
+        name = f"memprofile-{datetime.utcnow():%Y%m%dT%H%M%S}"
+        await ctx.send(
+            f"**Caches**\n{sizes}",
+            file=File(BytesIO(table.encode()), f"{name}.txt"),
+        )
+
+
+@log
+def setup(bot: Bot):
+    bot.add_cog(Admin(bot))
@@ -3,24 +3,20 @@ from typing import Optional, Union
 
 from discord import HTTPException, Message, TextChannel
 from discord.ext.commands import Bot, Cog, Context, command
-from discord.utils import get
 
 __all__ = ["Channel"]
 
-from config import CONFIG
-from utils.logging import log_func
+from config import guild_config
+from utils.logging import trace_func
 from utils.NaturalConverter import NaturalConverter
 
 logger = logging.getLogger("parnassius.cogs.commands.channel")
-log = log_func(logger)
+log = trace_func(logger)
 
 
 class Channel(Cog):
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.lockdown_extra_roles = CONFIG["guild"]["roles"][
-            "lockdown_extra_roles"
-        ].get(list)
 
     @command()
     @log
@@ -79,7 +75,8 @@ class Channel(Cog):
         """Prevent messages from being sent in a given channel."""
         channel = channel or ctx.channel
         roles = [channel.guild.default_role] + [
-            get(channel.guild.roles, id=role) for role in self.lockdown_extra_roles
+            channel.guild.get_role(role)
+            for role in guild_config(channel.guild.id).lockdown_extra_roles
         ]
         for role in roles:
             overwrites = channel.overwrites_for(role)
@@ -100,7 +97,8 @@ class Channel(Cog):
         """Remove a previously imposed lockdown."""
         channel = channel or ctx.channel
         roles = [channel.guild.default_role] + [
-            get(channel.guild.roles, id=role) for role in self.lockdown_extra_roles
+            channel.guild.get_role(role)
+            for role in guild_config(channel.guild.id).lockdown_extra_roles
         ]
         for role in roles:
             overwrites = channel.overwrites_for(role)
@@ -1,23 +1,37 @@
+import asyncio
 import logging
-import subprocess
+from datetime import datetime, timedelta
+from typing import Optional
 
+from discord import Member
 from discord.ext.commands import Bot, Cog, Context, command
+from sqlalchemy import func
+from sqlalchemy.future import select
 
-from utils.logging import log_func
+from cogs.database import Database
+from cogs.voice import VoiceTracker
+from config import snapshot
+from models import User, VoiceDailyAggregate
+from utils.lazy import lazy_import
+from utils.logging import trace_func
 
 __all__ = ["Misc"]
 
 logger = logging.getLogger("parnassius.cogs.commands.misc")
-log = log_func(logger)
+log = trace_func(logger)
+
+humanize = lazy_import("humanize")
+
+# Far longer than voice has been tracked, and short of overflowing a date
+MAX_VOICESTATS_DAYS = 3650
 
 
 class Misc(Cog):
     @log
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.version = subprocess.run(
-            ["git", "rev-parse", "--short", "HEAD"], capture_output=True
-        ).stdout.decode()
+        # Looked up when first asked for, rather than while starting
+        self.revision: Optional[str] = None
 
     @command()
     @log
@@ -29,7 +43,75 @@ class Misc(Cog):
     @log
     async def version(self, ctx: Context):
         """Print the hash of the most recent commit."""
-        await ctx.send(self.version)
+        if self.revision is None:
+            process = await asyncio.create_subprocess_exec(
+                "git",
+                "rev-parse",
+                "--short",
+                "HEAD",
+                stdout=asyncio.subprocess.PIPE,
+            )
+            stdout, _ = await process.communicate()
+            self.revision = stdout.decode()
+        await ctx.send(self.revision)
+
+    @command()
+    @log
+    async def voicestats(
+        self, ctx: Context, member: Optional[Member] = None, days: int = 30
+    ):
+        """Show how long a member has spent in each voice channel recently."""
+        if not 1 <= days <= MAX_VOICESTATS_DAYS:
+            await ctx.send(
+                f"The number of days must be from 1 to {MAX_VOICESTATS_DAYS}."
+            )
+            return
+        member = member or ctx.author
+        guild_id = ctx.guild.id if ctx.guild else snapshot().guild.id
+        db = await Database.get(self.bot)
+        # The daily totals are of UTC days
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+        seconds = func.sum(VoiceDailyAggregate.seconds)
+        query = (
+            select(
+                VoiceDailyAggregate.channel_id,
+                seconds,
+                func.sum(VoiceDailyAggregate.sessions),
+            )
+            .join(User, User.id == VoiceDailyAggregate.user_id)
+            .where(
+                User.discord_id == member.id,
+                VoiceDailyAggregate.day >= since,
+                db.in_guild(VoiceDailyAggregate, guild_id),
+            )
+            .group_by(VoiceDailyAggregate.channel_id)
+            .order_by(seconds.desc())
+        )
+        with db.session() as session:
+            rows = session.execute(query).all()
+
+        tracker = await VoiceTracker.get(self.bot)
+        current = tracker.open.get((guild_id, member.id))
+        if not rows and current is None:
+            await ctx.send(f"{member} has not been in voice in the last {days} days.")
+            return
+        lines = [
+            f"<#{channel_id}>: {humanize.precisedelta(timedelta(seconds=int(total)))} "
+            f"over {count} session{'s' if count != 1 else ''}"
+            for channel_id, total, count in rows
+        ]
+        total = sum(int(total) for _, total, _ in rows)
+        lines.append(f"**Total:** {humanize.precisedelta(timedelta(seconds=total))}")
+        if current is not None:
+            elapsed = datetime.utcnow() - current.started_at
+            elapsed = timedelta(seconds=int(elapsed.total_seconds()))
+            lines.append(
+                f"Currently in <#{current.channel_id}> for {humanize.precisedelta(elapsed)}."
+            )
+        await ctx.send(
+            f"**Voice activity of {member} over the last {days} days**\n"
+            + "\n".join(lines)
+        )
 
 
 @log
@@ -1,43 +1,83 @@
 # from __future__ import annotations
 
+import asyncio
 import logging
 from datetime import datetime
-from functools import cached_property
-from typing import Optional, Union
+from functools import partial
+from typing import Callable, List, Optional, Union
 
-import humanize
-from discord import Guild, HTTPException, Member, Role
+import aiohttp
+from discord import File, Guild, HTTPException, Member, Object, Role
 from discord import User as DiscordUser
 from discord.ext.commands import Bot, Cog, Context, Greedy, command, group
-from discord.utils import get
+from sqlalchemy import insert
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.future import select
 
 from cogs.database import Database
-from config import CONFIG
+from cogs.logging import Logging
+from cogs.member_cache import MemberCache
+from config import CONFIG, guild_config
 from models import (
     ActionType,
+    AvatarHistory,
     ModerationAction,
     ModerationLinkedAction,
     ModerationTemporaryAction,
     User,
 )
+from utils.checks import is_exec
+from utils.concurrency import ProgressMessage, gather_bounded
 from utils.DateTimeConverter import DateTimeConverter
 from utils.Greedy1 import Greedy1Command, Greedy1Group
-from utils.logging import log_func
-from utils.utils import format_list_of_members
+from utils.lazy import lazy_import
+from utils.logging import trace_func
+from utils.rate_limits import RateLimits, add_http_handler, bucket, remove_http_handler
+from utils.utils import (
+    chunk_lines,
+    find_snowflakes,
+    format_list_of_members,
+    iter_snowflakes,
+)
 
 __all__ = ["Moderation"]
 
 
 logger = logging.getLogger("parnassius.cogs.commands.moderation")
-log = log_func(logger)
+log = trace_func(logger)
+
+humanize = lazy_import("humanize")
+
+# Actions on more members than this report their progress as they go
+PROGRESS_THRESHOLD = 10
+# Attached lists of IDs to ban are read this much at a time, up to the limit
+ID_LIST_CHUNK = 65536
+MAX_ID_LIST_BYTES = 8 * 1024 * 1024
+# The path of the request each action makes to Discord, whose rate limits it waits on
+ACTION_PATHS = {
+    ActionType.TEMPMUTE: "/guilds/{guild_id}/members/{user_id}/roles/{role_id}",
+    ActionType.MUTE: "/guilds/{guild_id}/members/{user_id}/roles/{role_id}",
+    ActionType.UNMUTE: "/guilds/{guild_id}/members/{user_id}/roles/{role_id}",
+    # Each warning is sent to a DM channel of its own, opened first
+    ActionType.WARN: "/users/@me/channels",
+    ActionType.KICK: "/guilds/{guild_id}/members/{user_id}",
+    ActionType.TEMPBAN: "/guilds/{guild_id}/bans/{user_id}",
+    ActionType.BAN: "/guilds/{guild_id}/bans/{user_id}",
+    ActionType.UNBAN: "/guilds/{guild_id}/bans/{user_id}",
+}
 
 
 class Moderation(Cog):
     @log
     def __init__(self, bot: Bot):
         self.bot = bot
+        self.parallelism = CONFIG["moderation"]["parallelism"].get(int)
+        self.rate_limits = RateLimits()
+        add_http_handler(self.rate_limits)
+
+    @log
+    def cog_unload(self):
+        remove_http_handler(self.rate_limits)
 
     @classmethod
     @log
@@ -45,13 +85,10 @@ class Moderation(Cog):
         await bot.wait_until_ready()
         return bot.get_cog(cls.__name__)
 
-    @cached_property
-    def guild(self) -> Guild:
-        return get(self.bot.guilds, id=CONFIG["guild"]["id"].get(int))
-
-    @cached_property
-    def muted_role(self) -> Role:
-        return get(self.guild.roles, id=CONFIG["guild"]["roles"]["muted"].get(int))
+    @log
+    def muted_role(self, guild: Guild) -> Optional[Role]:
+        role_id = guild_config(guild.id).muted_role
+        return None if role_id is None else guild.get_role(role_id)
 
     @log
     async def add_moderation_history_item(
@@ -62,8 +99,41 @@ class Moderation(Cog):
         moderator: Union[User, Member],
         until: Optional[datetime] = None,
         linked_action_id: Optional[int] = None,
+        guild_id: Optional[int] = None,
     ):
+        """Record an action. Its guild is the member's, unless given."""
         db = await Database.get(self.bot)
+        if guild_id is None:
+            guild_id = getattr(getattr(user, "guild", None), "id", None)
+        # Written from the executor, so actions on many members overlap their writes
+        # with each other's requests to Discord
+        await asyncio.get_event_loop().run_in_executor(
+            None,
+            partial(
+                self.write_moderation_history_item,
+                db,
+                user,
+                action_type,
+                reason,
+                moderator,
+                until,
+                linked_action_id,
+                guild_id,
+            ),
+        )
+
+    @log
+    def write_moderation_history_item(
+        self,
+        db: Database,
+        user: Union[User, Member],
+        action_type: ActionType,
+        reason: Optional[str],
+        moderator: Union[User, Member],
+        until: Optional[datetime],
+        linked_action_id: Optional[int],
+        guild_id: Optional[int],
+    ):
         user_id = db.get_or_create_user(user).id
         moderator_id = db.get_or_create_user(moderator).id
         with db.session() as session:
@@ -72,6 +142,7 @@ class Moderation(Cog):
                 action=action_type,
                 reason=reason,
                 moderator_id=moderator_id,
+                guild_id=guild_id,
             )
             session.add(action)
             # Flush here to generate primary key
@@ -91,7 +162,25 @@ class Moderation(Cog):
             session.commit()
 
     @log
-    async def partition_members(self, members, action):
+    def rate_limit_pause(
+        self, action_type: ActionType, guild: Guild
+    ) -> Callable[[], float]:
+        """The seconds new actions should wait for the rate limit on their requests."""
+        path = ACTION_PATHS[action_type]
+        # As in discord.py's routes, the guild is only part of the bucket when in the path
+        key = bucket(path, guild_id=guild.id if "{guild_id}" in path else None)
+        return partial(self.rate_limits.remaining, key)
+
+    @log
+    async def partition_members(self, members, action, pause, progress=None):
+        """Apply the action to several members at once, splitting them by outcome.
+
+        Requests in the same rate-limit bucket are still sent one at a time by
+        discord.py, but the other requests and database writes of the actions overlap.
+        New actions wait as long as `pause` gives, while their requests' bucket is
+        rate-limited. Given a `ProgressMessage`, it is updated as each action finishes.
+        """
+
         async def predicate(member):
             try:
                 await action(member)
@@ -100,7 +189,13 @@ class Moderation(Cog):
                 logger.exception(e)
                 return False
 
-        results = [await predicate(member) for member in members]
+        results = await gather_bounded(
+            members,
+            predicate,
+            limit=self.parallelism,
+            pause=pause,
+            on_result=progress and progress.update,
+        )
         failed = [m for m, r in zip(members, results) if not r]
         muted = [m for m, r in zip(members, results) if r]
         return failed, muted
@@ -137,7 +232,19 @@ class Moderation(Cog):
         self, ctx, members, reason, action, action_type, moderator, until=None
     ):
         logger.info(f"{moderator} used {action_type} with reason {reason}")
-        failed, muted = await self.partition_members(members, action)
+        cache = await MemberCache.get(self.bot)
+        for member in members:
+            cache.retain(member)
+        progress = None
+        if len(members) > PROGRESS_THRESHOLD:
+            progress = ProgressMessage(
+                ctx, action_type.past_tense.capitalize(), len(members)
+            )
+            await progress.start()
+        pause = self.rate_limit_pause(action_type, ctx.guild)
+        failed, muted = await self.partition_members(members, action, pause, progress)
+        if progress is not None:
+            await progress.finish()
         message_parts = await self.create_message_parts(
             action_type, failed, muted, reason, until
         )
@@ -155,9 +262,12 @@ class Moderation(Cog):
     ):
         moderator = ctx.author
         action_type = ActionType.TEMPMUTE
+        if (muted_role := self.muted_role(ctx.guild)) is None:
+            await ctx.send("This guild has no muted role set.")
+            return
 
         async def action(member):
-            await member.add_roles(self.muted_role, reason=reason)
+            await member.add_roles(muted_role, reason=reason)
             # noinspection PyTypeChecker
             # In this scenario, `until` is a `datetime` and not a `DateTimeConverter`.
             await self.add_moderation_history_item(
@@ -203,9 +313,12 @@ class Moderation(Cog):
     ):
         moderator = ctx.author
         action_type = ActionType.MUTE
+        if (muted_role := self.muted_role(ctx.guild)) is None:
+            await ctx.send("This guild has no muted role set.")
+            return
 
         async def action(member):
-            await member.add_roles(self.muted_role, reason=reason)
+            await member.add_roles(muted_role, reason=reason)
             await self.add_moderation_history_item(
                 member, action_type, reason, moderator
             )
@@ -222,9 +335,12 @@ class Moderation(Cog):
     ):
         moderator = ctx.author
         action_type = ActionType.UNMUTE
+        if (muted_role := self.muted_role(ctx.guild)) is None:
+            await ctx.send("This guild has no muted role set.")
+            return
 
         async def action(member):
-            await member.remove_roles(self.muted_role, reason=reason)
+            await member.remove_roles(muted_role, reason=reason)
             await self.add_moderation_history_item(
                 member, action_type, reason, moderator
             )
@@ -251,7 +367,7 @@ class Moderation(Cog):
             )
             warning = (
                 f"{action_type.emoji} **WARNING** {action_type.emoji}\n"
-                f"You have been warned in UWCS {with_reason}"
+                f"You have been warned in {member.guild} {with_reason}"
             )
             await channel.send(warning)
             await self.add_moderation_history_item(
@@ -274,12 +390,13 @@ class Moderation(Cog):
                 return
             user_id = user.id
             logger.debug(f"{user_id=}")
+            actions = db.moderation_actions()
             query = (
                 select(ModerationLinkedAction.linked_id)
-                .join(ModerationLinkedAction.moderation_action)
+                .join(actions, ModerationLinkedAction.id == actions.id)
                 .where(
-                    ModerationAction.user_id == user_id,
-                    ModerationAction.action.in_(
+                    actions.user_id == user_id,
+                    actions.action.in_(
                         [
                             ActionType.REMOVE_WARN,
                             ActionType.REMOVE_AUTOWARN,
@@ -291,18 +408,19 @@ class Moderation(Cog):
             removed = session.execute(query).scalars().all()
             logger.debug(f"{removed=}")
             query = (
-                select(ModerationAction)
-                .join(ModerationAction.user)
+                select(actions)
+                .join(actions.user)
                 .where(
                     User.id == user_id,
-                    ModerationAction.action.in_(
+                    actions.action.in_(
                         [
                             ActionType.WARN,
                             ActionType.AUTOWARN,
                             ActionType.REMOVE_AUTOMUTE,
                         ]
                     ),
-                    ModerationAction.id.notin_(removed),
+                    actions.id.notin_(removed),
+                    db.in_guild(actions, ctx.guild.id),
                 )
             )
             warnings = session.execute(query).scalars().all()
@@ -338,10 +456,12 @@ class Moderation(Cog):
             await ctx.send(f"{member} has no warnings to remove.")
             return
         user_id = user.id
-        query = select(ModerationAction).where(
-            ModerationAction.id == warn_id,
-            ModerationAction.action.in_([ActionType.WARN, ActionType.AUTOWARN]),
-            ModerationAction.user_id == user_id,
+        actions = db.moderation_actions()
+        query = select(actions).where(
+            actions.id == warn_id,
+            actions.action.in_([ActionType.WARN, ActionType.AUTOWARN]),
+            actions.user_id == user_id,
+            db.in_guild(actions, ctx.guild.id),
         )
         with db.session() as session:
             result = session.execute(query).scalars().first()
@@ -431,6 +551,112 @@ class Moderation(Cog):
             ctx, members, reason, action, action_type, moderator
         )
 
+    @log
+    def write_bans(
+        self,
+        db: Database,
+        user_ids: List[int],
+        moderator: Member,
+        reason: Optional[str],
+    ):
+        """Record many bans in one insert."""
+        usernames = {
+            i: str(user) if (user := self.bot.get_user(i)) is not None else str(i)
+            for i in user_ids
+        }
+        usernames[moderator.id] = str(moderator)
+        ids = db.get_or_create_users(usernames)
+        with db.engine.begin() as connection:
+            connection.execute(
+                insert(ModerationAction),
+                [
+                    {
+                        "user_id": ids[i],
+                        "moderator_id": ids[moderator.id],
+                        "action": ActionType.BAN,
+                        "reason": reason,
+                        "guild_id": moderator.guild.id,
+                    }
+                    for i in user_ids
+                ],
+            )
+
+    @command()
+    @is_exec()
+    @log
+    async def massban(self, ctx: Context, *, text: Optional[str] = None):
+        """Ban users by ID, listed in the message or in attached text files.
+
+        Any text besides the IDs is taken as the reason.
+        """
+        ids, reason = find_snowflakes(text or "")
+        reason = reason or None
+        async with aiohttp.ClientSession() as session:
+            for attachment in ctx.message.attachments:
+                if attachment.size > MAX_ID_LIST_BYTES:
+                    await ctx.send(
+                        f"Skipping {attachment.filename}, as it is too large."
+                    )
+                    continue
+                async with session.get(attachment.url) as response:
+                    response.raise_for_status()
+                    chunks = response.content.iter_chunked(ID_LIST_CHUNK)
+                    ids.extend([i async for i in iter_snowflakes(chunks)])
+
+        guild = ctx.guild
+        banned = {entry.user.id for entry in await guild.bans()}
+        exempt = {ctx.author.id, self.bot.user.id}
+        # Keep the order the IDs were given in
+        unique = list(dict.fromkeys(ids))
+        to_ban = [i for i in unique if i not in banned and i not in exempt]
+        already = sum(i in banned for i in unique)
+        if not to_ban:
+            await ctx.send(
+                f"There is nobody to ban, of {len(unique)} IDs given "
+                f"({already} already banned)."
+            )
+            return
+
+        logger.info(f"{ctx.author} used massban on {len(to_ban)} users")
+        progress = ProgressMessage(ctx, "Banned", len(to_ban))
+        await progress.start()
+
+        async def ban(user_id: int) -> bool:
+            try:
+                await guild.ban(Object(user_id), reason=reason, delete_message_days=0)
+                return True
+            except HTTPException as e:
+                logger.warning(f"Could not ban {user_id}: {e}")
+                return False
+
+        results = await gather_bounded(
+            to_ban,
+            ban,
+            limit=self.parallelism,
+            pause=self.rate_limit_pause(ActionType.BAN, guild),
+            on_result=progress.update,
+        )
+        await progress.finish()
+        succeeded = [i for i, r in zip(to_ban, results) if r]
+        failed = [i for i, r in zip(to_ban, results) if not r]
+        if succeeded:
+            db = await Database.get(self.bot)
+            await asyncio.get_event_loop().run_in_executor(
+                None, partial(self.write_bans, db, succeeded, ctx.author, reason)
+            )
+
+        with_reason = "with no reason given" if reason is None else f"for: {reason}"
+        lines = [f"{ActionType.BAN.emoji} **MASS BAN** {ActionType.BAN.emoji}"]
+        lines.append(f"Banned {len(succeeded)} users {with_reason}")
+        lines.extend(f"<@{i}>" for i in succeeded)
+        if already:
+            lines.append(f"Skipped {already} already banned.")
+        if failed:
+            lines.append(f"Failed to ban {len(failed)}:")
+            lines.extend(f"`{i}`" for i in failed)
+        for message in chunk_lines(lines):
+            await ctx.send(message)
+
     @command(cls=Greedy1Command)
     @log
     async def unban(
@@ -440,14 +666,48 @@ class Moderation(Cog):
         action_type = ActionType.UNBAN
 
         async def action(user):
-            await self.guild.unban(user, reason=reason)
-            await self.add_moderation_history_item(user, action_type, reason, moderator)
+            await ctx.guild.unban(user, reason=reason)
+            await self.add_moderation_history_item(
+                user, action_type, reason, moderator, guild_id=ctx.guild.id
+            )
             logging.info(f"{action_type.past_tense.capitalize()} {user}")
 
         await self.moderation_command(
             ctx, users, reason, action, action_type, moderator
         )
 
+    @command()
+    @log
+    async def avatars(self, ctx: Context, user: DiscordUser, count: int = 5):
+        """Upload a user's archived avatars, most recent first."""
+        db = await Database.get(self.bot)
+        archive = (await Logging.get(self.bot)).avatars
+        query = (
+            select(AvatarHistory)
+            .join(User, User.id == AvatarHistory.user_id)
+            .where(User.discord_id == user.id)
+            .order_by(AvatarHistory.seen_at.desc(), AvatarHistory.id.desc())
+            # Discord allows at most 10 files per message
+            .limit(max(1, min(count, 10)))
+        )
+        with db.session() as session:
+            history = session.execute(query).scalars().all()
+        if not history:
+            await ctx.send(f"No avatars have been archived for {user}.")
+            return
+
+        lines, files = [], []
+        for entry in history:
+            digest = entry.digest[:12]
+            if (path := archive.find(entry.digest)) is not None:
+                files.append(File(path, filename=f"{digest}.{entry.extension}"))
+                lines.append(f"`{digest}` seen {entry.seen_at:%Y-%m-%d %H:%M}")
+            else:
+                lines.append(
+                    f"`{digest}` seen {entry.seen_at:%Y-%m-%d %H:%M} (missing)"
+                )
+        await ctx.send(f"**Avatars of {user}**\n" + "\n".join(lines), files=files)
+
 
 def setup(bot: Bot):
     bot.add_cog(Moderation(bot))
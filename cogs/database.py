@@ -1,22 +1,25 @@
 from __future__ import annotations
 
 import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
 
 from discord.ext.commands import Bot, Cog
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func, or_, union_all
 from sqlalchemy.future import select
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import aliased, sessionmaker
 
-from config import CONFIG
-from models import User
-from utils.logging import log_func
+from config import CONFIG, snapshot
+from models import ModerationAction, ModerationActionArchive, User
+from utils.logging import trace_func
 from utils.typing import Identifiable
 
 __all__ = ["Database"]
 
 
 logger = logging.getLogger("parnassius.cogs.database")
-log = log_func(logger)
+log = trace_func(logger)
 
 
 class Database(Cog):
@@ -24,6 +27,10 @@ class Database(Cog):
     def __init__(self, bot: Bot):
         self.bot = bot
         self._engine = None
+        self._archive_horizon = None
+        # Users are created from executor threads too, and Discord IDs are not unique
+        # in the database, so creation is serialised to avoid duplicates
+        self.user_lock = threading.Lock()
 
     @property
     @log
@@ -64,15 +71,85 @@ class Database(Cog):
 
     @log
     def get_or_create_user(self, user):
-        if (db_user := self.get_user(user).scalars().first()) is not None:
-            return db_user
-
-        db_user = User(discord_id=user.id, username=str(user))
-        with self.session(expire_on_commit=False).begin() as session:
-            session.add(db_user)
-            session.commit()
+        query = select(User).where(User.discord_id == user.id)
+        # Users are read in their own session, as results cannot be read once theirs
+        # has closed
+        with self.session(expire_on_commit=False) as session:
+            if (db_user := session.execute(query).scalars().first()) is not None:
+                return db_user
+
+        with self.user_lock, self.session(expire_on_commit=False) as session:
+            if (db_user := session.execute(query).scalars().first()) is None:
+                db_user = User(discord_id=user.id, username=str(user))
+                session.add(db_user)
+                session.commit()
         return db_user
 
+    @log
+    def get_or_create_users(self, usernames: Dict[int, str]) -> Dict[int, int]:
+        """Map Discord IDs to user IDs, creating users that do not exist yet.
+
+        Takes the username to create each user with, by Discord ID. Makes one query
+        for all existing users and one insert for all new ones.
+        """
+        with self.user_lock, self.session.begin() as session:
+            query = select(User.discord_id, User.id).where(
+                User.discord_id.in_(usernames)
+            )
+            ids = dict(session.execute(query).all())
+            new = [
+                User(discord_id=discord_id, username=username)
+                for discord_id, username in usernames.items()
+                if discord_id not in ids
+            ]
+            session.add_all(new)
+            session.flush()
+            ids.update((user.discord_id, user.id) for user in new)
+        return ids
+
+    @property
+    @log
+    def archive_horizon(self) -> Optional[datetime]:
+        """The timestamp of the newest archived moderation action, if any."""
+        if self._archive_horizon is None:
+            with self.session() as session:
+                query = select(func.max(ModerationActionArchive.timestamp))
+                # Cache "no archive" as datetime.min to avoid querying again
+                self._archive_horizon = session.execute(query).scalar() or datetime.min
+        if self._archive_horizon == datetime.min:
+            return None
+        return self._archive_horizon
+
+    @archive_horizon.deleter
+    @log
+    def archive_horizon(self):
+        self._archive_horizon = None
+
+    @log
+    def moderation_actions(self):
+        """The moderation actions to query for the whole history.
+
+        The archive is only included once partitions have been archived into it.
+        """
+        if self.archive_horizon is None:
+            return ModerationAction
+        history = union_all(
+            select(ModerationAction.__table__),
+            select(ModerationActionArchive.__table__),
+        ).subquery("moderation_history")
+        return aliased(ModerationAction, history)
+
+    @staticmethod
+    def in_guild(actions, guild_id: int):
+        """A condition for actions taken in the guild.
+
+        Actions from before there could be more than one guild have none, and were
+        taken in the home guild.
+        """
+        if guild_id == snapshot().guild.id:
+            return or_(actions.guild_id == guild_id, actions.guild_id.is_(None))
+        return actions.guild_id == guild_id
+
 
 @log
 def setup(bot: Bot):
@@ -0,0 +1,220 @@
+"""Per-guild settings, stored in the database and cached in `config.guilds`.
+
+Every process sharing the database reloads the settings when any have changed, so a
+change made through one shard's process reaches the others within the refresh
+interval. The newest archived moderation action is looked up again as often, as only
+one process archives partitions.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from discord import Guild, Role, TextChannel
+from discord.ext import tasks
+from discord.ext.commands import (
+    BadArgument,
+    Bot,
+    Cog,
+    Context,
+    Greedy,
+    check_any,
+    group,
+    guild_only,
+    has_guild_permissions,
+)
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from cogs.database import Database
+from config import (
+    CONFIG,
+    GuildOverrides,
+    guild_config,
+    overrides,
+    set_overrides,
+    snapshot,
+)
+from models import GuildSettings
+from utils.checks import is_exec
+from utils.logging import trace_func
+
+__all__ = ["Guilds"]
+
+logger = logging.getLogger("parnassius.cogs.guilds")
+log = trace_func(logger)
+
+# When the settings were last changed, and how many guilds have any
+Version = Tuple[Optional[datetime], int]
+
+
+def to_overrides(row: GuildSettings) -> GuildOverrides:
+    return GuildOverrides(
+        None if row.exec_roles is None else frozenset(row.exec_roles),
+        row.muted_role,
+        None if row.lockdown_extra_roles is None else tuple(row.lockdown_extra_roles),
+        row.log_channels,
+        None if row.forbidden_words is None else tuple(row.forbidden_words),
+    )
+
+
+class Guilds(Cog):
+    @log
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.version: Optional[Version] = None
+        self.refresh.change_interval(
+            seconds=CONFIG["guilds"]["refresh_interval"].as_number()
+        )
+        self.refresh.start()
+
+    @log
+    def cog_unload(self):
+        self.refresh.cancel()
+
+    @classmethod
+    @log
+    async def get(cls, bot: Bot) -> "Guilds":
+        await bot.wait_until_ready()
+        return bot.get_cog(cls.__name__)
+
+    @staticmethod
+    @log
+    def read_version(db: Database) -> Version:
+        with db.session() as session:
+            latest, count = session.execute(
+                select(func.max(GuildSettings.updated_at), func.count())
+            ).one()
+        return latest, count
+
+    @staticmethod
+    @log
+    def read_overrides(db: Database) -> Dict[int, GuildOverrides]:
+        with db.session() as session:
+            rows = session.execute(select(GuildSettings)).scalars().all()
+            return {row.guild_id: to_overrides(row) for row in rows}
+
+    @log
+    async def load(self, db: Database):
+        loop = asyncio.get_event_loop()
+        version = await loop.run_in_executor(None, self.read_version, db)
+        loaded = await loop.run_in_executor(None, self.read_overrides, db)
+        set_overrides(loaded)
+        self.version = version
+        logger.info(f"Loaded the settings of {len(loaded)} guilds")
+
+    @tasks.loop(seconds=60)
+    @log
+    async def refresh(self):
+        db = await Database.get(self.bot)
+        # The process running shard 0 may have archived partitions since
+        del db.archive_horizon
+        if self.version is not None:
+            version = await asyncio.get_event_loop().run_in_executor(
+                None, self.read_version, db
+            )
+            if version == self.version:
+                return
+        await self.load(db)
+
+    @staticmethod
+    @log
+    def write(db: Database, guild_id: int, values: dict):
+        with db.session() as session:
+            row = session.get(GuildSettings, guild_id)
+            if row is None:
+                row = GuildSettings(guild_id=guild_id)
+                session.add(row)
+            for name, value in values.items():
+                setattr(row, name, value)
+            session.commit()
+
+    @log
+    async def update(self, guild: Guild, **values):
+        """Change some of a guild's settings, or clear them with `None`."""
+        db = await Database.get(self.bot)
+        await asyncio.get_event_loop().run_in_executor(
+            None, partial(self.write, db, guild.id, values)
+        )
+        await self.load(db)
+
+    @log
+    async def cog_check(self, ctx: Context):
+        # Administrators can configure a guild before it has any exec roles
+        check = check_any(is_exec(), has_guild_permissions(administrator=True))
+        return await guild_only().predicate(ctx) and await check.predicate(ctx)
+
+    @group(invoke_without_command=True)
+    @log
+    async def settings(self, ctx: Context):
+        """Show this guild's settings."""
+        config = guild_config(ctx.guild.id)
+
+        def roles(ids) -> str:
+            return ", ".join(f"<@&{i}>" for i in ids) or "none"
+
+        channels = "\n".join(
+            f" • {name}: <#{channel_id}>"
+            for name, channel_id in sorted(config.log_channels.items())
+        )
+        lines = [
+            f"**Exec roles:** {roles(config.exec_roles)}",
+            f"**Muted role:** {roles([config.muted_role] if config.muted_role else [])}",
+            f"**Lockdown extra roles:** {roles(config.lockdown_extra_roles)}",
+            f"**Forbidden words:** {len(config.forbidden_words)}",
+            f"**Logging channels:**\n{channels or ' • none'}",
+        ]
+        await ctx.send("\n".join(lines))
+
+    @settings.command(name="exec")
+    @log
+    async def exec_roles(self, ctx: Context, roles: Greedy[Role]):
+        """Set the roles allowed to moderate, or go back to the default with none."""
+        await self.update(ctx.guild, exec_roles=[r.id for r in roles] or None)
+        await ctx.message.add_reaction("✅")
+
+    @settings.command()
+    @log
+    async def muted(self, ctx: Context, role: Optional[Role]):
+        """Set the role given to muted members, or go back to the default."""
+        await self.update(ctx.guild, muted_role=role and role.id)
+        await ctx.message.add_reaction("✅")
+
+    @settings.command()
+    @log
+    async def lockdown(self, ctx: Context, roles: Greedy[Role]):
+        """Set the roles locked out besides everyone, or go back to the default."""
+        await self.update(ctx.guild, lockdown_extra_roles=[r.id for r in roles] or None)
+        await ctx.message.add_reaction("✅")
+
+    @settings.command()
+    @log
+    async def channel(self, ctx: Context, name: str, channel: Optional[TextChannel]):
+        """Set where a kind of event is logged, or go back to the default."""
+        names = snapshot().logging.channels
+        if name not in names:
+            raise BadArgument(f"The logging channels are {', '.join(names)}.")
+        # Only the channels the guild sets itself are stored
+        own = overrides().get(ctx.guild.id)
+        channels = dict(own.log_channels or {}) if own is not None else {}
+        if channel is None:
+            channels.pop(name, None)
+        else:
+            channels[name] = channel.id
+        await self.update(ctx.guild, log_channels=channels or None)
+        await ctx.message.add_reaction("✅")
+
+    @settings.command()
+    @log
+    async def words(self, ctx: Context, *words: str):
+        """Set the forbidden words, or go back to the default list with none."""
+        forbidden: Optional[List[str]] = [w.casefold() for w in words] or None
+        await self.update(ctx.guild, forbidden_words=forbidden)
+        await ctx.message.add_reaction("✅")
+
+
+@log
+def setup(bot: Bot):
+    bot.add_cog(Guilds(bot))
@@ -1,20 +1,23 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from collections import Mapping
-from dataclasses import asdict, astuple, dataclass
 from datetime import datetime, timedelta
 from enum import Enum, auto, unique
-from typing import Optional, Union
+from time import time
+from typing import List, Optional, Tuple, Union
 
-from confuse import Subview
 from discord import (
     AuditLogAction,
     AuditLogEntry,
     CategoryChannel,
     Embed,
+    Guild,
     Member,
     Message,
+    RawMessageDeleteEvent,
+    RawMessageUpdateEvent,
+    Role,
     StageChannel,
     TextChannel,
     User,
@@ -23,15 +26,42 @@ from discord import (
 )
 from discord.abc import GuildChannel
 from discord.ext.commands import Bot, Cog
-from humanize import precisedelta
-
-from config import CONFIG
-from utils.logging import log_func
+from discord.utils import SnowflakeList
+
+from cogs.database import Database
+from cogs.member_cache import MemberCache
+from config import CONFIG, guild_config, snapshot
+from utils.audit_log_cache import AuditLogCache
+from utils.avatar_history import archive_change
+from utils.diff import render_diff, truncate
+from utils.event_digest import DigestSettings, EventDigest
+from utils.lazy import lazy_import
+from utils.log_dispatcher import LogDispatcher
+from utils.log_worker import (
+    RemoteDispatcher,
+    RemoteJournal,
+    WorkerConnection,
+    build_avatar_archive,
+    build_dispatcher,
+    build_journal,
+    socket_paths,
+)
+from utils.logging import trace_func
+from utils.member_updates import MemberUpdateBuffer
+from utils.message_journal import MessageJournal
+from utils.message_store import MessageStore, StoredMessage
 
 __all__ = ["Logging"]
 
 logger = logging.getLogger("parnassius.cogs.logging")
-log = log_func(logger)
+log = trace_func(logger)
+
+humanize = lazy_import("humanize")
+
+# Characters of each version shown when an edit is too large to show as a diff
+EDIT_PREVIEW = 1000
+# Seconds to keep sending queued embeds for once unloaded
+DRAIN_TIMEOUT = 10
 
 
 class Logging(Cog):
@@ -39,7 +69,50 @@ class Logging(Cog):
     def __init__(self, bot: Bot):
         self.bot = bot
         self.config = CONFIG["discord_logging"]
-        self.channels = self.config["channels"]
+        self.dispatcher: Union[LogDispatcher, RemoteDispatcher]
+        self.journal: Union[MessageJournal, RemoteJournal]
+        if sockets := socket_paths(self.config):
+            # Worker processes send the embeds and write the journal
+            max_buffer = self.config["workers"]["max_buffer"].get(int)
+            connections = [
+                WorkerConnection(path, max_buffer=max_buffer) for path in sockets
+            ]
+            self.dispatcher = RemoteDispatcher(connections)
+            self.journal = RemoteJournal(connections, build_journal(self.config))
+        else:
+            self.dispatcher = build_dispatcher(bot.http, self.config)
+            self.journal = build_journal(self.config)
+            self.journal.start()
+        self.digest = EventDigest(
+            self.dispatcher.enqueue,
+            title=self.config["digest"]["head"].get(str),
+            colour=self.config["digest"]["colour"].get(int),
+        )
+        audit_log = self.config["audit_log"]
+        self.audit_logs = AuditLogCache(
+            window=audit_log["window"].as_number(),
+            max_age=audit_log["max_age"].as_number(),
+        )
+        self.member_updates = MemberUpdateBuffer(
+            self.log_member_update,
+            window=self.config["member_updates"]["window"].as_number(),
+        )
+        self.messages = MessageStore(self.config["message_store"]["max_bytes"].get(int))
+        self.avatars = build_avatar_archive(self.config)
+
+    @log
+    def cog_unload(self):
+        self.journal.close()
+        asyncio.ensure_future(self.close())
+
+    @log
+    async def close(self):
+        # Pending member updates may still log or digest embeds
+        await self.member_updates.close()
+        self.digest.flush()
+        await self.dispatcher.drain(DRAIN_TIMEOUT)
+        self.dispatcher.close()
+        await self.avatars.close()
 
     @classmethod
     @log
@@ -57,6 +130,20 @@ class Logging(Cog):
         colour,
         thumbnail_url=None,
     ):
+        if channel is None:
+            # The guild does not log this kind of event
+            return
+        embed = self.make_embed(user, title, description, colour, thumbnail_url)
+        self.dispatcher.enqueue(channel.id, embed)
+
+    @staticmethod
+    def make_embed(
+        user: Optional[Union[User, Member]],
+        title,
+        description,
+        colour,
+        thumbnail_url=None,
+    ) -> Embed:
         embed = Embed(title=title, description=description, colour=colour)
         if user:
             embed.set_author(
@@ -64,68 +151,51 @@ class Logging(Cog):
                 url=Embed.Empty,
                 icon_url=user.avatar_url,
             )
-            embed.set_footer(text=self.config["footer"].get(str).format(id=user.id))
+            embed.set_footer(text=snapshot().logging.footer.format(id=user.id))
         embed.timestamp = datetime.utcnow()
         if thumbnail_url:
             embed.set_thumbnail(url=thumbnail_url)
-        await channel.send(embed=embed)
-
-    @dataclass(frozen=True)
-    class ConfigSection(Mapping):
-        channel_id: int
-        title: str
-        description: str
-        colour: int
-
-        @log
-        def __iter__(self):
-            return iter(self.astuple())
-
-        @log
-        def __getitem__(self, keys):
-            return iter(getattr(self, k) for k in keys)
-
-        @log
-        def __len__(self) -> int:
-            return len(self.astuple())
+        return embed
 
-        @log
-        def asdict(self):
-            return asdict(self)
-
-        @log
-        def astuple(self):
-            return astuple(self)
+    @log
+    def get_digest_settings(self, name: str) -> Optional[DigestSettings]:
+        return snapshot().logging.sections[name].digest
 
     @log
-    async def get_config_parts(self, config_section: Subview) -> Logging.ConfigSection:
-        channel_id = self.channels[config_section["channel"].get(str)].get(int)
-        title = config_section["head"].get(str)
-        description = config_section["desc"].get(str)
-        colour = config_section["colour"].get(int)
-        return Logging.ConfigSection(channel_id, title, description, colour)
+    async def log_or_digest(
+        self,
+        name: str,
+        channel,
+        user: Optional[Union[User, Member]],
+        title,
+        description,
+        colour,
+    ):
+        """Log an event, or add it to the digest if its section has one configured."""
+        if channel is None:
+            return
+        if (settings := self.get_digest_settings(name)) is None:
+            await self.log_event(channel, user, title, description, colour)
+            return
+        detail = " ".join(description.split())
+        if user is not None and user.mention not in detail:
+            detail = f"{user.mention}: {detail}"
+        self.digest.add(channel.id, name, settings, f"<t:{int(time())}:T> {detail}")
 
     @log
-    async def get_config_parts_from_name(self, name: str) -> Logging.ConfigSection:
-        return await self.get_config_parts(self.config[name])
+    async def get_config_parts_from_name(
+        self, name: str, guild: Optional[Guild] = None
+    ) -> Tuple[Optional[int], str, str, int]:
+        """A section's channel in the guild, or the home guild, and its template."""
+        section = snapshot().logging.sections[name]
+        channel_id = guild_config(guild and guild.id).log_channels.get(section.channel)
+        return channel_id, section.title, section.description, section.colour
 
-    @staticmethod
     @log
-    async def try_audit_entry(action, audit_logs, predicate) -> Optional[AuditLogEntry]:
-        before = datetime.utcnow()
-        # Padding to allow for slow execution
-        after = before - timedelta(seconds=5)
-        # oldest_first = false to work from newest entries first
-        # It's likely that the most recent entry of the audit logs will be the one the user is looking for
-        # so it makes sense to search in that order
-        logs = audit_logs(action=action, after=after, before=before, oldest_first=False)
-        async for entry in logs:
-            # guild.audit_logs was retrieving logs from outside the specified range.
-            # This checks that the range is enforced.
-            if entry.created_at < after:
-                break
-            if predicate(entry):
-                return entry
+    async def try_audit_entry(
+        self, action: AuditLogAction, guild: Guild, predicate
+    ) -> Optional[AuditLogEntry]:
+        return await self.audit_logs.find(guild, action, predicate)
 
     @unique
     class ChannelType(Enum):
@@ -161,7 +231,7 @@ class Logging(Cog):
     @log
     async def on_member_join(self, member: Member):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "member_join"
+            "member_join", member.guild
         )
 
         channel = self.bot.get_channel(channel_id)
@@ -171,7 +241,7 @@ class Logging(Cog):
         )
         description = description.format(
             ping=member.mention,
-            age=precisedelta(age, minimum_unit="hours"),
+            age=humanize.precisedelta(age, minimum_unit="hours"),
             warning=warning,
         )
         await self.log_event(channel, member, title, description, colour)
@@ -179,54 +249,75 @@ class Logging(Cog):
     @Cog.listener()
     @log
     async def on_member_remove(self, member: Member):
+        await self.log_removal(member.guild, member, member.joined_at)
+
+    @Cog.listener()
+    @log
+    async def on_uncached_member_remove(self, guild: Guild, user: User):
+        # When they joined is only known for cached members
+        await self.log_removal(guild, user, None)
+
+    @log
+    async def log_removal(
+        self, guild: Guild, user: Union[User, Member], joined_at: Optional[datetime]
+    ):
         logs = await self.try_audit_entry(
-            AuditLogAction.kick, member.guild.audit_logs, lambda e: e.target == member
+            AuditLogAction.kick, guild, lambda e: e.target.id == user.id
         )
         was_kicked = logs is not None
 
         if was_kicked:
-            await self.on_member_kick(member, logs)
+            await self.on_member_kick(guild, user, logs)
         else:
-            await self.on_member_leave(member)
+            await self.on_member_leave(guild, user, joined_at)
 
     @log
-    async def on_member_leave(self, member: Member):
+    async def on_member_leave(
+        self, guild: Guild, user: Union[User, Member], joined_at: Optional[datetime]
+    ):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "member_leave"
+            "member_leave", guild
         )
 
         channel = self.bot.get_channel(channel_id)
-        age = datetime.now() - member.joined_at
-        description = description.format(
-            ping=member.mention, age=precisedelta(age, minimum_unit="hours")
-        )
-        await self.log_event(channel, member, title, description, colour)
+        if joined_at is not None:
+            age = humanize.precisedelta(
+                datetime.now() - joined_at, minimum_unit="hours"
+            )
+        else:
+            age = "an unknown time"
+        description = description.format(ping=user.mention, age=age)
+        await self.log_event(channel, user, title, description, colour)
 
     @log
-    async def on_member_kick(self, member: Member, logs: AuditLogEntry):
+    async def on_member_kick(
+        self, guild: Guild, user: Union[User, Member], logs: AuditLogEntry
+    ):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "member_kick"
+            "member_kick", guild
         )
 
         channel = self.bot.get_channel(channel_id)
-        source = logs.user.mention if logs.target == member else None
-        reason = logs.reason if logs.target == member else None
-        description = description.format(user=str(member), source=source, reason=reason)
+        source = logs.user.mention
+        reason = logs.reason
+        description = description.format(user=str(user), source=source, reason=reason)
 
-        await self.log_event(channel, member, title, description, colour)
+        await self.log_event(channel, user, title, description, colour)
 
     @Cog.listener()
     @log
     async def on_member_ban(self, guild, user: Union[User, Member]):
         # If the person was in the guild at the time of the ban, this will be passed a Member
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "member_ban"
+            "member_ban", guild
         )
 
         channel = self.bot.get_channel(channel_id)
-        logs = await guild.audit_logs(limit=1, action=AuditLogAction.ban).next()
-        source = logs.user.mention if logs.target == user else None
-        reason = logs.reason if logs.target == user else None
+        entry = await self.try_audit_entry(
+            AuditLogAction.ban, guild, lambda e: e.target.id == user.id
+        )
+        source = entry.user.mention if entry else None
+        reason = entry.reason if entry else None
         description = description.format(user=str(user), source=source, reason=reason)
         await self.log_event(channel, user, title, description, colour)
 
@@ -234,65 +325,136 @@ class Logging(Cog):
     @log
     async def on_member_unban(self, guild, user: User):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "user_unban"
+            "user_unban", guild
         )
 
         channel = self.bot.get_channel(channel_id)
-        logs = await guild.audit_logs(limit=1, action=AuditLogAction.unban).next()
-        source = logs.user.mention if logs.target == user else None
+        entry = await self.try_audit_entry(
+            AuditLogAction.unban, guild, lambda e: e.target.id == user.id
+        )
+        source = entry.user.mention if entry else None
         description = description.format(user=str(user), source=source)
         await self.log_event(channel, user, title, description, colour)
 
     @Cog.listener()
     @log
     async def on_member_update(self, before: Member, after: Member):
-        if before.nick != after.nick:
+        self.member_updates.add(before, after)
+
+    @Cog.listener()
+    @log
+    async def on_uncached_member_update(self, after: Member):
+        """Work out the member's state before from the audit log, as it was not cached.
+
+        Only nickname and role changes made in the last few seconds can be worked out.
+        Anything else the update may have changed is not logged.
+        """
+        guild, before = after.guild, Member._copy(after)
+        nick = await self.try_audit_entry(
+            AuditLogAction.member_update,
+            guild,
+            lambda e: e.target.id == after.id
+            and getattr(e.changes.after, "nick", None) == after.nick
+            and hasattr(e.changes.before, "nick"),
+        )
+        if nick is not None:
+            before.nick = nick.changes.before.nick
+        roles = await self.try_audit_entry(
+            AuditLogAction.member_role_update, guild, lambda e: e.target.id == after.id
+        )
+        if roles is not None:
+            added = {role.id for role in roles.changes.after.roles}
+            removed = {role.id for role in roles.changes.before.roles}
+            # An entry older than the roles they have now would undo the wrong change
+            if added <= set(after._roles) and not removed & set(after._roles):
+                before._roles = SnowflakeList(
+                    [r for r in after._roles if r not in added] + list(removed)
+                )
+        # discord.py dispatches any further updates while the audit log is looked up
+        self.member_updates.add(before, after, earlier=True)
+
+    @log
+    async def log_member_update(self, before: Member, after: Member):
+        """Log the net change over a burst of updates to a member."""
+        nick = before.nick != after.nick
+        before_roles, after_roles = set(before.roles), set(after.roles)
+        added = [role for role in after.roles if role not in before_roles]
+        removed = [role for role in before.roles if role not in after_roles]
+        pending = before.pending and not after.pending
+
+        changes = sum(map(bool, (nick, added, removed, pending)))
+        if changes > 1:
+            await self.on_member_changes(before, after, added, removed)
+        elif nick:
             await self.on_member_nick(before, after)
-        if any(set(after.roles) - set(before.roles)):
-            await self.on_member_role(before, after)
-        if any(set(before.roles) - set(after.roles)):
-            await self.on_member_derole(before, after)
+        elif added:
+            await self.on_member_role(after, added)
+        elif removed:
+            await self.on_member_derole(after, removed)
+        elif pending:
+            await self.on_member_cease_pending(before, after)
+
+    @log
+    async def on_member_changes(
+        self, before: Member, after: Member, added: List[Role], removed: List[Role]
+    ):
+        channel_id, title, description, colour = await self.get_config_parts_from_name(
+            "member_update", after.guild
+        )
+
+        changes = []
+        if before.nick != after.nick:
+            changes.append(f"**Nickname:** {before.nick} → {after.nick}")
+        if added:
+            changes.append(f"**Roles added:** {', '.join(r.mention for r in added)}")
+        if removed:
+            changes.append(
+                f"**Roles removed:** {', '.join(r.mention for r in removed)}"
+            )
         if before.pending and not after.pending:
-            pass
+            changes.append("Cleared membership screening.")
+        channel = self.bot.get_channel(channel_id)
+        description = description.format(ping=after.mention, changes="\n".join(changes))
+        await self.log_event(channel, after, title, description, colour)
 
     @log
     async def on_member_nick(self, before: Member, after: Member):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "nickname"
+            "nickname", after.guild
         )
 
         channel = self.bot.get_channel(channel_id)
         description = description.format(before=before.nick, after=after.nick)
-        await self.log_event(channel, before, title, description, colour)
+        await self.log_or_digest(
+            "nickname", channel, before, title, description, colour
+        )
 
     @log
-    async def on_member_role(self, before: Member, after: Member):
+    async def on_member_role(self, member: Member, roles: List[Role]):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "role_add"
+            "role_add", member.guild
         )
 
         channel = self.bot.get_channel(channel_id)
-        roles = [role.mention for role in after.roles if role not in before.roles]
         title = title.format(plural="" if len(roles) == 1 else "s")
-        description = description.format(roles=", ".join(roles))
-        await self.log_event(channel, before, title, description, colour)
+        description = description.format(roles=", ".join(r.mention for r in roles))
+        await self.log_event(channel, member, title, description, colour)
 
     @log
-    async def on_member_derole(self, before: Member, after: Member):
+    async def on_member_derole(self, member: Member, roles: List[Role]):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "role_remove"
+            "role_remove", member.guild
         )
 
         channel = self.bot.get_channel(channel_id)
-        roles = [role.mention for role in before.roles if role not in after.roles]
         title = title.format(plural="" if len(roles) == 1 else "s")
-        description = description.format(roles=", ".join(roles))
-        await self.log_event(channel, before, title, description, colour)
+        description = description.format(roles=", ".join(r.mention for r in roles))
+        await self.log_event(channel, member, title, description, colour)
 
     @log
     async def on_member_cease_pending(self, _: Member, after: Member):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "member_pending"
+            "member_pending", after.guild
         )
 
         description = description.format(ping=after.mention)
@@ -309,38 +471,92 @@ class Logging(Cog):
         if before.avatar_url != after.avatar_url:
             await self.on_user_avatar(before, after)
 
+    @log
+    async def log_user_event(self, name: str, user: User, thumbnail_url=None, **values):
+        """Log a change to a user in every guild they share with the bot."""
+        for guild in user.mutual_guilds:
+            channel_id, title, description, colour = (
+                await self.get_config_parts_from_name(name, guild)
+            )
+            channel = self.bot.get_channel(channel_id)
+            description = description.format(**values)
+            await self.log_event(
+                channel, user, title, description, colour, thumbnail_url=thumbnail_url
+            )
+
     @log
     async def on_user_name(self, before: User, after: User):
-        channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "member_username"
+        await self.log_user_event(
+            "member_username", after, before=before.name, after=after.name
         )
 
-        channel = self.bot.get_channel(channel_id)
-        description = description.format(before=before.name, after=after.name)
-        await self.log_event(channel, after, title, description, colour)
-
     @log
     async def on_user_discriminator(self, before: User, after: User):
-        channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "member_discriminator"
-        )
+        await self.log_user_event(
+            "member_discriminator",
+            after,
+            before=before.discriminator,
+            after=after.discriminator,
+        )
+
+    @log
+    async def on_user_avatar(self, before: User, after: User):
+        before_url, after_url = str(before.avatar_url), str(after.avatar_url)
+        if isinstance(self.dispatcher, RemoteDispatcher):
+            # Workers archive and record the avatars, then fill in and send the embeds
+            embeds = []
+            for guild in after.mutual_guilds:
+                channel_id, title, description, colour = (
+                    await self.get_config_parts_from_name("member_avatar", guild)
+                )
+                if self.bot.get_channel(channel_id) is None:
+                    continue
+                embed = self.make_embed(
+                    after, title, "", colour, thumbnail_url=after.avatar_url
+                )
+                embeds.append((channel_id, embed, description))
+            self.dispatcher.avatar_change(
+                after.id, str(after), before_url, after_url, after.mention, embeds
+            )
+            return
 
-        channel = self.bot.get_channel(channel_id)
-        description = description.format(
-            before=before.discriminator, after=after.discriminator
+        db = await Database.get(self.bot)
+        before_digest, after_digest = await archive_change(
+            self.avatars, db, after.id, str(after), before_url, after_url
+        )
+        await self.log_user_event(
+            "member_avatar",
+            after,
+            thumbnail_url=after.avatar_url,
+            ping=after.mention,
+            before=before_digest,
+            after=after_digest,
         )
-        await self.log_event(channel, after, title, description, colour)
 
+    @Cog.listener()
     @log
-    async def on_user_avatar(self, _: User, after: User):
-        channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "member_avatar"
-        )
+    async def on_message(self, message: Message):
+        if message.guild is not None:
+            record = StoredMessage.from_message(message)
+            self.messages.add(record)
+            self.journal.record(record)
 
-        channel = self.bot.get_channel(channel_id)
-        description = description.format(ping=after.mention)
-        await self.log_event(
-            channel, after, title, description, colour, thumbnail_url=after.avatar_url
+    @staticmethod
+    def format_edit(
+        description: str, before: Optional[str], after: str, link: str
+    ) -> str:
+        """Fill in an edit template, showing only what changed if that fits."""
+        diff = render_diff(before, after) if before is not None else None
+        if diff is None:
+            diff = (
+                f"**Before:** {truncate(before or '', EDIT_PREVIEW)}\n"
+                f"**+After:** {truncate(after, EDIT_PREVIEW)}"
+            )
+        return description.format(
+            before=before and truncate(before, EDIT_PREVIEW),
+            after=truncate(after, EDIT_PREVIEW),
+            diff=diff,
+            link=link,
         )
 
     @Cog.listener()
@@ -348,49 +564,114 @@ class Logging(Cog):
     async def on_message_edit(self, before: Message, after: Message):
         if before.content == after.content:
             return
+        self.messages.edit(after.id, after.content)
+        self.journal.record(StoredMessage.from_message(after))
 
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "message_edit"
+            "message_edit", before.guild
         )
         channel = self.bot.get_channel(channel_id)
 
         title = title.format(channel=f"#{before.channel}")
-        description = description.format(
-            before=before.content, after=after.content, link=after.jump_url
+        description = self.format_edit(
+            description, before.content, after.content, after.jump_url
         )
         await self.log_event(channel, before.author, title, description, colour)
 
     @Cog.listener()
     @log
-    async def on_raw_message_edit(self, payload):
+    async def on_raw_message_edit(self, payload: RawMessageUpdateEvent):
         if payload.cached_message is not None:
             # Cached messages are handled by the event above, `on_message_edit`
             return
+        if (content := payload.data.get("content")) is None:
+            # Updates without content, such as link embeds loading, are not edits
+            return
 
+        stored = self.messages.edit(payload.message_id, content)
+        if stored is None:
+            stored = await self.journal.get(payload.message_id)
+        if stored is not None:
+            if stored.content == content:
+                return
+            self.journal.record(
+                StoredMessage(
+                    stored.id,
+                    stored.channel_id,
+                    stored.author_id,
+                    content,
+                    stored.attachments,
+                )
+            )
+        name = "message_edit_uncached" if stored is None else "message_edit"
+        source = self.bot.get_channel(payload.channel_id)
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "message_edit_uncached"
+            name, getattr(source, "guild", None)
         )
         channel = self.bot.get_channel(channel_id)
-        message = await self.bot.get_channel(payload.channel_id).fetch_message(
-            payload.message_id
-        )
-        title = title.format(channel=f"#{channel}")
-        description = description.format(after=message.content, link=message.jump_url)
-        await self.log_event(channel, message.author, title, description, colour)
+        author_id = payload.data.get("author", {}).get("id")
+        if author_id is None and stored is not None:
+            author_id = stored.author_id
+        link = (
+            f"https://discord.com/channels/{payload.data.get('guild_id')}/"
+            f"{payload.channel_id}/{payload.message_id}"
+        )
+        title = title.format(channel=f"#{source}")
+        description = self.format_edit(
+            description, stored and stored.content, content, link
+        )
+        author = None
+        if author_id is not None:
+            cache = await MemberCache.get(self.bot)
+            author = await cache.fetch_user(
+                getattr(source, "guild", None), int(author_id)
+            )
+        await self.log_event(channel, author, title, description, colour)
 
-    @Cog.listener()
     @log
-    async def on_message_delete(self, message: Message):
+    async def log_message_delete(
+        self, source, author: Optional[Union[User, Member]], content, attachments
+    ):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "message_delete"
+            "message_delete", getattr(source, "guild", None)
         )
 
         channel = self.bot.get_channel(channel_id)
-        title = title.format(channel=message.channel)
+        title = title.format(channel=source)
+        message = "\n".join([content, *attachments])
         description = description.format(
-            ping=message.author.mention, message=message.content
+            ping=author.mention if author else "Unknown", message=message
+        )
+        await self.log_event(channel, author, title, description, colour)
+
+    @Cog.listener()
+    @log
+    async def on_message_delete(self, message: Message):
+        self.messages.pop(message.id)
+        attachments = [a.url for a in message.attachments]
+        await self.log_message_delete(
+            message.channel, message.author, message.content, attachments
+        )
+
+    @Cog.listener()
+    @log
+    async def on_raw_message_delete(self, payload: RawMessageDeleteEvent):
+        if payload.cached_message is not None:
+            # Cached messages are handled by the event above, `on_message_delete`
+            return
+        stored = self.messages.pop(payload.message_id)
+        if stored is None:
+            stored = await self.journal.get(payload.message_id)
+        if stored is None:
+            return
+        source = self.bot.get_channel(stored.channel_id)
+        cache = await MemberCache.get(self.bot)
+        await self.log_message_delete(
+            source,
+            await cache.fetch_user(getattr(source, "guild", None), stored.author_id),
+            stored.content,
+            stored.attachments,
         )
-        await self.log_event(channel, message.author, title, description, colour)
 
     @Cog.listener()
     @log
@@ -407,49 +688,55 @@ class Logging(Cog):
     @log
     async def on_voice_join(self, member: Member, _: VoiceState, after: VoiceState):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "voice_join"
+            "voice_join", member.guild
         )
 
         channel = self.bot.get_channel(channel_id)
         description = description.format(
             ping=member.mention, channel=after.channel.mention
         )
-        await self.log_event(channel, member, title, description, colour)
+        await self.log_or_digest(
+            "voice_join", channel, member, title, description, colour
+        )
 
     @log
     async def on_voice_leave(self, member: Member, before: VoiceState, _: VoiceState):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "voice_leave"
+            "voice_leave", member.guild
         )
 
         channel = self.bot.get_channel(channel_id)
         description = description.format(
             ping=member.mention, channel=before.channel.mention
         )
-        await self.log_event(channel, member, title, description, colour)
+        await self.log_or_digest(
+            "voice_leave", channel, member, title, description, colour
+        )
 
     @log
     async def on_voice_move(self, member: Member, before, after):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "voice_move"
+            "voice_move", member.guild
         )
 
         channel = self.bot.get_channel(channel_id)
         description = description.format(
             before=before.channel.mention, after=after.channel.mention
         )
-        await self.log_event(channel, member, title, description, colour)
+        await self.log_or_digest(
+            "voice_move", channel, member, title, description, colour
+        )
 
     @Cog.listener()
     @log
     async def on_guild_channel_delete(self, channel: GuildChannel):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "channel_delete"
+            "channel_delete", channel.guild
         )
 
         entry = await self.try_audit_entry(
             AuditLogAction.channel_delete,
-            channel.guild.audit_logs,
+            channel.guild,
             lambda e: e.target.id == channel.id,
         )
 
@@ -470,12 +757,12 @@ class Logging(Cog):
     @log
     async def on_guild_channel_create(self, channel: GuildChannel):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "channel_create"
+            "channel_create", channel.guild
         )
 
         entry = await self.try_audit_entry(
             AuditLogAction.channel_create,
-            channel.guild.audit_logs,
+            channel.guild,
             lambda e: e.target == channel,
         )
 
@@ -497,11 +784,11 @@ class Logging(Cog):
     @log
     async def on_guild_channel_update(self, before: GuildChannel, after: GuildChannel):
         channel_id, title, description, colour = await self.get_config_parts_from_name(
-            "channel_update"
+            "channel_update", after.guild
         )
         entry = await self.try_audit_entry(
             AuditLogAction.channel_update,
-            after.guild.audit_logs,
+            after.guild,
             lambda e: e.target == before or e.target == after,
         )
         channel_type = self.get_channel_type(after)
@@ -0,0 +1,193 @@
+"""The policy for which members are kept in memory.
+
+With `cache.members` set to `all`, discord.py keeps every member, as it does by
+default. Set to `active`, it keeps only the bot and members in voice, and this cog
+keeps the members most recently seen sending messages, joining, leaving voice or
+being moderated, up to `cache.active_members` in each guild. Anything else needing a
+member that is not cached fetches it from Discord through this cog.
+
+discord.py drops removals and updates of members it has not cached. When not keeping
+all members, this cog dispatches them instead as `on_uncached_member_remove(guild,
+user)` and `on_uncached_member_update(member)`, built from the gateway payload.
+"""
+
+import asyncio
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from discord import Guild, HTTPException, Member, Message, NotFound, User, VoiceState
+from discord.ext import tasks
+from discord.ext.commands import Bot, Cog
+
+from config import CONFIG
+from utils.logging import trace_func
+from utils.member_cache import RecentMembers
+
+__all__ = ["MemberCache"]
+
+logger = logging.getLogger("parnassius.cogs.member_cache")
+log = trace_func(logger)
+
+# Discord answers a gateway member query with at most this many members
+QUERY_LIMIT = 100
+
+
+class MemberCache(Cog):
+    @log
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        config = CONFIG["cache"]
+        self.keep_all = config["members"].as_choice(["all", "active"]) == "all"
+        self.capacity = config["active_members"].get(int)
+        self.recent: Dict[int, RecentMembers] = {}
+        # discord.py's own parsers for the events watched for uncached members
+        self.parsers: Dict[str, Callable[[dict], None]] = {}
+        if not self.keep_all:
+            self.trim.start()
+            self.watch_uncached()
+
+    @log
+    def cog_unload(self):
+        self.trim.cancel()
+        self.bot._connection.parsers.update(self.parsers)
+
+    @log
+    def watch_uncached(self):
+        # The gateway shares this dict, and parses events synchronously, so whether the
+        # member was cached can be checked just before discord.py looks for them
+        parsers = self.bot._connection.parsers
+        for event, parse in (
+            ("GUILD_MEMBER_REMOVE", self.parse_member_remove),
+            ("GUILD_MEMBER_UPDATE", self.parse_member_update),
+        ):
+            self.parsers[event] = parsers[event]
+            parsers[event] = parse
+
+    def cached_guild(self, data: dict) -> Tuple[Optional[Guild], bool]:
+        """The payload's guild, and whether it has the payload's member cached."""
+        guild = self.bot.get_guild(int(data["guild_id"]))
+        member_id = int(data["user"]["id"])
+        return guild, guild is not None and guild.get_member(member_id) is not None
+
+    def parse_member_remove(self, data: dict):
+        guild, cached = self.cached_guild(data)
+        self.parsers["GUILD_MEMBER_REMOVE"](data)
+        if guild is not None and not cached:
+            user = User(state=self.bot._connection, data=data["user"])
+            self.bot.dispatch("uncached_member_remove", guild, user)
+
+    def parse_member_update(self, data: dict):
+        guild, cached = self.cached_guild(data)
+        self.parsers["GUILD_MEMBER_UPDATE"](data)
+        if guild is not None and not cached:
+            member = Member(data=data, guild=guild, state=self.bot._connection)
+            # Further updates to them are then dispatched by discord.py, with the
+            # member as they were before
+            self.retain(member)
+            self.bot.dispatch("uncached_member_update", member)
+
+    @classmethod
+    @log
+    async def get(cls, bot: Bot) -> "MemberCache":
+        await bot.wait_until_ready()
+        return bot.get_cog(cls.__name__)
+
+    def retain(self, member: Member):
+        """Keep a member cached, as one recently active or acted on."""
+        if self.keep_all or not isinstance(member, Member):
+            return
+        if (recent := self.recent.get(member.guild.id)) is None:
+            recent = self.recent[member.guild.id] = RecentMembers(
+                member.guild, self.capacity
+            )
+        recent.touch(member)
+
+    @log
+    async def fetch_members(
+        self, guild: Guild, user_ids: Iterable[int]
+    ) -> List[Member]:
+        """The members with these IDs, fetching those not cached from Discord.
+
+        IDs of users not in the guild are left out.
+        """
+        members, missing = [], []
+        for user_id in user_ids:
+            if (member := guild.get_member(user_id)) is not None:
+                members.append(member)
+            else:
+                missing.append(user_id)
+        for start in range(0, len(missing), QUERY_LIMIT):
+            batch = missing[start : start + QUERY_LIMIT]
+            try:
+                members += await guild.query_members(
+                    user_ids=batch, limit=len(batch), cache=self.keep_all
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Timed out fetching {len(batch)} members of {guild}")
+        for member in members:
+            self.retain(member)
+        return members
+
+    @log
+    async def fetch_member(self, guild: Guild, user_id: int) -> Optional[Member]:
+        members = await self.fetch_members(guild, [user_id])
+        return members[0] if members else None
+
+    @log
+    async def fetch_user(
+        self, guild: Optional[Guild], user_id: int
+    ) -> Optional[Union[Member, User]]:
+        """The member with this ID if in the guild, or else the user, if they exist."""
+        if (
+            guild is not None
+            and (member := await self.fetch_member(guild, user_id)) is not None
+        ):
+            return member
+        if (user := self.bot.get_user(user_id)) is not None:
+            return user
+        try:
+            return await self.bot.fetch_user(user_id)
+        except NotFound:
+            return None
+        except HTTPException as e:
+            logger.warning(f"Could not fetch user {user_id}: {e}")
+            return None
+
+    @Cog.listener()
+    @log
+    async def on_message(self, message: Message):
+        self.retain(message.author)
+
+    @Cog.listener()
+    @log
+    async def on_member_join(self, member: Member):
+        self.retain(member)
+
+    @Cog.listener()
+    @log
+    async def on_voice_state_update(
+        self, member: Member, _: VoiceState, after: VoiceState
+    ):
+        # discord.py stops keeping members once they leave voice
+        if after.channel is None:
+            self.retain(member)
+
+    @tasks.loop(minutes=10)
+    @log
+    async def trim(self):
+        """Remove members cached by discord.py or a converter, and not kept since."""
+        for guild in self.bot.guilds:
+            if (recent := self.recent.get(guild.id)) is None:
+                recent = self.recent[guild.id] = RecentMembers(guild, self.capacity)
+            if removed := recent.trim():
+                logger.info(f"Removed {removed} inactive members of {guild} from cache")
+
+    @trim.before_loop
+    @log
+    async def before_trim(self):
+        await self.bot.wait_until_ready()
+
+
+@log
+def setup(bot: Bot):
+    bot.add_cog(MemberCache(bot))
@@ -0,0 +1,272 @@
+"""Instrumentation of the bot, served for Prometheus to scrape.
+
+Every cog listener is wrapped to time it and count its errors. Command bodies are
+timed, and their failures counted, through the bot's invoke hooks rather than an error
+listener, which would stop discord.py printing errors that nothing else handles.
+Database statements are timed from SQLAlchemy's engine events, and Discord rate-limit
+waits are read from discord.py's HTTP logging, the only place it reports them. Queue
+depths are read when scraped.
+
+Listeners are wrapped when this cog is loaded, so it is loaded after the others. A
+cog reloaded later is not instrumented until this one is reloaded too.
+"""
+
+import asyncio
+import logging
+from functools import wraps
+from time import perf_counter
+from typing import Callable, List, Tuple
+
+from aiohttp import web
+from discord.ext.commands import Bot, Cog, Context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from cogs.logging import Logging
+from cogs.voice import VoiceTracker
+from config import CONFIG
+from utils.logging import trace_func
+from utils.metrics import REGISTRY, Counter, Gauge, Histogram
+from utils.rate_limits import add_http_handler, parse_record, remove_http_handler
+
+__all__ = ["Metrics"]
+
+logger = logging.getLogger("parnassius.cogs.metrics")
+log = trace_func(logger)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Statements are labelled by their first keyword, to keep the number of series small
+VERBS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"})
+RATE_LIMIT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class RateLimitHandler(logging.Handler):
+    """Records the rate-limit waits logged by discord.py's HTTP client."""
+
+    def __init__(self, metrics: "Metrics"):
+        super().__init__(logging.DEBUG)
+        self.metrics = metrics
+
+    def emit(self, record: logging.LogRecord):
+        if (limit := parse_record(record)) is None:
+            return
+        if limit.cause == "global":
+            self.metrics.global_rate_limits.labels().inc()
+        else:
+            self.metrics.rate_limit_waits.labels(limit.cause).observe(limit.wait)
+
+
+class Metrics(Cog):
+    @log
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.listener_seconds = Histogram(
+            "parnassius_listener_seconds",
+            "Time spent handling an event, by cog and listener",
+            ["cog", "listener"],
+        )
+        self.listener_errors = Counter(
+            "parnassius_listener_errors",
+            "Exceptions raised by listeners, by cog and listener",
+            ["cog", "listener"],
+        )
+        self.command_seconds = Histogram(
+            "parnassius_command_seconds",
+            "Time spent in command bodies, by command",
+            ["command"],
+        )
+        self.command_errors = Counter(
+            "parnassius_command_errors",
+            "Commands that raised an exception, by command",
+            ["command"],
+        )
+        self.statement_seconds = Histogram(
+            "parnassius_db_statement_seconds",
+            "Time spent executing database statements, by statement type",
+            ["statement"],
+        )
+        self.db_errors = Counter(
+            "parnassius_db_errors", "Database statements that raised an error"
+        )
+        self.rate_limit_waits = Histogram(
+            "parnassius_discord_rate_limit_wait_seconds",
+            "Time Discord requests waited on rate limits, by cause",
+            ["cause"],
+            buckets=RATE_LIMIT_BUCKETS,
+        )
+        self.global_rate_limits = Counter(
+            "parnassius_discord_global_rate_limits",
+            "Times the global rate limit was hit",
+        )
+        self.metrics = [
+            self.listener_seconds,
+            self.listener_errors,
+            self.command_seconds,
+            self.command_errors,
+            self.statement_seconds,
+            self.db_errors,
+            self.rate_limit_waits,
+            self.global_rate_limits,
+            Gauge(
+                "parnassius_log_queue_depth",
+                "Embeds waiting to be sent, by logging channel",
+                ["channel"],
+                collect=self.log_queue_depths,
+            ),
+            Gauge(
+                "parnassius_member_updates_pending",
+                "Members with updates waiting to be coalesced",
+                collect=self.member_updates_pending,
+            ),
+            Gauge(
+                "parnassius_voice_sessions_unwritten",
+                "Closed voice sessions waiting to be written",
+                collect=self.voice_sessions_unwritten,
+            ),
+        ]
+        for metric in self.metrics:
+            REGISTRY.register(metric)
+        # (cog, event, method name, listener, wrapper)
+        self.instrumented: List[Tuple[Cog, str, str, Callable, Callable]] = []
+        for cog in list(self.bot.cogs.values()):
+            self.instrument(cog)
+        self.bot.before_invoke(self.before_invoke)
+        self.bot.after_invoke(self.after_invoke)
+        event.listen(Engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self.after_cursor_execute)
+        event.listen(Engine, "handle_error", self.handle_error)
+
+        self.rate_limit_handler = RateLimitHandler(self)
+        add_http_handler(self.rate_limit_handler)
+
+        self.runner = None
+        asyncio.ensure_future(self.serve())
+
+    @log
+    def cog_unload(self):
+        for cog, name, method_name, listener, wrapper in self.instrumented:
+            if self.bot.get_cog(cog.qualified_name) is not cog:
+                continue
+            self.bot.remove_listener(wrapper, name)
+            self.bot.add_listener(listener, name)
+            delattr(cog, method_name)
+        self.instrumented.clear()
+        self.bot._before_invoke = None
+        self.bot._after_invoke = None
+        event.remove(Engine, "before_cursor_execute", self.before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", self.after_cursor_execute)
+        event.remove(Engine, "handle_error", self.handle_error)
+        remove_http_handler(self.rate_limit_handler)
+        for metric in self.metrics:
+            REGISTRY.unregister(metric)
+        if self.runner is not None:
+            asyncio.ensure_future(self.runner.cleanup())
+
+    @classmethod
+    @log
+    async def get(cls, bot: Bot) -> "Metrics":
+        await bot.wait_until_ready()
+        return bot.get_cog(cls.__name__)
+
+    @log
+    def instrument(self, cog: Cog):
+        """Replace the cog's listeners with ones that time them and count errors."""
+        for name, method_name in cog.__cog_listeners__:
+            listener = getattr(cog, method_name)
+            labels = (cog.qualified_name, method_name)
+            wrapper = self.timed(
+                listener,
+                self.listener_seconds.labels(*labels),
+                self.listener_errors.labels(*labels),
+            )
+            self.bot.remove_listener(listener, name)
+            self.bot.add_listener(wrapper, name)
+            # The cog removes its listeners by looking them up on itself when unloaded
+            setattr(cog, method_name, wrapper)
+            self.instrumented.append((cog, name, method_name, listener, wrapper))
+
+    @staticmethod
+    def timed(listener: Callable, seconds, errors) -> Callable:
+        @wraps(listener)
+        async def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                await listener(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                seconds.observe(perf_counter() - start)
+
+        return wrapper
+
+    async def before_invoke(self, ctx: Context):
+        ctx.invoked_at = perf_counter()
+
+    async def after_invoke(self, ctx: Context):
+        elapsed = perf_counter() - ctx.invoked_at
+        name = ctx.command.qualified_name
+        self.command_seconds.labels(name).observe(elapsed)
+        if ctx.command_failed:
+            self.command_errors.labels(name).inc()
+
+    def before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("metrics_started", []).append(perf_counter())
+
+    def after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        elapsed = perf_counter() - conn.info["metrics_started"].pop()
+        verb = statement.lstrip()[:6].upper()
+        self.statement_seconds.labels(verb if verb in VERBS else "OTHER").observe(
+            elapsed
+        )
+
+    def handle_error(self, context):
+        self.db_errors.labels().inc()
+        if context.connection is not None:
+            started = context.connection.info.get("metrics_started")
+            if started:
+                started.pop()
+
+    def log_queue_depths(self):
+        logging_cog = self.bot.get_cog(Logging.__name__)
+        if logging_cog is None:
+            return {}
+        stats = logging_cog.dispatcher.stats()
+        return {(str(i),): depth for i, (depth, _) in stats.items()}
+
+    def member_updates_pending(self):
+        logging_cog = self.bot.get_cog(Logging.__name__)
+        if logging_cog is None:
+            return {}
+        return {(): len(logging_cog.member_updates.pending)}
+
+    def voice_sessions_unwritten(self):
+        voice = self.bot.get_cog(VoiceTracker.__name__)
+        if voice is None:
+            return {}
+        return {(): len(voice.closed)}
+
+    @log
+    async def serve(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.scrape)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        host = CONFIG["metrics"]["host"].get(str)
+        port = CONFIG["metrics"]["port"].get(int)
+        await web.TCPSite(self.runner, host, port).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    async def scrape(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=REGISTRY.render().encode(), headers={"Content-Type": CONTENT_TYPE}
+        )
+
+
+@log
+def setup(bot: Bot):
+    bot.add_cog(Metrics(bot))
@@ -0,0 +1,153 @@
+"""Reporting of blocking calls on the event loop.
+
+The loop's lag is recorded to the metrics continuously. Stalls longer than the
+threshold are counted by the cog and method whose code was running, and reported to
+the moderation log channel with the stack of the blocking call, at most once per
+method in each cooldown.
+"""
+
+import asyncio
+import inspect
+import logging
+import re
+from time import monotonic
+from typing import Dict, Tuple
+
+from discord.ext import tasks
+from discord.ext.commands import Bot, Cog, Command
+
+from cogs.logging import Logging
+from config import CONFIG, snapshot
+from utils.diff import truncate
+from utils.logging import trace_func
+from utils.loop_monitor import LoopMonitor, Stall
+from utils.metrics import REGISTRY, Counter, Histogram
+
+__all__ = ["Monitor"]
+
+logger = logging.getLogger("parnassius.cogs.monitor")
+log = trace_func(logger)
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# The coroutine a task was running, as asyncio or discord.py describe it
+TASK_CORO = re.compile(r"coro=<(?:function )?(\w+)\.(\w+)\b")
+# Frames of the stack shown in a report, innermost last
+STACK_FRAMES = 12
+STACK_CHARACTERS = 3000
+
+Location = Tuple[str, str]
+UNKNOWN: Location = ("unknown", "unknown")
+
+
+def methods(cog: Cog):
+    """The functions making up a cog, by name, whatever they are wrapped in."""
+    for cls in inspect.getmro(type(cog)):
+        if not issubclass(cls, Cog) or cls is Cog:
+            continue
+        for name, value in vars(cls).items():
+            if isinstance(value, (staticmethod, classmethod)):
+                value = value.__func__
+            elif isinstance(value, property):
+                value = value.fget
+            elif isinstance(value, Command):
+                value = value.callback
+            elif isinstance(value, tasks.Loop):
+                value = value.coro
+            if callable(value):
+                yield name, inspect.unwrap(value)
+
+
+class Monitor(Cog):
+    @log
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        config = CONFIG["loop_monitor"]
+        self.cooldown = config["report_cooldown"].as_number()
+        self.lag = Histogram(
+            "parnassius_loop_lag_seconds",
+            "How late the event loop ran the lag monitor",
+            buckets=LAG_BUCKETS,
+        )
+        self.stalls = Counter(
+            "parnassius_loop_stalls",
+            "Times the event loop was blocked past the threshold, by cog and method",
+            ["cog", "method"],
+        )
+        REGISTRY.register(self.lag)
+        REGISTRY.register(self.stalls)
+        self.reported: Dict[Location, float] = {}
+        self.monitor = LoopMonitor(
+            interval=config["interval"].as_number(),
+            threshold=config["threshold"].as_number(),
+            on_lag=self.lag.labels().observe,
+            on_stall=self.on_stall,
+            asyncio_debug=config["asyncio_debug"].get(bool),
+        )
+        # Started from the loop, so it knows which thread to watch
+        asyncio.get_event_loop().call_soon(self.monitor.start)
+
+    @log
+    def cog_unload(self):
+        self.monitor.stop()
+        REGISTRY.unregister(self.lag)
+        REGISTRY.unregister(self.stalls)
+
+    @classmethod
+    @log
+    async def get(cls, bot: Bot) -> "Monitor":
+        await bot.wait_until_ready()
+        return bot.get_cog(cls.__name__)
+
+    @log
+    def locate(self, stall: Stall) -> Location:
+        """The cog and method whose code was innermost on the stack, if any."""
+        code = {
+            function.__code__: (cog.qualified_name, name)
+            for cog in self.bot.cogs.values()
+            for name, function in methods(cog)
+            if hasattr(function, "__code__")
+        }
+        for frame_code in reversed(stall.code):
+            if (location := code.get(frame_code)) is not None:
+                return location
+        if stall.callback and (match := TASK_CORO.search(stall.callback)):
+            return match.group(1), match.group(2)
+        return UNKNOWN
+
+    @log
+    def on_stall(self, stall: Stall):
+        location = self.locate(stall)
+        self.stalls.labels(*location).inc()
+        cog, method = location
+        logger.warning(f"Event loop blocked for {stall.lag:.3f}s in {cog}.{method}")
+        now = monotonic()
+        if now - self.reported.get(location, -self.cooldown) < self.cooldown:
+            return
+        self.reported[location] = now
+        asyncio.ensure_future(self.report(stall, location))
+
+    @log
+    async def report(self, stall: Stall, location: Location):
+        logging_cog = self.bot.get_cog(Logging.__name__)
+        channel_id, title, description, colour = snapshot().logging.sections[
+            "loop_stall"
+        ]
+        if logging_cog is None or (channel := self.bot.get_channel(channel_id)) is None:
+            return
+        stack = "Not sampled, as the loop was not blocked long enough."
+        if stall.stack is not None:
+            stack = "".join(stall.stack.format()[-STACK_FRAMES:])
+            # Keep the innermost frames, where the blocking call is
+            stack = truncate(stack[::-1], STACK_CHARACTERS)[::-1]
+        description = description.format(
+            lag=f"{stall.lag:.3f}s",
+            location="{}.{}".format(*location),
+            callback=stall.callback or "",
+            stack=stack.replace("```", "`\u200b``"),
+        )
+        await logging_cog.log_event(channel, None, title, description, colour)
+
+
+@log
+def setup(bot: Bot):
+    bot.add_cog(Monitor(bot))
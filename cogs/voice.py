@@ -0,0 +1,237 @@
+"""Tracking of how long members spend in voice channels.
+
+Open sessions are kept in memory. Closed ones are written in batches, together with
+per-day totals that `voicestats` reads instead of summing every session. Sessions in
+progress at a restart are picked up again from the guilds' voice states, starting
+from when the bot came back, rather than being recovered from history.
+"""
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Tuple, Union
+
+from discord import Member, User, VoiceState
+from discord.ext import tasks
+from discord.ext.commands import Bot, Cog
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+from cogs.database import Database
+from cogs.member_cache import MemberCache
+from config import CONFIG
+from models import VoiceDailyAggregate, VoiceSession
+from utils.logging import trace_func
+
+__all__ = ["VoiceTracker"]
+
+logger = logging.getLogger("parnassius.cogs.voice")
+log = trace_func(logger)
+
+UPSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+# A member may be in voice in several guilds at once
+Key = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class OpenSession:
+    channel_id: int
+    started_at: datetime
+
+
+@dataclass(frozen=True)
+class ClosedSession:
+    discord_id: int
+    username: str
+    guild_id: int
+    channel_id: int
+    started_at: datetime
+    ended_at: datetime
+
+
+def split_by_day(
+    started_at: datetime, ended_at: datetime
+) -> Iterator[Tuple[date, int]]:
+    """The seconds of a session falling on each day it covers."""
+    start = started_at
+    while start < ended_at:
+        midnight = datetime.combine(start.date() + timedelta(days=1), time())
+        end = min(midnight, ended_at)
+        yield start.date(), int((end - start).total_seconds())
+        start = end
+
+
+def daily_totals(
+    sessions: List[ClosedSession], user_ids: Dict[int, int]
+) -> Dict[Tuple[int, date, int, int], List[int]]:
+    """Seconds and session counts per user, day, channel and its guild, for a batch."""
+    totals = defaultdict(lambda: [0, 0])
+    for session in sessions:
+        user_id = user_ids[session.discord_id]
+        for i, (day, seconds) in enumerate(
+            split_by_day(session.started_at, session.ended_at)
+        ):
+            total = totals[(user_id, day, session.channel_id, session.guild_id)]
+            total[0] += seconds
+            # Only the day the session started counts it
+            total[1] += i == 0
+    return totals
+
+
+class VoiceTracker(Cog):
+    @log
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.open: Dict[Key, OpenSession] = {}
+        self.closed: List[ClosedSession] = []
+        self.flush.change_interval(
+            seconds=CONFIG["voice"]["flush_interval"].as_number()
+        )
+        self.flush.start()
+
+    @log
+    def cog_unload(self):
+        self.flush.cancel()
+        self.write()
+
+    @classmethod
+    @log
+    async def get(cls, bot: Bot) -> "VoiceTracker":
+        await bot.wait_until_ready()
+        return bot.get_cog(cls.__name__)
+
+    def open_session(self, key: Key, channel_id: int, now: datetime):
+        self.open[key] = OpenSession(channel_id, now)
+
+    def close_session(
+        self, key: Key, member: Union[Member, User], channel_id: int, now: datetime
+    ):
+        session = self.open.get(key)
+        if session is None or session.channel_id != channel_id:
+            # Missed, or already replaced by the session in the channel joined next
+            return
+        del self.open[key]
+        if now > session.started_at:
+            self.closed.append(
+                ClosedSession(
+                    member.id,
+                    str(member),
+                    key[0],
+                    session.channel_id,
+                    session.started_at,
+                    now,
+                )
+            )
+
+    @Cog.listener()
+    @log
+    async def on_ready(self):
+        """Start sessions for members already in voice, and end any that were missed."""
+        now = datetime.utcnow()
+        in_voice = {}
+        cache = await MemberCache.get(self.bot)
+        for guild in self.bot.guilds:
+            # Unless every member is cached, those in voice are not cached at first
+            await cache.fetch_members(guild, list(guild._voice_states))
+            for channel in (*guild.voice_channels, *guild.stage_channels):
+                for member in channel.members:
+                    in_voice[(guild.id, member.id)] = (member, channel.id)
+        for key, session in list(self.open.items()):
+            member, channel_id = in_voice.get(key, (None, None))
+            if channel_id != session.channel_id:
+                member = member or self.bot.get_user(key[1])
+                if member is not None:
+                    self.close_session(key, member, session.channel_id, now)
+                else:
+                    del self.open[key]
+        for key, (member, channel_id) in in_voice.items():
+            if key not in self.open:
+                self.open_session(key, channel_id, now)
+        logger.info(f"Tracking {len(self.open)} open voice sessions")
+
+    @Cog.listener()
+    @log
+    async def on_voice_state_update(
+        self, member: Member, before: VoiceState, after: VoiceState
+    ):
+        if before.channel == after.channel:
+            return
+        now = datetime.utcnow()
+        key = (member.guild.id, member.id)
+        if before.channel is not None:
+            self.close_session(key, member, before.channel.id, now)
+        if after.channel is not None:
+            self.open_session(key, after.channel.id, now)
+
+    @log
+    def write(self):
+        """Write the closed sessions and add them to the daily totals."""
+        if not self.closed:
+            return
+        sessions, self.closed = self.closed, []
+        try:
+            self.write_sessions(sessions)
+        except Exception as e:
+            # Keep the batch to try again, as an exception would end the flush loop
+            logger.exception(e)
+            self.closed[:0] = sessions
+
+    @log
+    def write_sessions(self, sessions: List[ClosedSession]):
+        db = self.bot.get_cog(Database.__name__)
+        user_ids = db.get_or_create_users({s.discord_id: s.username for s in sessions})
+        totals = daily_totals(sessions, user_ids)
+        upsert = UPSERTS[db.engine.dialect.name](VoiceDailyAggregate)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=["user_id", "day", "channel_id"],
+            set_={
+                "seconds": VoiceDailyAggregate.seconds + upsert.excluded.seconds,
+                "sessions": VoiceDailyAggregate.sessions + upsert.excluded.sessions,
+            },
+        )
+        with db.engine.begin() as connection:
+            connection.execute(
+                insert(VoiceSession),
+                [
+                    {
+                        "user_id": user_ids[s.discord_id],
+                        "channel_id": s.channel_id,
+                        "guild_id": s.guild_id,
+                        "started_at": s.started_at,
+                        "ended_at": s.ended_at,
+                    }
+                    for s in sessions
+                ],
+            )
+            connection.execute(
+                upsert,
+                [
+                    {
+                        "user_id": user_id,
+                        "day": day,
+                        "channel_id": channel_id,
+                        "guild_id": guild_id,
+                        "seconds": total[0],
+                        "sessions": total[1],
+                    }
+                    for (user_id, day, channel_id, guild_id), total in totals.items()
+                ],
+            )
+        logger.info(f"Wrote {len(sessions)} voice sessions")
+
+    @tasks.loop(seconds=60)
+    @log
+    async def flush(self):
+        self.write()
+
+    @flush.before_loop
+    @log
+    async def before_flush(self):
+        await self.bot.wait_until_ready()
+
+
+@log
+def setup(bot: Bot):
+    bot.add_cog(VoiceTracker(bot))
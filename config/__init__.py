@@ -1 +1,3 @@
 from config.config import *
+from config.guilds import *
+from config.snapshot import *
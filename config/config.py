@@ -1,10 +1,24 @@
+from typing import List, Tuple
+
 import confuse
 
-__all__ = ["CONFIG"]
+__all__ = ["CONFIG", "CONFIG_FILES", "load_config"]
+
+# Each file, and whether relative paths in it are relative to its directory.
+# The least important files come first, as later additions override earlier ones.
+CONFIG_FILES: List[Tuple[str, bool]] = [
+    ("resources/discord_logging.yaml", False),
+    ("resources/forbidden_words.yaml", False),
+    ("config.yaml", True),
+]
+
+
+def load_config() -> confuse.Configuration:
+    config = confuse.Configuration("parnassius", __name__)
+    for filename, base_for_paths in CONFIG_FILES:
+        config.set_file(filename, base_for_paths=base_for_paths)
+    config["discord"]["token"].redact = True
+    return config
+
 
-CONFIG = confuse.Configuration("parnassius", __name__)
-# Add the least important files first, as later additions override earlier ones
-CONFIG.set_file("resources/discord_logging.yaml")
-CONFIG.set_file("resources/forbidden_words.yaml")
-CONFIG.set_file("config.yaml", base_for_paths=True)
-CONFIG["discord"]["token"].redact = True
+CONFIG = load_config()
@@ -0,0 +1,94 @@
+"""The configuration of each guild, from the database over the configuration files.
+
+The files configure the home guild, `guild.id`. Any guild, the home guild included,
+can override its roles, logging channels and forbidden words with a row in the
+`guild_settings` table, which `cogs.guilds` loads and passes to `set_overrides`.
+Guilds without settings of their own have no roles or logging channels, and the
+forbidden words of the files.
+
+Lookups are on hot paths, so each guild's `GuildConfig` is built once and reused
+until the overrides or the configuration files change.
+"""
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Mapping, Optional, Tuple
+
+from config.snapshot import GuildConfig, Snapshot, snapshot
+
+__all__ = ["GuildOverrides", "guild_config", "set_overrides", "overrides"]
+
+
+@dataclass(frozen=True)
+class GuildOverrides:
+    """A guild's own settings. Those left as `None` are not overridden."""
+
+    __slots__ = (
+        "exec_roles",
+        "muted_role",
+        "lockdown_extra_roles",
+        "log_channels",
+        "forbidden_words",
+    )
+    exec_roles: Optional[FrozenSet[int]]
+    muted_role: Optional[int]
+    lockdown_extra_roles: Optional[Tuple[int, ...]]
+    # Merged over the defaults channel by channel
+    log_channels: Optional[Mapping[str, int]]
+    forbidden_words: Optional[Tuple[str, ...]]
+
+
+def build(base: Snapshot, guild_id: int, own: Optional[GuildOverrides]) -> GuildConfig:
+    if guild_id == base.guild.id:
+        default = base.guild
+    else:
+        default = GuildConfig(
+            guild_id, frozenset(), None, (), MappingProxyType({}), base.forbidden_words
+        )
+    if own is None:
+        return default
+    log_channels = default.log_channels
+    if own.log_channels is not None:
+        log_channels = MappingProxyType({**log_channels, **own.log_channels})
+    return GuildConfig(
+        guild_id,
+        default.exec_roles if own.exec_roles is None else own.exec_roles,
+        default.muted_role if own.muted_role is None else own.muted_role,
+        (
+            default.lockdown_extra_roles
+            if own.lockdown_extra_roles is None
+            else own.lockdown_extra_roles
+        ),
+        log_channels,
+        default.forbidden_words if own.forbidden_words is None else own.forbidden_words,
+    )
+
+
+_overrides: Mapping[int, GuildOverrides] = MappingProxyType({})
+# The configurations built so far, and the snapshot they were built from
+_configs: Dict[int, GuildConfig] = {}
+_base: Optional[Snapshot] = None
+
+
+def guild_config(guild_id: Optional[int]) -> GuildConfig:
+    """The configuration of a guild, or of the home guild if `guild_id` is `None`."""
+    global _configs, _base
+    base = snapshot()
+    if base is not _base:
+        _configs, _base = {}, base
+    if guild_id is None:
+        guild_id = base.guild.id
+    if (config := _configs.get(guild_id)) is None:
+        config = _configs[guild_id] = build(base, guild_id, _overrides.get(guild_id))
+    return config
+
+
+def overrides() -> Mapping[int, GuildOverrides]:
+    return _overrides
+
+
+def set_overrides(new: Mapping[int, GuildOverrides]):
+    """Swap in every guild's settings, as last read from the database."""
+    global _overrides, _configs
+    _overrides = MappingProxyType(dict(new))
+    _configs = {}
@@ -0,0 +1,206 @@
+"""A typed, validated snapshot of the configuration read on hot paths.
+
+Looking a value up through confuse walks its views and validates the value on every
+call, which adds up on per-event paths. The snapshot is built and validated once,
+from the same sources as `CONFIG`, into frozen dataclasses with plain attribute
+access. Reloading builds a complete new snapshot before swapping it in, so readers
+see either the old configuration or the new one, never a mix, and an invalid change
+leaves the old one in place.
+
+Settings only read at startup, such as queue sizes and file locations, are still
+read through `CONFIG`.
+"""
+
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import FrozenSet, Iterator, Mapping, Optional, Tuple
+
+import confuse
+
+from config.config import CONFIG, CONFIG_FILES, load_config
+
+__all__ = [
+    "DigestSettings",
+    "GuildConfig",
+    "LogSection",
+    "LoggingConfig",
+    "PartitionConfig",
+    "Snapshot",
+    "snapshot",
+    "reload_snapshot",
+    "config_changed",
+]
+
+
+# Dataclasses are given `__slots__` by hand, as `slots=True` needs Python 3.10
+@dataclass(frozen=True)
+class GuildConfig:
+    __slots__ = (
+        "id",
+        "exec_roles",
+        "muted_role",
+        "lockdown_extra_roles",
+        "log_channels",
+        "forbidden_words",
+    )
+    id: int
+    exec_roles: FrozenSet[int]
+    muted_role: Optional[int]
+    lockdown_extra_roles: Tuple[int, ...]
+    # Logging channels by name, as log sections refer to them
+    log_channels: Mapping[str, int]
+    forbidden_words: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class DigestSettings:
+    __slots__ = ("window", "summary")
+    # Seconds to gather events for before sending the digest
+    window: float
+    # Formatted with `count` and `plural`, e.g. "{count} voice join{plural}"
+    summary: str
+
+
+@dataclass(frozen=True)
+class LogSection:
+    __slots__ = ("channel", "channel_id", "title", "description", "colour", "digest")
+    # The name of the channel, and its ID in the home guild
+    channel: str
+    channel_id: int
+    title: str
+    description: str
+    colour: int
+    digest: Optional[DigestSettings]
+
+    def __iter__(self) -> Iterator:
+        """Unpack as `channel_id, title, description, colour`."""
+        return iter((self.channel_id, self.title, self.description, self.colour))
+
+
+@dataclass(frozen=True)
+class LoggingConfig:
+    __slots__ = ("channels", "footer", "sections")
+    channels: Mapping[str, int]
+    footer: str
+    sections: Mapping[str, LogSection]
+
+
+@dataclass(frozen=True)
+class PartitionConfig:
+    __slots__ = ("months_ahead", "archive_after_days")
+    months_ahead: int
+    archive_after_days: int
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    __slots__ = ("guild", "logging", "forbidden_words", "partitions")
+    guild: GuildConfig
+    logging: LoggingConfig
+    forbidden_words: Tuple[str, ...]
+    partitions: PartitionConfig
+
+
+def build_log_section(
+    view: confuse.ConfigView, channels: Mapping[str, int]
+) -> LogSection:
+    channel = view["channel"].as_choice(list(channels))
+    digest = view["digest"]
+    settings = None
+    if digest.exists():
+        settings = DigestSettings(
+            digest["window"].as_number(), digest["summary"].get(str)
+        )
+    return LogSection(
+        channel,
+        channels[channel],
+        view["head"].get(str),
+        view["desc"].get(str),
+        view["colour"].get(int),
+        settings,
+    )
+
+
+def build(config: confuse.Configuration) -> Snapshot:
+    """Read and validate everything in the snapshot, raising `confuse.ConfigError`."""
+    discord_logging = config["discord_logging"]
+    channels = MappingProxyType(
+        {
+            name: discord_logging["channels"][name].get(int)
+            for name in discord_logging["channels"].keys()
+        }
+    )
+    forbidden_words = tuple(config["forbidden_words"].as_str_seq())
+
+    roles = config["guild"]["roles"]
+    guild = GuildConfig(
+        config["guild"]["id"].get(int),
+        frozenset(roles["exec"].get(confuse.Sequence(int))),
+        roles["muted"].get(int),
+        tuple(roles["lockdown_extra_roles"].get(confuse.Sequence(int))),
+        channels,
+        forbidden_words,
+    )
+
+    # Every mapping naming a channel is the template for a logging event
+    sections = {
+        name: build_log_section(discord_logging[name], channels)
+        for name in discord_logging.keys()
+        if isinstance(discord_logging[name].get(), dict)
+        and "channel" in discord_logging[name].keys()
+    }
+    logging_config = LoggingConfig(
+        channels,
+        discord_logging["footer"].get(str),
+        MappingProxyType(sections),
+    )
+
+    partitions = config["database"]["partitions"]
+    return Snapshot(
+        guild,
+        logging_config,
+        forbidden_words,
+        PartitionConfig(
+            partitions["months_ahead"].get(int),
+            partitions["archive_after_days"].get(int),
+        ),
+    )
+
+
+def file_mtimes() -> Tuple[Optional[float], ...]:
+    mtimes = []
+    for filename, _ in CONFIG_FILES:
+        try:
+            mtimes.append(os.stat(filename).st_mtime)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+
+_mtimes = file_mtimes()
+_snapshot = build(CONFIG)
+
+
+def snapshot() -> Snapshot:
+    return _snapshot
+
+
+def config_changed() -> bool:
+    """Whether any configuration file has changed since the snapshot was built."""
+    return file_mtimes() != _mtimes
+
+
+def reload_snapshot() -> Snapshot:
+    """Re-read the configuration files and swap in a new snapshot.
+
+    Raises `confuse.ConfigError` and keeps the current snapshot if they are invalid.
+    Either way, `config_changed` is false until the files change again.
+    """
+    global _mtimes, _snapshot
+    _mtimes = file_mtimes()
+    fresh = build(load_config())
+    # Keep `CONFIG` in step for the settings read through it
+    CONFIG.reload()
+    _snapshot = fresh
+    return fresh
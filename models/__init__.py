@@ -1,3 +1,6 @@
+from models.avatar import *
+from models.guild import *
 from models.models import *
 from models.moderation_actions import *
 from models.user import *
+from models.voice import *
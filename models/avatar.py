@@ -0,0 +1,23 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import relationship
+
+from models.models import Base, model_repr
+
+__all__ = ["AvatarHistory"]
+
+
+@model_repr
+class AvatarHistory(Base):
+    """The avatars a user has been seen with, by hash of the archived image."""
+
+    __tablename__ = "avatar_history"
+    __table_args__ = (Index("ix_avatar_history_user_id_seen_at", "user_id", "seen_at"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    seen_at = Column(DateTime, nullable=False)
+    # Hex SHA-256 of the image
+    digest = Column(String(length=64), nullable=False)
+    extension = Column(String(length=8), nullable=False)
+
+    user = relationship("User", uselist=False)
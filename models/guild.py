@@ -0,0 +1,34 @@
+import sqlalchemy as sa
+from sqlalchemy import JSON, BigInteger, Column, DateTime
+
+from models.models import Base, model_repr
+
+__all__ = ["GuildSettings"]
+
+
+@model_repr
+class GuildSettings(Base):
+    """A guild's own configuration, overriding the configuration files.
+
+    Columns left null keep the files' value for the home guild, or nothing for any
+    other guild, except forbidden words, which default to the files' for every guild.
+    """
+
+    __tablename__ = "guild_settings"
+
+    # The Discord ID of the guild
+    guild_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    # Lists of role IDs
+    exec_roles = Column(JSON, nullable=True)
+    muted_role = Column(BigInteger, nullable=True)
+    lockdown_extra_roles = Column(JSON, nullable=True)
+    # Channel IDs by the names logging sections use, such as "moderation"
+    log_channels = Column(JSON, nullable=True)
+    forbidden_words = Column(JSON, nullable=True)
+    # Lets every process sharing the database notice changes
+    updated_at = Column(
+        DateTime,
+        nullable=False,
+        default=sa.func.current_timestamp(),
+        onupdate=sa.func.current_timestamp(),
+    )
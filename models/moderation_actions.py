@@ -1,7 +1,16 @@
 import enum
 
 import sqlalchemy as sa
-from sqlalchemy import Boolean, Column, DateTime, Enum, ForeignKey, Integer, Text
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Integer,
+    Text,
+)
 from sqlalchemy.orm import relationship
 
 from models.models import Base, model_repr
@@ -9,6 +18,7 @@ from models.models import Base, model_repr
 __all__ = [
     "ActionType",
     "ModerationAction",
+    "ModerationActionArchive",
     "ModerationLinkedAction",
     "ModerationTemporaryAction",
 ]
@@ -86,6 +96,9 @@ class ModerationAction(Base):
     moderator_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     action = Column(Enum(ActionType), nullable=False)
     reason = Column(Text, nullable=True)
+    # The Discord ID of the guild, or null for actions from before there could be
+    # more than one, which were all in the home guild
+    guild_id = Column(BigInteger, nullable=True)
 
     user = relationship(
         "User",
@@ -115,6 +128,24 @@ class ModerationAction(Base):
     )
 
 
+@model_repr
+class ModerationActionArchive(Base):
+    """Moderation actions from partitions old enough to have been archived.
+
+    Rows are moved here unchanged, so the columns mirror `ModerationAction`.
+    """
+
+    __tablename__ = "moderation_actions_archive"
+
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(DateTime, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    moderator_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    action = Column(Enum(ActionType), nullable=False)
+    reason = Column(Text, nullable=True)
+    guild_id = Column(BigInteger, nullable=True)
+
+
 @model_repr
 class ModerationTemporaryAction(Base):
     __tablename__ = "moderation_temporary_actions"
@@ -0,0 +1,49 @@
+from sqlalchemy import BigInteger, Column, Date, DateTime, ForeignKey, Index, Integer
+from sqlalchemy.orm import relationship
+
+from models.models import Base, model_repr
+
+__all__ = ["VoiceSession", "VoiceDailyAggregate"]
+
+
+@model_repr
+class VoiceSession(Base):
+    __tablename__ = "voice_sessions"
+    __table_args__ = (
+        Index("ix_voice_sessions_user_id_started_at", "user_id", "started_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # The Discord ID of the voice channel
+    channel_id = Column(BigInteger, nullable=False)
+    # Null for sessions from before there could be more than one guild, in the home guild
+    guild_id = Column(BigInteger, nullable=True)
+    started_at = Column(DateTime, nullable=False)
+    ended_at = Column(DateTime, nullable=False)
+
+    user = relationship("User", uselist=False)
+
+
+@model_repr
+class VoiceDailyAggregate(Base):
+    """Time spent per user in each voice channel per UTC day.
+
+    Sessions spanning midnight count towards each day they cover, and count as a
+    session only on the day they started. The guild is not part of the key, as it
+    follows from the channel.
+    """
+
+    __tablename__ = "voice_daily_aggregates"
+
+    # Primary key columns are in this order for the per-user queries of `voicestats`
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    # The Discord ID of the voice channel
+    channel_id = Column(BigInteger, primary_key=True)
+    # Null for totals from before there could be more than one guild, in the home guild
+    guild_id = Column(BigInteger, nullable=True)
+    seconds = Column(Integer, nullable=False, default=0)
+    sessions = Column(Integer, nullable=False, default=0)
+
+    user = relationship("User", uselist=False)
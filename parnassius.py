@@ -1,49 +1,141 @@
 #!/usr/bin/env python3
+import sys
+
+from utils.startup import StartupProfile
+
+# Installed before anything else is imported, so those imports are timed too
+profile = StartupProfile() if "--profile-startup" in sys.argv else None
+if profile is not None:
+    profile.install()
+
+# isort: split
+
+import argparse
 import logging
+from time import perf_counter
 
-from discord import Intents
-from discord.ext.commands import Bot
+import confuse
+from discord import Intents, MemberCacheFlags
+from discord.ext.commands import AutoShardedBot, Bot
 
 from config import CONFIG
+from utils.lazy import preload
 from utils.logging import setup_logging
 
 EXTENSIONS = [
     "cogs.automod",
     "cogs.database",
+    "cogs.guilds",
+    "cogs.member_cache",
     "cogs.logging",
+    "cogs.voice",
     "cogs.commands.misc",
     "cogs.commands.moderation",
     "cogs.commands.channel",
+    "cogs.commands.admin",
+    "cogs.monitor",
+    # Instruments the cogs loaded before it
+    "cogs.metrics",
 ]
 
 intents = Intents.default()
 intents.guilds = True
 intents.members = True
 
-bot = Bot(CONFIG["discord"]["prefix"].get(str), intents=intents)
+cache = CONFIG["cache"]
+if cache["members"].as_choice(["all", "active"]) == "all":
+    member_cache_flags = MemberCacheFlags.from_intents(intents)
+else:
+    # Beyond these, cogs.member_cache keeps the members recently active
+    member_cache_flags = MemberCacheFlags(online=False, joined=False, voice=True)
+
+options = dict(
+    intents=intents,
+    member_cache_flags=member_cache_flags,
+    chunk_guilds_at_startup=cache["chunk_guilds_at_startup"].get(bool),
+    max_messages=cache["max_messages"].get(confuse.Optional(int)),
+)
+sharding = CONFIG["discord"]["sharding"]
+if sharding["enabled"].get(bool):
+    shard_count = sharding["shard_count"].get(confuse.Optional(int))
+    shard_ids = sharding["shard_ids"].get(confuse.Optional(confuse.Sequence(int)))
+    if shard_ids is not None and shard_count is None:
+        # discord.py cannot split the recommended count between processes
+        raise confuse.ConfigValueError(
+            f"{sharding['shard_count'].name} must be set when shard_ids are"
+        )
+    # Any other processes run the rest of the shards, sharing the database
+    bot = AutoShardedBot(
+        CONFIG["discord"]["prefix"].get(str),
+        shard_count=shard_count,
+        shard_ids=shard_ids,
+        **options,
+    )
+else:
+    bot = Bot(CONFIG["discord"]["prefix"].get(str), **options)
+exit_on_ready = False
 
 
 @bot.event
 async def on_ready():
+    global profile
     logger = logging.getLogger("parnassius")
     logger.info(f"Logged in as {bot.user}")
     logger.info(f"Connected to {len(bot.guilds)} guilds")
+    if profile is not None:
+        profile.phase("Connecting")
+        profile.uninstall()
+        logger.info(profile.report())
+        profile = None
+    if exit_on_ready:
+        await bot.close()
+        return
+    preload()
 
 
-def main():
-    setup_logging()
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the Parnassius bot.")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="report the time taken by each import and extension once ready",
+    )
+    parser.add_argument(
+        "--exit-on-ready",
+        action="store_true",
+        help="disconnect and exit as soon as the bot is ready, to time starting",
+    )
+    return parser.parse_args()
+
+
+def load_extensions():
     logger = logging.getLogger("parnassius")
-    logger.info("Parnassius is starting")
     for extension in EXTENSIONS:
         try:
             logger.info(f"Loading extension {extension}")
+            start = perf_counter()
             bot.load_extension(extension)
+            if profile is not None:
+                profile.extension(extension, perf_counter() - start)
         except SyntaxError:
             raise
         except Exception as e:
             logger.exception(e)
             raise e
 
+
+def main():
+    global exit_on_ready
+    exit_on_ready = parse_args().exit_on_ready
+    if profile is not None:
+        profile.phase("Importing")
+    setup_logging()
+    logger = logging.getLogger("parnassius")
+    logger.info("Parnassius is starting")
+    load_extensions()
+    if profile is not None:
+        profile.phase("Loading extensions")
+
     logger.info("Connecting to Discord")
     bot.run(CONFIG["discord"]["token"].get(str))
 
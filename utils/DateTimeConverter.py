@@ -1,71 +1,112 @@
+"""Parsing of the times moderation actions last until.
+
+The forms moderators type most, durations such as `1d2h` and explicit dates and times
+such as `2021-10-01 18:00`, `01-10 18:00` or `18:00`, are matched by precompiled patterns. Only
+anything else goes to dateparser, which is far slower, with the language fixed to
+English so it does not try to detect it. Durations, and what dateparser makes of
+expressions that are plain offsets from now such as `in 2 weeks`, are memoised as
+offsets, which hold whenever they are used. Dates, weekdays and the like are parsed
+afresh against now every time, but it is memoised that they are not offsets.
+"""
+
+import re
 from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional, Union
 
-import dateparser
 from discord.ext.commands import BadArgument, Converter
 
+from utils.lazy import lazy_import
+
 __all__ = ["parse_time", "DateTimeConverter"]
 
+dateparser = lazy_import("dateparser")
 
-def parse_time(time, /):
+DURATION = re.compile(r"(?:(\d+)d)?\s*(?:(\d+)h)?\s*(?:(\d+)m)?\s*(?:(\d+)s)?")
+DATE_TIME = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})[ T](\d{1,2}):(\d{2})(?::(\d{2}))?")
+DAY_MONTH_TIME = re.compile(r"(\d{1,2})-(\d{1,2}) (\d{1,2}):(\d{2})")
+TIME = re.compile(r"(\d{1,2}):(\d{2})(?::(\d{2}))?")
+
+DATEPARSER_LANGUAGES = ["en"]
+DATEPARSER_SETTINGS = {"DATE_ORDER": "DMY", "PREFER_DATES_FROM": "future"}
+# Differing in the length of the year and month after them, weekday and time of day, so
+# that only plain offsets from now are parsed to the same offset from both
+BASES = (datetime(2001, 1, 15, 10, 20, 30), datetime(2003, 6, 20, 15, 41, 53))
+
+
+@lru_cache(maxsize=1024)
+def parse_duration(time: str, /) -> Optional[timedelta]:
+    match = DURATION.fullmatch(time)
+    if match is None or not any(match.groups()):
+        return None
+    days, hours, minutes, seconds = (int(g or 0) for g in match.groups())
+    return timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def parse_explicit(time: str, now: datetime, /) -> Optional[datetime]:
+    """Parse a date and time, day, month and time, or time of day.
+
+    Those without a year or date are the next such time after now. Days come before
+    months, as in `DATEPARSER_SETTINGS`.
+    """
+    if match := DATE_TIME.fullmatch(time):
+        return datetime(*(int(g or 0) for g in match.groups()))
+    if match := DAY_MONTH_TIME.fullmatch(time):
+        day, month, hour, minute = (int(g) for g in match.groups())
+        parsed = datetime(now.year, month, day, hour, minute)
+        return parsed if parsed >= now else parsed.replace(year=now.year + 1)
+    if match := TIME.fullmatch(time):
+        hour, minute, second = (int(g or 0) for g in match.groups())
+        parsed = now.replace(hour=hour, minute=minute, second=second, microsecond=0)
+        return parsed if parsed >= now else parsed + timedelta(days=1)
+    return None
+
+
+def dateparse(time: str, base: datetime, /) -> Optional[datetime]:
     # dateparser.parse returns None if it cannot parse
-    parsed_time = dateparser.parse(
-        time, settings={"DATE_ORDER": "DMY", "PREFER_DATES_FROM": "future"}
+    return dateparser.parse(
+        time,
+        languages=DATEPARSER_LANGUAGES,
+        settings={**DATEPARSER_SETTINGS, "RELATIVE_BASE": base},
     )
 
-    now = datetime.now()
 
-    if not parsed_time:
-        try:
-            parsed_time = datetime.strptime(time, "%Y-%m-%d %H:%M")
-        except ValueError:
-            pass
-
-    if not parsed_time:
-        try:
-            parsed_time = datetime.strptime(time, "%m-%d %H:%M")
-            parsed_time = parsed_time.replace(year=now.year)
-            if parsed_time < now:
-                parsed_time = parsed_time.replace(year=now.year + 1)
-        except ValueError:
-            pass
-
-    if not parsed_time:
-        try:
-            parsed_time = datetime.strptime(time, "%H:%M:%S")
-            parsed_time = parsed_time.replace(
-                year=now.year, month=now.month, day=now.day
-            )
-            if parsed_time < now:
-                parsed_time = parsed_time + timedelta(days=1)
-
-        except ValueError:
-            pass
-
-    if not parsed_time:
-        try:
-            parsed_time = datetime.strptime(time, "%H:%M")
-            parsed_time = parsed_time.replace(
-                year=now.year, month=now.month, day=now.day
-            )
-            if parsed_time < now:
-                parsed_time = parsed_time + timedelta(days=1)
-        except ValueError:
-            pass
-
-    if not parsed_time:
-        result = re.match(r"(\d+d)?\s*(\d+h)?\s*(\d+m)?\s*(\d+s)?(?!^)$", time)
-        if result:
-            parsed_time = now
-            if result.group(1):
-                parsed_time = parsed_time + timedelta(days=int(result.group(1)[:-1]))
-            if result.group(2):
-                parsed_time = parsed_time + timedelta(hours=int(result.group(2)[:-1]))
-            if result.group(3):
-                parsed_time = parsed_time + timedelta(minutes=int(result.group(3)[:-1]))
-            if result.group(4):
-                parsed_time = parsed_time + timedelta(seconds=int(result.group(4)[:-1]))
-
-    return parsed_time
+@lru_cache(maxsize=256)
+def natural_offset(time: str, /) -> Union[timedelta, bool, None]:
+    """The offset from now that `time` means, `False` if it means something else,
+    such as a date or weekday, or `None` if dateparser cannot parse it."""
+    offsets = set()
+    for base in BASES:
+        if (parsed := dateparse(time, base)) is None:
+            return None
+        if parsed.tzinfo is not None:
+            return False
+        offsets.add(parsed - base)
+    return offsets.pop() if len(offsets) == 1 else False
+
+
+def parse_natural(time: str, now: datetime, /) -> Optional[datetime]:
+    offset = natural_offset(time)
+    if offset is None:
+        return None
+    if offset is False:
+        return dateparse(time, now)
+    return now + offset
+
+
+def parse_time(time, /):
+    time = time.strip()
+    now = datetime.now()
+    if (duration := parse_duration(time)) is not None:
+        return now + duration
+    try:
+        if (parsed := parse_explicit(time, now)) is not None:
+            return parsed
+    except ValueError:
+        # Matched the form, but is not a real date or time. dateparser may still
+        # make something of it, as it did before these forms were matched here
+        pass
+    return parse_natural(time, now.replace(microsecond=0))
 
 
 class DateTimeConverter(Converter):
@@ -1,21 +1,95 @@
+import asyncio
+import re
+from typing import List, Tuple, Union
+
+from discord import Member
 from discord.ext.commands import (
     ArgumentParsingError,
     BadArgument,
     Command,
     CommandError,
+    Context,
     Group,
 )
 
 __all__ = ["Greedy1Command", "Greedy1Group"]
 
+# A member's ID, alone or in a mention, as the Member converter accepts them
+MEMBER_ID = re.compile(r"<@!?([0-9]{15,20})>$|([0-9]{15,20})$")
+# Discord answers a gateway member query with at most this many members
+QUERY_LIMIT = 100
+
 
 class Greedy1Command(Command):
     """Implementation of Command that fails to parse if Greedy[T] does not find any arguments."""
 
+    async def _resolve_members(self, ctx: Context) -> Tuple[List[Member], bool]:
+        """Convert the leading members in one pass, rather than one at a time.
+
+        Members given by ID or mention are looked up in the cache, and those missing
+        are fetched together in one gateway query. Stops at the first argument that
+        is neither an ID nor the name of a cached member, to be converted as usual.
+        Returns the members, and whether an ID that is not a member ended the list.
+        """
+        view = ctx.view
+        # Where each argument starts, and its member, or ID if not cached
+        arguments: List[Tuple[int, Union[Member, int]]] = []
+        while not view.eof:
+            previous = view.index
+            view.skip_ws()
+            try:
+                argument = view.get_quoted_word()
+            except ArgumentParsingError:
+                view.index = previous
+                break
+            if match := MEMBER_ID.match(argument):
+                user_id = int(match.group(1) or match.group(2))
+                member = ctx.guild.get_member(user_id)
+                if member is None:
+                    member = next(
+                        (m for m in ctx.message.mentions if m.id == user_id), None
+                    )
+                if isinstance(member, Member):
+                    arguments.append((previous, member))
+                else:
+                    arguments.append((previous, user_id))
+            elif (member := ctx.guild.get_member_named(argument)) is not None:
+                arguments.append((previous, member))
+            else:
+                view.index = previous
+                break
+
+        missing = [a for _, a in arguments if isinstance(a, int)]
+        found = {}
+        try:
+            for i in range(0, len(missing), QUERY_LIMIT):
+                members = await ctx.guild.query_members(
+                    user_ids=missing[i : i + QUERY_LIMIT], limit=QUERY_LIMIT
+                )
+                found.update((m.id, m) for m in members)
+        except asyncio.TimeoutError:
+            # Leave the missing members to be converted one at a time
+            found = None
+
+        result = []
+        for start, argument in arguments:
+            if isinstance(argument, int):
+                if found is None:
+                    view.index = start
+                    return result, False
+                if (argument := found.get(argument)) is None:
+                    view.index = start
+                    return result, True
+            result.append(argument)
+        return result, False
+
     async def _transform_greedy_pos(self, ctx, param, required, converter):
         view = ctx.view
         result = []
-        while not view.eof:
+        ended = False
+        if converter is Member and ctx.guild is not None:
+            result, ended = await self._resolve_members(ctx)
+        while not ended and not view.eof:
             # for use with a manual undo
             previous = view.index
 
@@ -50,5 +124,6 @@ class Greedy1Command(Command):
 
 
 class Greedy1Group(Group):
+    _resolve_members = Greedy1Command._resolve_members
     _transform_greedy_pos = Greedy1Command._transform_greedy_pos
     _transform_greedy_var_pos = Greedy1Command._transform_greedy_var_pos
@@ -0,0 +1,257 @@
+"""Columnar analytics over the moderation history.
+
+Loads `moderation_actions`, with the partitions archived from it, straight into NumPy
+column arrays instead of ORM objects, so quarterly reviews can compute their metrics
+over the whole history in a handful of vectorised passes. An on-disk `.npz` cache is refreshed incrementally from the highest
+id it already holds.
+
+Run `python -m utils.analytics` for a summary report.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import confuse
+import numpy as np
+from sqlalchemy import create_engine, union_all
+from sqlalchemy.future import select
+
+from config import CONFIG
+from models import ActionType, ModerationAction, ModerationActionArchive
+
+__all__ = [
+    "ModerationColumns",
+    "load_moderation_actions",
+    "repeat_offender_rate",
+    "time_to_reoffend",
+    "reoffend_distribution",
+    "escalation_funnel",
+    "DEFAULT_FUNNEL",
+]
+
+logger = logging.getLogger("parnassius.utils.analytics")
+
+ActionTypes = Union[ActionType, Iterable[ActionType]]
+
+COLUMNS = ("id", "timestamp", "user_id", "moderator_id", "action")
+DTYPES = {
+    "id": np.int64,
+    "timestamp": "datetime64[s]",
+    "user_id": np.int64,
+    "moderator_id": np.int64,
+    "action": np.int16,
+}
+
+DEFAULT_FUNNEL = (
+    (ActionType.WARN, ActionType.AUTOWARN),
+    (ActionType.MUTE, ActionType.TEMPMUTE, ActionType.AUTOMUTE),
+    (ActionType.KICK, ActionType.TEMPBAN, ActionType.BAN),
+)
+
+
+def _codes(action_types: ActionTypes) -> np.ndarray:
+    if isinstance(action_types, ActionType):
+        action_types = [action_types]
+    return np.fromiter((a.value for a in action_types), dtype=DTYPES["action"])
+
+
+@dataclass(frozen=True)
+class ModerationColumns:
+    """The moderation history as parallel column arrays, ordered by id.
+
+    `action` holds `ActionType` values, so masks can be built without touching the enum
+    per row.
+    """
+
+    id: np.ndarray
+    timestamp: np.ndarray
+    user_id: np.ndarray
+    moderator_id: np.ndarray
+    action: np.ndarray
+
+    @classmethod
+    def empty(cls) -> ModerationColumns:
+        return cls(**{c: np.empty(0, dtype=DTYPES[c]) for c in COLUMNS})
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[tuple]) -> ModerationColumns:
+        if not rows:
+            return cls.empty()
+        ids, timestamps, user_ids, moderator_ids, actions = zip(*rows)
+        return cls(
+            id=np.array(ids, dtype=DTYPES["id"]),
+            timestamp=np.array(timestamps, dtype=DTYPES["timestamp"]),
+            user_id=np.array(user_ids, dtype=DTYPES["user_id"]),
+            moderator_id=np.array(moderator_ids, dtype=DTYPES["moderator_id"]),
+            action=np.fromiter((a.value for a in actions), dtype=DTYPES["action"]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    @property
+    def max_id(self) -> int:
+        return int(self.id[-1]) if len(self) else 0
+
+    def of(self, action_types: ActionTypes) -> np.ndarray:
+        """A boolean mask of the rows whose action is one of `action_types`."""
+        return np.isin(self.action, _codes(action_types))
+
+    def where(self, mask: np.ndarray) -> ModerationColumns:
+        return ModerationColumns(**{c: getattr(self, c)[mask] for c in COLUMNS})
+
+    def between(self, start=None, end=None) -> ModerationColumns:
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self.timestamp >= np.datetime64(start, "s")
+        if end is not None:
+            mask &= self.timestamp < np.datetime64(end, "s")
+        return self.where(mask)
+
+    def concat(self, other: ModerationColumns) -> ModerationColumns:
+        return ModerationColumns(
+            **{
+                c: np.concatenate([getattr(self, c), getattr(other, c)])
+                for c in COLUMNS
+            }
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> ModerationColumns:
+        with np.load(path) as data:
+            return cls(**{c: data[c].astype(DTYPES[c], copy=False) for c in COLUMNS})
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so a crash never leaves a truncated cache
+        temporary = path.with_name(f"{path.name}.tmp")
+        with temporary.open("wb") as f:
+            np.savez(f, **{c: getattr(self, c) for c in COLUMNS})
+        os.replace(temporary, path)
+
+
+def _fetch_since(connection, after_id: int) -> ModerationColumns:
+    # Archived partitions keep their ids, so the archive is read alongside the live
+    # table. Rows are moved between them in one transaction, so are never in both.
+    tables = (ModerationAction.__table__, ModerationActionArchive.__table__)
+    history = union_all(
+        *(
+            select(
+                table.c.id,
+                table.c.timestamp,
+                table.c.user_id,
+                table.c.moderator_id,
+                table.c.action,
+            ).where(table.c.id > after_id)
+            for table in tables
+        )
+    ).subquery("moderation_history")
+    query = select(history).order_by(history.c.id)
+    return ModerationColumns.from_rows(connection.execute(query).all())
+
+
+def default_cache_path() -> Path:
+    return Path(CONFIG["analytics"]["cache"].get(confuse.Filename(in_source_dir=True)))
+
+
+def load_moderation_actions(
+    engine=None, cache_path: Optional[Path] = None
+) -> ModerationColumns:
+    """Load the moderation history, topping up the `.npz` cache with any newer rows.
+
+    Rows are only appended past the highest cached id, so a refresh costs one indexed
+    range scan over the actions added since the last run.
+    """
+    if engine is None:
+        engine = create_engine(CONFIG["database"]["connection"].get(str))
+    if cache_path is None:
+        cache_path = default_cache_path()
+
+    columns = ModerationColumns.empty()
+    if cache_path.exists():
+        columns = ModerationColumns.load(cache_path)
+        logger.info(f"Loaded {len(columns)} cached moderation actions")
+
+    with engine.connect() as connection:
+        new = _fetch_since(connection, columns.max_id)
+    if len(new):
+        logger.info(f"Fetched {len(new)} new moderation actions")
+        columns = columns.concat(new)
+        columns.save(cache_path)
+    return columns
+
+
+def repeat_offender_rate(
+    columns: ModerationColumns, action_types: ActionTypes = DEFAULT_FUNNEL[0]
+) -> float:
+    """The fraction of sanctioned users who were sanctioned more than once."""
+    user_ids = columns.user_id[columns.of(action_types)]
+    if not len(user_ids):
+        return 0.0
+    _, counts = np.unique(user_ids, return_counts=True)
+    return float(np.count_nonzero(counts > 1) / len(counts))
+
+
+def time_to_reoffend(
+    columns: ModerationColumns, action_types: ActionTypes = DEFAULT_FUNNEL[0]
+) -> np.ndarray:
+    """The gaps, in seconds, between consecutive sanctions of the same user."""
+    selected = columns.where(columns.of(action_types))
+    order = np.lexsort((selected.timestamp, selected.user_id))
+    user_ids = selected.user_id[order]
+    timestamps = selected.timestamp[order].astype(np.int64)
+    same_user = user_ids[1:] == user_ids[:-1]
+    return np.diff(timestamps)[same_user]
+
+
+def reoffend_distribution(
+    gaps: np.ndarray, percentiles: Sequence[float] = (10, 25, 50, 75, 90)
+) -> Dict[float, float]:
+    """Summarise `time_to_reoffend` as percentiles, in seconds."""
+    if not len(gaps):
+        return {}
+    return dict(zip(percentiles, np.percentile(gaps, percentiles).tolist()))
+
+
+def escalation_funnel(
+    columns: ModerationColumns, stages: Sequence[ActionTypes] = DEFAULT_FUNNEL
+) -> List[int]:
+    """Count the users reaching each stage of an escalation funnel.
+
+    A user reaches a stage if they received one of its actions at or after the first
+    time they reached the previous stage.
+    """
+    users, inverse = np.unique(columns.user_id, return_inverse=True)
+    timestamps = columns.timestamp.astype(np.int64)
+    never = np.iinfo(np.int64).max
+    reached = np.full(len(users), np.iinfo(np.int64).min)
+    counts = []
+    for stage in stages:
+        mask = columns.of(stage) & (timestamps >= reached[inverse])
+        first = np.full(len(users), never)
+        np.minimum.at(first, inverse[mask], timestamps[mask])
+        reached = first
+        counts.append(int(np.count_nonzero(first != never)))
+    return counts
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    columns = load_moderation_actions()
+    gaps = time_to_reoffend(columns)
+    print(f"Moderation actions: {len(columns)}")
+    print(f"Repeat offender rate: {repeat_offender_rate(columns):.1%}")
+    for percentile, seconds in reoffend_distribution(gaps).items():
+        print(f"Time to reoffend p{percentile:g}: {seconds / 86400:.1f} days")
+    stages = [" / ".join(str(a) for a in stage) for stage in DEFAULT_FUNNEL]
+    for stage, count in zip(stages, escalation_funnel(columns)):
+        print(f"Reached {stage}: {count}")
+
+
+if __name__ == "__main__":
+    main()
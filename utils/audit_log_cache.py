@@ -0,0 +1,103 @@
+"""A shared, rolling cache of recent audit log entries.
+
+Events that need an audit log entry (kicks, bans, channel changes) arrive in bursts
+during raids and clean-ups. Rather than each event fetching the audit log itself,
+lookups are answered from a short window of recent entries per guild and action.
+Concurrent misses share a single fetch, and each fetch pages back from the newest
+entry only as far as the last one seen.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from discord import AuditLogAction, AuditLogEntry, Guild
+
+from utils.logging import trace_func
+
+__all__ = ["AuditLogCache"]
+
+logger = logging.getLogger("parnassius.utils.audit_log_cache")
+log = trace_func(logger)
+
+Key = Tuple[int, AuditLogAction]
+
+
+class AuditLogCache:
+    @log
+    def __init__(self, *, window: float = 60, max_age: float = 5):
+        # How long entries are kept for
+        self.window = timedelta(seconds=window)
+        # How old an entry may be and still match an event
+        self.max_age = timedelta(seconds=max_age)
+        self.entries: Dict[Key, Deque[AuditLogEntry]] = {}
+        self.last_id: Dict[Key, int] = {}
+        self.fetches: Dict[Key, asyncio.Task] = {}
+
+    def lookup(
+        self, key: Key, predicate: Callable[[AuditLogEntry], bool]
+    ) -> Optional[AuditLogEntry]:
+        # Work from the newest entries first, as the most recent entry is the most
+        # likely to be the one being looked for
+        oldest = datetime.utcnow() - self.max_age
+        for entry in reversed(self.entries.get(key, ())):
+            if entry.created_at < oldest:
+                break
+            if predicate(entry):
+                return entry
+        return None
+
+    async def fetch(self, guild: Guild, action: AuditLogAction):
+        key = (guild.id, action)
+        entries = self.entries.setdefault(key, deque())
+        last_id = self.last_id.get(key)
+        expired = datetime.utcnow() - self.window
+        # discord.py pages from the start of the audit log whenever `after` is given,
+        # so page back from the newest entry and stop at the first one already seen
+        new = []
+        async for entry in guild.audit_logs(limit=None, action=action):
+            if last_id is not None and entry.id <= last_id:
+                break
+            if entry.created_at < expired:
+                break
+            new.append(entry)
+        if new:
+            entries.extend(reversed(new))
+            self.last_id[key] = new[0].id
+        while entries and entries[0].created_at < expired:
+            entries.popleft()
+
+    async def refresh(self, guild: Guild, action: AuditLogAction) -> bool:
+        """Fetch new entries, joining a fetch already in flight if there is one.
+
+        Returns whether this call started the fetch.
+        """
+        key = (guild.id, action)
+        started = key not in self.fetches
+        if started:
+            task = asyncio.ensure_future(self.fetch(guild, action))
+            self.fetches[key] = task
+            task.add_done_callback(lambda _: self.fetches.pop(key, None))
+        # Shielded so one cancelled caller does not cancel the fetch for the others
+        await asyncio.shield(self.fetches[key])
+        return started
+
+    @log
+    async def find(
+        self,
+        guild: Guild,
+        action: AuditLogAction,
+        predicate: Callable[[AuditLogEntry], bool],
+    ) -> Optional[AuditLogEntry]:
+        key = (guild.id, action)
+        if (entry := self.lookup(key, predicate)) is not None:
+            return entry
+        # A joined fetch may have started before this event's entry was written,
+        # so fetch again if the entry was not found in it
+        for _ in range(2):
+            started = await self.refresh(guild, action)
+            if (entry := self.lookup(key, predicate)) is not None or started:
+                return entry
+        return None
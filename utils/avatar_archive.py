@@ -0,0 +1,87 @@
+"""A content-addressed archive of avatars on local disk.
+
+Discord stops serving an avatar soon after it changes, so avatars are downloaded as
+they are seen and stored under the SHA-256 hash of their contents. An image shared
+by several users, or set again later, is only stored once.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+
+from utils.logging import trace_func
+
+__all__ = ["AvatarArchive"]
+
+logger = logging.getLogger("parnassius.utils.avatar_archive")
+log = trace_func(logger)
+
+
+class AvatarArchive:
+    @log
+    def __init__(self, directory: Path, *, concurrency: int, timeout: float = 30):
+        self.directory = directory
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    @log
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def path(self, digest: str, extension: str) -> Path:
+        # Spread over subdirectories so no one directory grows too large
+        return self.directory / digest[:2] / f"{digest}.{extension}"
+
+    def find(self, digest: str) -> Optional[Path]:
+        return next((self.directory / digest[:2]).glob(f"{digest}.*"), None)
+
+    def store(self, data: bytes, digest: str, extension: str):
+        path = self.path(digest, extension)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Hidden from `find`, and unique to this write as workers may store the same
+        # avatar at once
+        descriptor, temporary = tempfile.mkstemp(
+            prefix=f".{digest}.", suffix=".tmp", dir=path.parent
+        )
+        # mkstemp makes it readable only by its owner
+        os.fchmod(descriptor, 0o644)
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+
+    async def download(self, url: str) -> bytes:
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=self.timeout)
+        async with self.semaphore:
+            async with self.session.get(url) as response:
+                response.raise_for_status()
+                return await response.read()
+
+    @log
+    async def archive(self, url: str) -> Optional[Tuple[str, str]]:
+        """Archive the avatar at `url`, returning its hash and file extension.
+
+        Returns `None` if the avatar could not be downloaded.
+        """
+        extension = Path(urlparse(url).path).suffix.lstrip(".") or "png"
+        try:
+            data = await self.download(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Could not download avatar {url}: {e}")
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.store, data, digest, extension)
+        return digest, extension
@@ -0,0 +1,77 @@
+"""Archiving a user's avatars when they change, and adding them to their history.
+
+Shared by the logging cog and the logging workers, whichever handles avatar changes.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from functools import partial
+from typing import Optional, Tuple
+
+from sqlalchemy.future import select
+
+from models import AvatarHistory
+from utils.avatar_archive import AvatarArchive
+from utils.logging import trace_func
+
+__all__ = ["record_avatars", "archive_change"]
+
+logger = logging.getLogger("parnassius.utils.avatar_history")
+log = trace_func(logger)
+
+Avatar = Optional[Tuple[str, str]]
+
+
+@log
+def record_avatars(db, discord_id: int, username: str, before: Avatar, after: Avatar):
+    """Add archived avatars to a user's history, as `(digest, extension)` pairs."""
+    user_id = db.get_or_create_users({discord_id: username})[discord_id]
+    now = datetime.utcnow()
+    with db.session.begin() as session:
+        latest = session.execute(
+            select(AvatarHistory.digest)
+            .where(AvatarHistory.user_id == user_id)
+            .order_by(AvatarHistory.seen_at.desc(), AvatarHistory.id.desc())
+            .limit(1)
+        ).scalar()
+        # Also record the previous avatar, unless the history already ends with it
+        for avatar in (before, after):
+            if avatar is not None and avatar[0] != latest:
+                digest, extension = avatar
+                session.add(
+                    AvatarHistory(
+                        user_id=user_id,
+                        seen_at=now,
+                        digest=digest,
+                        extension=extension,
+                    )
+                )
+                latest = digest
+
+
+@log
+async def archive_change(
+    archive: AvatarArchive,
+    db,
+    discord_id: int,
+    username: str,
+    before_url: str,
+    after_url: str,
+    *,
+    record: bool = True,
+) -> Tuple[str, str]:
+    """Archive both avatars, recording them if `record`, and describe each for logs."""
+    # The previous avatar is usually still served for a short while
+    archived = await asyncio.gather(
+        archive.archive(before_url), archive.archive(after_url)
+    )
+    if record:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(
+            None, partial(record_avatars, db, discord_id, username, *archived)
+        )
+    before, after = (
+        f"`{avatar[0][:12]}`" if avatar else "not archived" for avatar in archived
+    )
+    return before, after
@@ -0,0 +1,17 @@
+from discord.ext.commands import check
+
+from config import guild_config
+
+__all__ = ["is_exec"]
+
+
+def is_exec():
+    """Only allow members holding one of the exec roles of the guild."""
+
+    async def predicate(ctx):
+        if ctx.guild is None:
+            return False
+        roles = guild_config(ctx.guild.id).exec_roles
+        return any(role.id in roles for role in getattr(ctx.author, "roles", []))
+
+    return check(predicate)
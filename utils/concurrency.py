@@ -0,0 +1,107 @@
+"""Running an action over many items at once, with a limit on how many run together."""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Sequence, TypeVar
+
+from discord import HTTPException, Message
+from discord.abc import Messageable
+
+from utils.logging import trace_func
+
+__all__ = ["gather_bounded", "ProgressMessage"]
+
+logger = logging.getLogger("parnassius.utils.concurrency")
+log = trace_func(logger)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@log
+async def gather_bounded(
+    items: Sequence[T],
+    func: Callable[[T], Awaitable[R]],
+    *,
+    limit: int,
+    pause: Optional[Callable[[], float]] = None,
+    on_result: Optional[Callable[[R], None]] = None,
+) -> List[R]:
+    """Await `func` for every item, at most `limit` at once, keeping their order.
+
+    Before each item is started, `pause` gives the seconds to wait first, so new work
+    can hold off while a rate limit is in force. `on_result` is called with each
+    result as it arrives. If one raises, those not finished are cancelled.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(item: T) -> R:
+        async with semaphore:
+            while pause is not None and (delay := pause()) > 0:
+                await asyncio.sleep(delay)
+            result = await func(item)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+class ProgressMessage:
+    """A status message edited as work progresses, as often as Discord allows."""
+
+    @log
+    def __init__(
+        self, destination: Messageable, verb: str, total: int, *, interval=2.0
+    ):
+        self.destination = destination
+        self.verb = verb
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.message: Optional[Message] = None
+        self.editing: Optional[asyncio.Task] = None
+        self.last_edit = 0.0
+
+    def __str__(self):
+        failed = f", {self.failed} failed" if self.failed else ""
+        end = "." if self.done == self.total else "…"
+        return f"{self.verb} {self.done}/{self.total}{failed}{end}"
+
+    @log
+    async def start(self):
+        self.message = await self.destination.send(str(self))
+        self.last_edit = asyncio.get_event_loop().time()
+
+    def update(self, succeeded: bool):
+        self.done += 1
+        self.failed += not succeeded
+        if self.message is None or self.editing is not None:
+            return
+        now = asyncio.get_event_loop().time()
+        if now - self.last_edit >= self.interval:
+            self.last_edit = now
+            self.editing = asyncio.ensure_future(self.edit(str(self)))
+
+    async def edit(self, content: str):
+        try:
+            await self.message.edit(content=content)
+        except HTTPException as e:
+            logger.warning(f"Could not update progress: {e}")
+        finally:
+            self.editing = None
+
+    @log
+    async def finish(self):
+        if self.message is None:
+            return
+        if self.editing is not None:
+            await self.editing
+        await self.edit(str(self))
@@ -0,0 +1,161 @@
+"""Word-level diffs of message edits, for logging only what changed.
+
+The diff is Myers' algorithm over word and whitespace tokens, after trimming the common
+prefix and suffix. Myers runs in O((N + M) * D) for D edits, so D is capped and any
+edit needing more is shown as one replacement of the differing middle. Either way the
+time taken is linear in the length of the message.
+"""
+
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from discord.utils import escape_markdown
+
+__all__ = ["diff_tokens", "render_diff", "truncate"]
+
+TOKEN = re.compile(r"\s+|\S+")
+
+EQUAL = "equal"
+DELETE = "delete"
+INSERT = "insert"
+
+Segment = Tuple[str, List[str]]
+
+
+def truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else f"{text[:limit - 1]}…"
+
+
+def myers(
+    a: Sequence[str], b: Sequence[str], max_edits: int
+) -> Optional[List[Segment]]:
+    """The shortest edit script from `a` to `b`, or `None` if it needs more edits."""
+    n, m = len(a), len(b)
+    offset = max_edits + 1
+    v = [0] * (2 * max_edits + 3)
+    trace = []
+    for d in range(max_edits + 1):
+        trace.append(v[:])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1 + offset] < v[k + 1 + offset]):
+                x = v[k + 1 + offset]
+            else:
+                x = v[k - 1 + offset] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k + offset] = x
+            if x >= n and y >= m:
+                return backtrack(a, b, trace, offset)
+    return None
+
+
+def backtrack(a, b, trace, offset) -> List[Segment]:
+    x, y = len(a), len(b)
+    moves = []
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1 + offset] < v[k + 1 + offset]):
+            previous_k = k + 1
+        else:
+            previous_k = k - 1
+        previous_x = v[previous_k + offset]
+        previous_y = previous_x - previous_k
+        while x > previous_x and y > previous_y:
+            x -= 1
+            y -= 1
+            moves.append((EQUAL, a[x]))
+        if d > 0:
+            if x == previous_x:
+                moves.append((INSERT, b[previous_y]))
+            else:
+                moves.append((DELETE, a[previous_x]))
+        x, y = previous_x, previous_y
+    moves.reverse()
+    return group(moves)
+
+
+def group(moves) -> List[Segment]:
+    segments: List[Segment] = []
+    for tag, token in moves:
+        if segments and segments[-1][0] == tag:
+            segments[-1][1].append(token)
+        else:
+            segments.append((tag, [token]))
+    return segments
+
+
+def diff_tokens(before: str, after: str, *, max_edits: int = 64) -> List[Segment]:
+    """Diff two messages into segments of equal, deleted and inserted tokens."""
+    a = TOKEN.findall(before)
+    b = TOKEN.findall(after)
+    prefix = 0
+    while prefix < len(a) and prefix < len(b) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < len(a) - prefix
+        and suffix < len(b) - prefix
+        and a[-1 - suffix] == b[-1 - suffix]
+    ):
+        suffix += 1
+    middle_a = a[prefix : len(a) - suffix]
+    middle_b = b[prefix : len(b) - suffix]
+
+    middle = myers(middle_a, middle_b, max_edits)
+    if middle is None:
+        middle = [(DELETE, middle_a), (INSERT, middle_b)]
+    segments = [(EQUAL, a[:prefix]), *middle, (EQUAL, a[len(a) - suffix :])]
+    return [(tag, tokens) for tag, tokens in segments if tokens]
+
+
+def mark(tokens: List[str], marker: str) -> str:
+    """Wrap tokens in a Markdown marker, leaving surrounding whitespace outside it."""
+    text = "".join(tokens)
+    stripped = text.strip()
+    if not stripped:
+        return text
+    start = text.index(stripped)
+    end = start + len(stripped)
+    return f"{text[:start]}{marker}{escape_markdown(stripped)}{marker}{text[end:]}"
+
+
+def context(tokens: List[str], words: int, *, leading: bool, trailing: bool) -> str:
+    """Elide the middle of an unchanged run, keeping `words` words by each change."""
+    # Each word is followed by at most one whitespace token
+    keep = 2 * words
+    if len(tokens) <= keep * (leading + trailing) + 1:
+        return escape_markdown("".join(tokens))
+    head = escape_markdown("".join(tokens[:keep])) if leading else ""
+    tail = escape_markdown("".join(tokens[-keep:])) if trailing else ""
+    return " ".join(part for part in (head.rstrip(), "…", tail.lstrip()) if part)
+
+
+def render_diff(
+    before: str, after: str, *, context_words: int = 5, limit: int = 3000
+) -> Optional[str]:
+    """Render the changed regions of an edit, or `None` if longer than `limit`.
+
+    Deleted words are struck through and inserted words are underlined.
+    """
+    segments = diff_tokens(before, after)
+    parts = []
+    for i, (tag, tokens) in enumerate(segments):
+        if tag == DELETE:
+            parts.append(mark(tokens, "~~"))
+        elif tag == INSERT:
+            parts.append(mark(tokens, "__"))
+        else:
+            # Context is only needed on the sides of this run that touch a change
+            parts.append(
+                context(
+                    tokens,
+                    context_words,
+                    leading=i > 0,
+                    trailing=i < len(segments) - 1,
+                )
+            )
+    rendered = "".join(parts)
+    return rendered if len(rendered) <= limit else None
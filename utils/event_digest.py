@@ -0,0 +1,91 @@
+"""Digests of high-volume logging events.
+
+Rather than sending an embed per event, digested sections are gathered per logging
+channel over a time window and sent as one summary embed when the window closes.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from discord import Embed
+
+from config.snapshot import DigestSettings
+from utils.logging import trace_func
+
+__all__ = ["DigestSettings", "EventDigest"]
+
+logger = logging.getLogger("parnassius.utils.event_digest")
+log = trace_func(logger)
+
+MAX_DESCRIPTION = 4096
+MAX_DETAIL = 512
+
+
+@dataclass
+class DigestSection:
+    settings: DigestSettings
+    details: List[str] = field(default_factory=list)
+
+    @property
+    def summary(self) -> str:
+        count = len(self.details)
+        return self.settings.summary.format(
+            count=count, plural="" if count == 1 else "s"
+        )
+
+
+class EventDigest:
+    @log
+    def __init__(self, send: Callable[[int, Embed], None], *, title: str, colour: int):
+        self.send = send
+        self.title = title
+        self.colour = colour
+        # Sections are kept in the order their first event arrived
+        self.pending: Dict[int, Dict[str, DigestSection]] = {}
+        self.timers: Dict[int, asyncio.TimerHandle] = {}
+
+    def add(self, channel_id: int, name: str, settings: DigestSettings, detail: str):
+        sections = self.pending.setdefault(channel_id, {})
+        section = sections.setdefault(name, DigestSection(settings))
+        section.details.append(detail)
+        if channel_id not in self.timers:
+            loop = asyncio.get_event_loop()
+            self.timers[channel_id] = loop.call_later(
+                settings.window, self.flush, channel_id
+            )
+
+    def embeds(self, sections: List[DigestSection]) -> List[Embed]:
+        summary = ", ".join(s.summary for s in sections)
+        lines = [d[:MAX_DETAIL] for section in sections for d in section.details]
+        descriptions = []
+        description = f"{summary}\n"
+        for line in lines:
+            if len(description) + len(line) + 1 > MAX_DESCRIPTION:
+                descriptions.append(description)
+                description = ""
+            description += f"\n{line}"
+        descriptions.append(description)
+        return [
+            Embed(
+                title=self.title if i == 0 else f"{self.title} (continued)",
+                description=description,
+                colour=self.colour,
+                timestamp=datetime.utcnow(),
+            )
+            for i, description in enumerate(descriptions)
+        ]
+
+    @log
+    def flush(self, channel_id: Optional[int] = None):
+        """Send the digest for `channel_id`, or for every channel if not given."""
+        channel_ids = list(self.pending) if channel_id is None else [channel_id]
+        for channel_id in channel_ids:
+            if (timer := self.timers.pop(channel_id, None)) is not None:
+                timer.cancel()
+            sections = self.pending.pop(channel_id, {})
+            if sections:
+                for embed in self.embeds(list(sections.values())):
+                    self.send(channel_id, embed)
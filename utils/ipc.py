@@ -0,0 +1,44 @@
+"""Length-prefixed JSON frames, for talking to worker processes over Unix sockets.
+
+Each frame is a four byte big-endian length followed by that many bytes of UTF-8 JSON.
+Everything sent is already JSON-shaped, as embeds are sent to Discord as JSON anyway.
+"""
+
+import asyncio
+import json
+import struct
+from typing import Any, AsyncIterator
+
+__all__ = ["FrameError", "encode", "read_frames"]
+
+HEADER = struct.Struct(">I")
+# Far above any embed or message, so only a corrupted stream reaches it
+MAX_FRAME = 16 * 2**20
+
+
+class FrameError(Exception):
+    pass
+
+
+def encode(message: Any) -> bytes:
+    payload = json.dumps(message, separators=(",", ":")).encode()
+    return HEADER.pack(len(payload)) + payload
+
+
+async def read_frames(reader: asyncio.StreamReader) -> AsyncIterator[Any]:
+    """Decode frames until the other end closes the stream between them."""
+    while True:
+        try:
+            header = await reader.readexactly(HEADER.size)
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                raise FrameError("Stream closed partway through a frame header")
+            return
+        (size,) = HEADER.unpack(header)
+        if size > MAX_FRAME:
+            raise FrameError(f"Frame of {size} bytes is over the limit")
+        try:
+            payload = await reader.readexactly(size)
+        except asyncio.IncompleteReadError:
+            raise FrameError("Stream closed partway through a frame")
+        yield json.loads(payload)
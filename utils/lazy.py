@@ -0,0 +1,78 @@
+"""Deferred importing of modules that are slow to import but not needed to start.
+
+`lazy_import` returns a stand-in for a module that imports it on first use. Once the
+bot has connected, `preload` imports every such module in a background thread, so the
+first command to need one does not wait for it on the event loop.
+"""
+
+import importlib
+import logging
+import threading
+from time import perf_counter
+from types import ModuleType
+from typing import Dict, Optional
+
+from utils.logging import trace_func
+
+__all__ = ["LazyModule", "lazy_import", "preload"]
+
+logger = logging.getLogger("parnassius.utils.lazy")
+log = trace_func(logger)
+
+MODULES: Dict[str, "LazyModule"] = {}
+preloading: Optional[threading.Thread] = None
+
+
+class LazyModule:
+    """A module, imported the first time one of its attributes is used."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = perf_counter()
+                    self._module = importlib.import_module(self._name)
+                    logger.debug(
+                        f"Imported {self._name} in {perf_counter() - start:.3f}s"
+                    )
+        return self._module
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+
+def lazy_import(name: str) -> LazyModule:
+    """A stand-in for the module `name`, shared by everything that imports it."""
+    if name not in MODULES:
+        MODULES[name] = LazyModule(name)
+    return MODULES[name]
+
+
+@log
+def preload() -> threading.Thread:
+    """Import every lazily imported module in a background thread, once."""
+    global preloading
+    if preloading is not None:
+        return preloading
+
+    def load_all():
+        start = perf_counter()
+        for module in list(MODULES.values()):
+            try:
+                module._load()
+            except Exception:
+                logger.exception(f"Could not preload {module._name}")
+        logger.info(f"Preloaded deferred imports in {perf_counter() - start:.3f}s")
+
+    preloading = threading.Thread(target=load_all, name="preload", daemon=True)
+    preloading.start()
+    return preloading
@@ -0,0 +1,226 @@
+"""Batched, per-channel delivery of logging embeds.
+
+Listeners enqueue embeds and return immediately. Each logging channel has a worker
+that packs queued embeds into as few messages as Discord allows. Sends go through
+discord.py's HTTP client under the channel's rate-limit bucket, and one worker per
+channel means that bucket is never contended from within the bot.
+"""
+
+import asyncio
+import logging
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from enum import Enum
+from time import monotonic
+from typing import Deque, Dict, List, Optional, Tuple
+
+from discord import Embed, HTTPException
+from discord.http import HTTPClient, Route
+
+from utils.logging import trace_func
+
+__all__ = ["OverflowPolicy", "ChannelStats", "LogDispatcher"]
+
+logger = logging.getLogger("parnassius.utils.log_dispatcher")
+log = trace_func(logger)
+
+# Limits on a single message, as documented by Discord
+MAX_EMBEDS = 10
+MAX_EMBED_CHARACTERS = 6000
+
+
+class MessageRoute(Route):
+    # discord.py 1.7 targets v7, which predates sending several embeds per message.
+    # The bucket key does not include the base, so this shares the channel's bucket.
+    BASE = "https://discord.com/api/v9"
+
+
+class OverflowPolicy(Enum):
+    """What to do with embeds that arrive while a channel's queue is full."""
+
+    # Discard them, keeping only a count
+    DROP = "drop"
+    # Discard them, but send a summary of their titles once the queue drains
+    AGGREGATE = "aggregate"
+
+
+@dataclass
+class ChannelStats:
+    sent_messages: int = 0
+    sent_embeds: int = 0
+    dropped: int = 0
+    aggregated: int = 0
+    failed: int = 0
+    # Seconds from the oldest embed in a batch being enqueued to the batch being sent
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=100))
+
+    @property
+    def mean_latency(self) -> float:
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+    @property
+    def max_latency(self) -> float:
+        return max(self.latencies, default=0.0)
+
+
+class ChannelDispatcher:
+    def __init__(
+        self,
+        http: HTTPClient,
+        channel_id: int,
+        *,
+        queue_size: int,
+        overflow: OverflowPolicy,
+        linger: float,
+    ):
+        self.http = http
+        self.channel_id = channel_id
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.linger = linger
+        self.queue: Deque[Tuple[float, Embed]] = deque()
+        self.suppressed = Counter()
+        self.stats = ChannelStats()
+        self._ready = asyncio.Event()
+        # Set while the worker is waiting for embeds, with none queued
+        self._idle = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self.queue)
+
+    def enqueue(self, embed: Embed):
+        if len(self.queue) >= self.queue_size:
+            if self.overflow is OverflowPolicy.AGGREGATE:
+                self.suppressed[embed.title or "Untitled event"] += 1
+                self.stats.aggregated += 1
+            else:
+                self.stats.dropped += 1
+            return
+        self.queue.append((monotonic(), embed))
+        self._ready.set()
+        self._idle.clear()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self.run())
+
+    def summary_embed(self) -> Embed:
+        """Summarise the suppressed events, which are cleared once it is queued or sent."""
+        lines = [f"{count}× {title}" for title, count in self.suppressed.most_common()]
+        return Embed(
+            title="**Events suppressed while the log queue was full**",
+            description="\n".join(lines)[:4096],
+        )
+
+    def next_batch(self) -> Tuple[float, List[Embed]]:
+        enqueued_at, embed = self.queue.popleft()
+        batch = [embed]
+        characters = len(embed)
+        while self.queue and len(batch) < MAX_EMBEDS:
+            size = len(self.queue[0][1])
+            if characters + size > MAX_EMBED_CHARACTERS:
+                break
+            batch.append(self.queue.popleft()[1])
+            characters += size
+        if not self.queue and self.suppressed and len(batch) < MAX_EMBEDS:
+            summary = self.summary_embed()
+            # Otherwise it is sent on its own next, as it would be with an empty queue
+            if characters + len(summary) <= MAX_EMBED_CHARACTERS:
+                batch.append(summary)
+                self.suppressed.clear()
+        return enqueued_at, batch
+
+    async def send(self, embeds: List[Embed]):
+        route = MessageRoute(
+            "POST", "/channels/{channel_id}/messages", channel_id=self.channel_id
+        )
+        await self.http.request(route, json={"embeds": [e.to_dict() for e in embeds]})
+
+    async def run(self):
+        while True:
+            if not self.queue and self.suppressed:
+                self.queue.append((monotonic(), self.summary_embed()))
+                self.suppressed.clear()
+            if not self.queue:
+                self._ready.clear()
+                self._idle.set()
+                await self._ready.wait()
+            # Give closely following events a chance to share the message
+            await asyncio.sleep(self.linger)
+            enqueued_at, batch = self.next_batch()
+            try:
+                await self.send(batch)
+            except HTTPException as e:
+                self.stats.failed += len(batch)
+                logger.exception(e)
+                continue
+            self.stats.sent_messages += 1
+            self.stats.sent_embeds += len(batch)
+            self.stats.latencies.append(monotonic() - enqueued_at)
+
+    async def drain(self):
+        """Wait for everything queued to be sent, no longer lingering between sends."""
+        self.linger = 0
+        while (
+            self._worker is not None
+            and not self._worker.done()
+            and not self._idle.is_set()
+        ):
+            await self._idle.wait()
+
+    def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+
+
+class LogDispatcher:
+    @log
+    def __init__(
+        self,
+        http: HTTPClient,
+        *,
+        queue_size: int = 500,
+        overflow: OverflowPolicy = OverflowPolicy.AGGREGATE,
+        linger: float = 0.5,
+    ):
+        self.http = http
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.linger = linger
+        self.channels: Dict[int, ChannelDispatcher] = {}
+
+    def enqueue(self, channel_id: int, embed: Embed):
+        if (channel := self.channels.get(channel_id)) is None:
+            channel = self.channels[channel_id] = ChannelDispatcher(
+                self.http,
+                channel_id,
+                queue_size=self.queue_size,
+                overflow=self.overflow,
+                linger=self.linger,
+            )
+        channel.enqueue(embed)
+
+    @log
+    def stats(self) -> Dict[int, Tuple[int, ChannelStats]]:
+        """The queue depth and delivery statistics of each channel."""
+        return {i: (c.depth, c.stats) for i, c in self.channels.items()}
+
+    @log
+    async def drain(self, timeout: float):
+        """Send what is queued, giving up on whatever is left after `timeout` seconds.
+
+        Embeds enqueued meanwhile are sent too. Call `close` afterwards to stop.
+        """
+        channels = list(self.channels.values())
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(channel.drain() for channel in channels)), timeout
+            )
+        except asyncio.TimeoutError:
+            left = sum(channel.depth for channel in channels)
+            logger.warning(f"Gave up sending {left} queued embeds after {timeout}s")
+
+    @log
+    def close(self):
+        for channel in self.channels.values():
+            channel.close()
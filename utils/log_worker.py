@@ -0,0 +1,473 @@
+"""Worker processes that send logging embeds and journal messages for the bot.
+
+With `discord_logging.workers.sockets` set, the logging cog still turns events into
+embeds, but sends them and the messages to journal over Unix sockets to worker
+processes instead of sending and writing them itself. Workers also archive changed
+avatars and record them in the database, filling in the embeds logging the change
+once they have. The bot's event loop is then left with dispatching events, and its
+process with none of logging's writes.
+
+Run each worker with `python -m utils.log_worker <index>`, on the same machine as the
+bot, where `index` picks its socket. Each logging channel's embeds always go to the
+same worker, so one process still owns each channel's rate-limit bucket, and every
+message goes to the first, the journal's only writer. An avatar change goes to each
+worker with a channel logging it, and is recorded by one of them. The bot reads the journal
+itself, as the workers keep it on the same disk. Workers report their queues back, so
+`logqueue` and the metrics show them as before.
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import confuse
+from discord import Embed
+from discord.http import HTTPClient
+
+from cogs.database import Database
+from config import CONFIG
+from utils.avatar_archive import AvatarArchive
+from utils.avatar_history import archive_change
+from utils.ipc import FrameError, encode, read_frames
+from utils.log_dispatcher import ChannelStats, LogDispatcher, OverflowPolicy
+from utils.logging import setup_logging, trace_func
+from utils.message_journal import MessageJournal
+from utils.message_store import StoredMessage
+
+__all__ = [
+    "build_dispatcher",
+    "build_journal",
+    "build_avatar_archive",
+    "socket_paths",
+    "WorkerConnection",
+    "RemoteDispatcher",
+    "RemoteJournal",
+    "LogWorker",
+]
+
+logger = logging.getLogger("parnassius.utils.log_worker")
+log = trace_func(logger)
+
+# The kinds of frame, as their first element
+EMBED = "embed"
+MESSAGE = "message"
+AVATAR = "avatar"
+STATS = "stats"
+
+RECONNECT_DELAY = 5
+STATS_INTERVAL = 5
+# Seconds a stopping worker keeps sending queued embeds for
+DRAIN_TIMEOUT = 10
+
+Stats = Dict[int, Tuple[int, ChannelStats]]
+
+
+def build_dispatcher(http: HTTPClient, config: confuse.ConfigView) -> LogDispatcher:
+    dispatch = config["dispatch"]
+    return LogDispatcher(
+        http,
+        queue_size=dispatch["queue_size"].get(int),
+        overflow=dispatch["overflow"].as_choice(
+            {policy.value: policy for policy in OverflowPolicy}
+        ),
+        linger=dispatch["linger"].as_number(),
+    )
+
+
+def build_journal(config: confuse.ConfigView) -> MessageJournal:
+    journal = config["message_journal"]
+    return MessageJournal(
+        journal["location"].get(confuse.Path(in_source_dir=True)),
+        retention_days=journal["retention_days"].get(int),
+        flush_interval=journal["flush_interval"].as_number(),
+    )
+
+
+def build_avatar_archive(config: confuse.ConfigView) -> AvatarArchive:
+    avatars = config["avatar_archive"]
+    return AvatarArchive(
+        avatars["location"].get(confuse.Path(in_source_dir=True)),
+        concurrency=avatars["concurrency"].get(int),
+    )
+
+
+def socket_paths(config: confuse.ConfigView) -> List[Path]:
+    return config["workers"]["sockets"].get(
+        confuse.Sequence(confuse.Path(in_source_dir=True))
+    )
+
+
+def encode_stats(stats: Stats) -> list:
+    return [
+        [
+            channel_id,
+            depth,
+            s.sent_messages,
+            s.sent_embeds,
+            s.dropped,
+            s.aggregated,
+            s.failed,
+            list(s.latencies),
+        ]
+        for channel_id, (depth, s) in stats.items()
+    ]
+
+
+def decode_stats(rows: list) -> Stats:
+    stats = {}
+    for channel_id, depth, *counts, latencies in rows:
+        stats[channel_id] = (depth, ChannelStats(*counts, deque(latencies, maxlen=100)))
+    return stats
+
+
+class WorkerConnection:
+    """The bot's connection to a worker, reconnecting whenever it is lost.
+
+    Frames sent in the same iteration of the event loop are written together, in one
+    system call rather than one each. They are held while the worker is unreachable
+    or not keeping up, up to `max_buffer` bytes, beyond which they are dropped rather
+    than held in memory.
+    """
+
+    @log
+    def __init__(self, path: Path, *, max_buffer: int):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.pending: List[bytes] = []
+        self.pending_bytes = 0
+        self.flushing = False
+        self.dropped = 0
+        self.writer: Optional[asyncio.StreamWriter] = None
+        # The worker's queues, as last reported
+        self.stats: Stats = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def send(self, frame: bytes):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+        buffered = self.pending_bytes
+        if self.writer is not None:
+            buffered += self.writer.transport.get_write_buffer_size()
+        if buffered + len(frame) > self.max_buffer:
+            if not self.dropped:
+                logger.warning(
+                    f"The logging worker at {self.path} is unreachable or behind, dropping"
+                )
+            self.dropped += 1
+            return
+        self.pending.append(frame)
+        self.pending_bytes += len(frame)
+        if self.writer is not None and not self.flushing:
+            self.flushing = True
+            asyncio.get_event_loop().call_soon(self.flush)
+
+    def flush(self):
+        self.flushing = False
+        if self.writer is None or not self.pending:
+            return
+        self.writer.write(b"".join(self.pending))
+        self.pending.clear()
+        self.pending_bytes = 0
+        self.report_dropped()
+
+    def report_dropped(self):
+        if self.dropped:
+            logger.warning(f"Dropped {self.dropped} frames for {self.path}")
+            self.dropped = 0
+
+    @log
+    async def run(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(str(self.path))
+            except OSError as e:
+                logger.warning(
+                    f"Could not reach the logging worker at {self.path}: {e}"
+                )
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            logger.info(f"Connected to the logging worker at {self.path}")
+            self.writer = writer
+            self.flush()
+            try:
+                async for message in read_frames(reader):
+                    if message[0] == STATS:
+                        self.stats = decode_stats(message[1])
+            except (ConnectionError, FrameError) as e:
+                logger.warning(f"Lost the logging worker at {self.path}: {e}")
+            else:
+                logger.warning(f"The logging worker at {self.path} closed")
+            finally:
+                # Frames written since the worker last read are lost with it
+                self.writer = None
+                writer.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    @log
+    async def drain(self):
+        """Wait for the frames held to be written to the worker."""
+        while self.pending or (
+            self.writer is not None and self.writer.transport.get_write_buffer_size()
+        ):
+            self.flush()
+            await asyncio.sleep(0.05)
+
+    @log
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self.writer is not None:
+            # The transport writes out what it holds before closing
+            self.flush()
+            self.writer.close()
+
+
+class RemoteDispatcher:
+    """Stands in for `LogDispatcher`, handing embeds to the workers instead."""
+
+    @log
+    def __init__(self, connections: List[WorkerConnection]):
+        self.connections = connections
+
+    def enqueue(self, channel_id: int, embed: Embed):
+        connection = self.connections[channel_id % len(self.connections)]
+        connection.send(encode([EMBED, channel_id, embed.to_dict()]))
+
+    @log
+    def stats(self) -> Stats:
+        stats = {}
+        for connection in self.connections:
+            stats.update(connection.stats)
+        return stats
+
+    def avatar_change(
+        self,
+        discord_id: int,
+        username: str,
+        before_url: str,
+        after_url: str,
+        ping: str,
+        embeds: List[Tuple[int, Embed, str]],
+    ):
+        """Have the workers archive and record a user's new avatar, then log it.
+
+        `embeds` are the embeds logging the change and the templates of their
+        descriptions, to be filled in once the avatars are archived.
+        """
+        groups: Dict[int, list] = {}
+        for channel_id, embed, template in embeds:
+            index = channel_id % len(self.connections)
+            groups.setdefault(index, []).append([channel_id, embed.to_dict(), template])
+        # Each channel's own worker sends its embeds, and the first records the change
+        indices = sorted(groups) or [0]
+        for index in indices:
+            self.connections[index].send(
+                encode(
+                    [
+                        AVATAR,
+                        discord_id,
+                        username,
+                        before_url,
+                        after_url,
+                        ping,
+                        index == indices[0],
+                        groups.get(index, []),
+                    ]
+                )
+            )
+
+    @log
+    async def drain(self, timeout: float):
+        """Write out the frames held for the workers, for up to `timeout` seconds."""
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(c.drain() for c in self.connections)), timeout
+            )
+        except asyncio.TimeoutError:
+            left = sum(len(c.pending) for c in self.connections)
+            logger.warning(f"Gave up handing {left} frames to the logging workers")
+
+    @log
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+
+
+class RemoteJournal:
+    """Stands in for `MessageJournal`, having the first worker write messages."""
+
+    @log
+    def __init__(self, connections: List[WorkerConnection], journal: MessageJournal):
+        self.connection = connections[0]
+        # Only read from, as the worker writes to it
+        self.journal = journal
+
+    def record(self, message: StoredMessage):
+        self.connection.send(
+            encode(
+                [
+                    MESSAGE,
+                    message.id,
+                    message.channel_id,
+                    message.author_id,
+                    message.content,
+                    list(message.attachments),
+                ]
+            )
+        )
+
+    async def get(self, message_id: int) -> Optional[StoredMessage]:
+        return await self.journal.get(message_id)
+
+    @log
+    def close(self):
+        # The connection is closed with the dispatcher
+        pass
+
+
+class LogWorker:
+    """Sends the embeds, journals the messages and records the avatars from the bot."""
+
+    @log
+    def __init__(
+        self,
+        dispatcher: LogDispatcher,
+        journal: Optional[MessageJournal],
+        *,
+        avatars: Optional[AvatarArchive] = None,
+        db: Optional[Database] = None,
+    ):
+        self.dispatcher = dispatcher
+        self.journal = journal
+        self.avatars = avatars
+        self.db = db
+        self.tasks: Set[asyncio.Task] = set()
+
+    @log
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        reporter = asyncio.ensure_future(self.report(writer))
+        try:
+            async for message in read_frames(reader):
+                self.receive(message)
+        except (ConnectionError, FrameError) as e:
+            logger.warning(f"Lost the connection from the bot: {e}")
+        finally:
+            reporter.cancel()
+            writer.close()
+
+    def receive(self, message: list):
+        kind, *fields = message
+        if kind == EMBED:
+            channel_id, data = fields
+            self.dispatcher.enqueue(channel_id, Embed.from_dict(data))
+        elif kind == MESSAGE and self.journal is not None:
+            message_id, channel_id, author_id, content, attachments = fields
+            self.journal.record(
+                StoredMessage(
+                    message_id, channel_id, author_id, content, tuple(attachments)
+                )
+            )
+        elif kind == AVATAR and self.avatars is not None:
+            task = asyncio.ensure_future(self.avatar_change(*fields))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        else:
+            logger.warning(f"Ignoring an unexpected {kind} frame")
+
+    @log
+    async def avatar_change(
+        self,
+        discord_id: int,
+        username: str,
+        before_url: str,
+        after_url: str,
+        ping: str,
+        record: bool,
+        embeds: list,
+    ):
+        try:
+            before, after = await archive_change(
+                self.avatars,
+                self.db,
+                discord_id,
+                username,
+                before_url,
+                after_url,
+                record=record,
+            )
+        except Exception as e:
+            logger.exception(e)
+            before = after = "not archived"
+        for channel_id, data, template in embeds:
+            embed = Embed.from_dict(data)
+            embed.description = template.format(ping=ping, before=before, after=after)
+            self.dispatcher.enqueue(channel_id, embed)
+
+    async def report(self, writer: asyncio.StreamWriter):
+        while True:
+            writer.write(encode([STATS, encode_stats(self.dispatcher.stats())]))
+            await asyncio.sleep(STATS_INTERVAL)
+
+    @log
+    async def serve(self, path: Path, stop: asyncio.Event):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Left behind if the last worker here did not exit cleanly
+        path.unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(self.handle, path=str(path))
+        logger.info(f"Logging worker listening on {path}")
+        await stop.wait()
+        server.close()
+        await server.wait_closed()
+        path.unlink(missing_ok=True)
+        # Avatar changes in progress still have embeds to queue
+        if self.tasks:
+            await asyncio.wait(list(self.tasks))
+
+
+async def run_worker(index: int):
+    config = CONFIG["discord_logging"]
+    path = socket_paths(config)[index]
+    http = HTTPClient()
+    await http.static_login(CONFIG["discord"]["token"].get(str), bot=True)
+    dispatcher = build_dispatcher(http, config)
+    journal = build_journal(config) if index == 0 else None
+    if journal is not None:
+        journal.start()
+    avatars = build_avatar_archive(config)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_event_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        worker = LogWorker(dispatcher, journal, avatars=avatars, db=Database(None))
+        await worker.serve(path, stop)
+        await dispatcher.drain(DRAIN_TIMEOUT)
+    finally:
+        dispatcher.close()
+        if journal is not None:
+            journal.close()
+        await avatars.close()
+        await http.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a logging worker for the bot.")
+    parser.add_argument(
+        "index", type=int, help="the worker's place in discord_logging.workers.sockets"
+    )
+    index = parser.parse_args().index
+    if not 0 <= index < len(socket_paths(CONFIG["discord_logging"])):
+        parser.error(f"there is no worker socket {index} configured")
+    # A log file of its own, as rotation is not safe across processes
+    filename = Path(CONFIG["logging"]["filename"].get(str))
+    setup_logging(f"{filename.stem}-worker-{index}{filename.suffix}")
+    asyncio.run(run_worker(index))
+
+
+if __name__ == "__main__":
+    main()
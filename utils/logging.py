@@ -1,57 +1,256 @@
+import asyncio
+import atexit
+import gzip
+import json
 import logging
+import os
+import queue
+import shutil
 import sys
+import threading
+from copy import copy
+from datetime import datetime, timezone
+from functools import wraps
+from itertools import count
 from logging import StreamHandler
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 from pathlib import Path
+from typing import List, Optional, Tuple
 
 import confuse
 from AtLog.atlog import get_representation, log_func
 
 from config import CONFIG
 
-__all__ = ["setup_logging", "get_representation", "log_func"]
+__all__ = [
+    "setup_logging",
+    "get_representation",
+    "log_func",
+    "trace_func",
+    "set_trace_sampling",
+]
 
+LEVELS = {
+    "NOTSET": logging.NOTSET,
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "WARN": logging.WARN,
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL,
+    "FATAL": logging.FATAL,
+}
 
-def setup_logging():
+# Whether calls can be traced is settled once, from the configured level, as each
+# function is decorated. Tracing can still be sampled or silenced at runtime.
+TRACING = CONFIG["logging"]["level"].as_choice(LEVELS) <= logging.DEBUG
+# Trace one in this many calls to each traced function
+trace_every = 1
+if CONFIG["logging"]["trace_every"].exists():
+    trace_every = CONFIG["logging"]["trace_every"].get(int)
+
+
+def set_trace_sampling(every: int):
+    global trace_every
+    trace_every = max(1, every)
+
+
+class Arguments:
+    """Arguments to a traced call, only represented if the record is emitted."""
+
+    __slots__ = ("args", "kwargs")
+
+    def __init__(self, args, kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return ", ".join(
+            [get_representation(a) for a in self.args]
+            + [f"{k}={get_representation(v)}" for k, v in self.kwargs.items()]
+        )
+
+
+class Representation:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return get_representation(self.value)
+
+
+def trace_func(logger: logging.Logger, *, enabled: Optional[bool] = None):
+    """Log calls to the decorated function and their results at DEBUG level.
+
+    A replacement for AtLog's `log_func`. Unless DEBUG logging is configured, the
+    function is returned unwrapped and costs nothing to call.
+    """
+    enabled = TRACING if enabled is None else enabled
+
+    def decorator(func):
+        if not enabled:
+            return func
+        name = func.__qualname__
+        code = getattr(func, "__code__", None)
+        location = code and f"{code.co_filename} on line {code.co_firstlineno}"
+        calls = count()
+
+        def traced() -> bool:
+            return logger.isEnabledFor(logging.DEBUG) and next(calls) % trace_every == 0
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not traced():
+                return func(*args, **kwargs)
+            logger.debug(
+                "Calling %s, defined in %s, with %s",
+                name,
+                location,
+                Arguments(args, kwargs),
+            )
+            result = func(*args, **kwargs)
+            logger.debug("%s returned %s", name, Representation(result))
+            return result
+
+        @wraps(func)
+        async def coro_wrapper(*args, **kwargs):
+            if not traced():
+                return await func(*args, **kwargs)
+            logger.debug(
+                "Calling %s, defined in %s, with %s",
+                name,
+                location,
+                Arguments(args, kwargs),
+            )
+            result = await func(*args, **kwargs)
+            logger.debug("%s returned %s", name, Representation(result))
+            return result
+
+        return coro_wrapper if asyncio.iscoroutinefunction(func) else wrapper
+
+    return decorator
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, for log collectors."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class CompressingRotatingFileHandler(TimedRotatingFileHandler):
+    """A timed rotating file handler that gzips rotated files in the background."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = self.rotate_and_compress
+
+    @staticmethod
+    def compress(source: str, destination: str):
+        try:
+            with open(source, "rb") as uncompressed, gzip.open(
+                f"{destination}.tmp", "wb"
+            ) as compressed:
+                shutil.copyfileobj(uncompressed, compressed)
+            os.replace(f"{destination}.tmp", destination)
+            os.remove(source)
+        except OSError as e:
+            # Logging from here could recurse into this handler
+            print(f"Could not compress {source}: {e}", file=sys.stderr)
+
+    def rotate_and_compress(self, source: str, destination: str):
+        # Renaming is quick, so only compressing is left to the background
+        uncompressed = destination[: -len(".gz")]
+        os.replace(source, uncompressed)
+        threading.Thread(
+            target=self.compress,
+            args=(uncompressed, destination),
+            name="log-compressor",
+            daemon=True,
+        ).start()
+
+
+class LocalQueueHandler(QueueHandler):
+    """A queue handler for a queue in this process.
+
+    The stock handler fully formats each record before queueing it, on the thread
+    that logged it. Records here are only merged with their arguments, which may
+    change later, and formatting is left to the listener's thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def build_handlers(
+    path: Path, *, suffix: str, json_format: bool = False
+) -> List[logging.Handler]:
+    """The handlers that write out records, from the queue listener's thread."""
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            fmt="{asctime}:{name}:{levelname}:{message}",
+            style="{",
+        )
+
+    file_handler = CompressingRotatingFileHandler(path, when="midnight", interval=1)
+    file_handler.suffix = suffix
+    file_handler.setFormatter(formatter)
+
+    stdout_handler = StreamHandler(sys.stdout)
+    stdout_handler.setFormatter(formatter)
+    return [file_handler, stdout_handler]
+
+
+def start_queue(
+    handlers: List[logging.Handler],
+) -> Tuple[LocalQueueHandler, QueueListener]:
+    """Route records through a queue to `handlers` on a background thread."""
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return LocalQueueHandler(records), listener
+
+
+def setup_logging(filename: Optional[str] = None):
+    """Log to the configured file, or to `filename` in the same place."""
     logging_path = Path(
         CONFIG["logging"]["location"].get(confuse.Path(in_source_dir=True)),
-        CONFIG["logging"]["filename"].get(str),
+        filename or CONFIG["logging"]["filename"].get(str),
     )
     # Create the directory if it does not already exist
     logging_path.parent.mkdir(mode=775, parents=True, exist_ok=True)
-    formatter = logging.Formatter(
-        fmt="{asctime}:{name}:{levelname}:{message}",
-        style="{",
-    )
-    filter_ = logging.Filter("parnassius")
+    log_format = "text"
+    if CONFIG["logging"]["format"].exists():
+        log_format = CONFIG["logging"]["format"].as_choice(["text", "json"])
 
-    file_handler = TimedRotatingFileHandler(
+    handlers = build_handlers(
         logging_path,
-        when="midnight",
-        interval=1,
+        suffix=CONFIG["logging"]["suffix"].get(str),
+        json_format=log_format == "json",
     )
-    file_handler.suffix = CONFIG["logging"]["suffix"].get(str)
-    file_handler.setFormatter(formatter)
-    file_handler.addFilter(filter_)
-
-    stdout_handler = StreamHandler(sys.stdout)
-    stdout_handler.setFormatter(formatter)
-    stdout_handler.addFilter(filter_)
+    # Handlers write out records on the listener's thread, so the event loop never
+    # waits on file I/O or rotation
+    queue_handler, _ = start_queue(handlers)
+    # Filtered before queueing, so records that would be dropped never are queued
+    queue_handler.addFilter(logging.Filter("parnassius"))
 
     root_logger = logging.getLogger()
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(stdout_handler)
-
-    level = CONFIG["logging"]["level"].as_choice(
-        {
-            "NOTSET": logging.NOTSET,
-            "DEBUG": logging.DEBUG,
-            "INFO": logging.INFO,
-            "WARNING": logging.WARNING,
-            "WARN": logging.WARN,
-            "ERROR": logging.ERROR,
-            "CRITICAL": logging.CRITICAL,
-            "FATAL": logging.FATAL,
-        }
-    )
-    root_logger.setLevel(level)
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(CONFIG["logging"]["level"].as_choice(LEVELS))
@@ -0,0 +1,145 @@
+"""Detection of blocking calls on the event loop.
+
+A task on the loop sleeps for a short interval and measures how late it wakes up,
+which is how long everything else on the loop waited too. A watchdog thread watches
+the task's heartbeat, and once the loop has been stuck for longer than the threshold
+it samples the loop thread's stack, catching the blocking call while it is still
+running. The stall is reported from the loop once it is free again.
+
+With asyncio's debug mode, the loop also names the callback or task that ran too
+long. Debug mode slows the whole loop, so it is left to be switched on when needed.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import traceback
+from dataclasses import dataclass
+from time import monotonic
+from types import CodeType
+from typing import Callable, Optional, Tuple
+
+from utils.logging import trace_func
+
+__all__ = ["Stall", "LoopMonitor"]
+
+logger = logging.getLogger("parnassius.utils.loop_monitor")
+log = trace_func(logger)
+
+# The message asyncio's debug mode logs for a slow callback, as of Python 3.8
+SLOW_CALLBACK = "Executing %s took %.3f seconds"
+
+
+@dataclass(frozen=True)
+class Stall:
+    # Seconds the loop was late by
+    lag: float
+    # The loop thread's stack while it was blocked, outermost frame first
+    stack: Optional[traceback.StackSummary]
+    # The code of each frame in `stack`, to tell whose code it was
+    code: Tuple[CodeType, ...]
+    # The callback asyncio's debug mode reported as slow, if it is on
+    callback: Optional[str]
+
+
+class SlowCallbackHandler(logging.Handler):
+    def __init__(self, monitor: "LoopMonitor"):
+        super().__init__(logging.WARNING)
+        self.monitor = monitor
+
+    def emit(self, record: logging.LogRecord):
+        if record.msg == SLOW_CALLBACK:
+            self.monitor.slow_callback = record.args[0]
+
+
+class LoopMonitor:
+    @log
+    def __init__(
+        self,
+        *,
+        interval: float,
+        threshold: float,
+        on_lag: Callable[[float], None],
+        on_stall: Callable[[Stall], None],
+        asyncio_debug: bool = False,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.on_lag = on_lag
+        self.on_stall = on_stall
+        self.asyncio_debug = asyncio_debug
+        # When the monitor task last went to sleep, by the monotonic clock
+        self.beat = monotonic()
+        # The heartbeat a stack was sampled for, and the sample
+        self.sample: Tuple[float, Optional[Tuple]] = (0.0, None)
+        self.slow_callback: Optional[str] = None
+        self.loop_thread: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self.stopped = threading.Event()
+        self.watchdog = threading.Thread(
+            target=self.watch, name="loop-watchdog", daemon=True
+        )
+        self.slow_callbacks = SlowCallbackHandler(self)
+
+    @log
+    def start(self):
+        """Start monitoring the running loop, from a coroutine or callback on it."""
+        loop = asyncio.get_event_loop()
+        self.loop_thread = threading.get_ident()
+        if self.asyncio_debug:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.threshold
+            logging.getLogger("asyncio").addHandler(self.slow_callbacks)
+        self.beat = monotonic()
+        self.task = asyncio.ensure_future(self.run())
+        self.watchdog.start()
+
+    @log
+    def stop(self):
+        self.stopped.set()
+        if self.task is not None:
+            self.task.cancel()
+        if self.asyncio_debug:
+            logging.getLogger("asyncio").removeHandler(self.slow_callbacks)
+            asyncio.get_event_loop().set_debug(False)
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            self.slow_callback = None
+            start = loop.time()
+            self.beat = beat = monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            try:
+                self.on_lag(lag)
+                if lag >= self.threshold:
+                    self.on_stall(self.stall(beat, lag))
+            except Exception as e:
+                # An exception would end the monitor
+                logger.exception(e)
+
+    def stall(self, beat: float, lag: float) -> Stall:
+        sampled_beat, sample = self.sample
+        stack, code = sample if sampled_beat == beat else (None, ())
+        return Stall(lag, stack, code, self.slow_callback)
+
+    def watch(self):
+        """Sample the loop thread's stack once per stall, from the watchdog thread."""
+        sampled = None
+        while not self.stopped.wait(self.threshold / 4):
+            beat = self.beat
+            if beat == sampled or monotonic() - beat < self.interval + self.threshold:
+                continue
+            sampled = beat
+            frame = sys._current_frames().get(self.loop_thread)
+            if frame is None:
+                continue
+            frames = list(traceback.walk_stack(frame))
+            frames.reverse()
+            del frame
+            code = tuple(f.f_code for f, _ in frames)
+            stack = traceback.StackSummary.extract(frames)
+            del frames
+            self.sample = (beat, (stack, code))
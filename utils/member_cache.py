@@ -0,0 +1,60 @@
+"""Bounding the members kept in memory to those recently active or acted on."""
+
+from collections import OrderedDict
+from typing import List
+
+from discord import Guild, Member
+
+__all__ = ["RecentMembers"]
+
+
+class RecentMembers:
+    """The members of a guild most recently active or acted on, kept in its cache.
+
+    Once more than `capacity` are kept, the least recent are removed from the guild's
+    cache again, except the bot and those in voice, which discord.py keeps itself.
+    """
+
+    def __init__(self, guild: Guild, capacity: int):
+        self.guild = guild
+        self.capacity = capacity
+        # Oldest first
+        self.members: "OrderedDict[int, Member]" = OrderedDict()
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, member_id: int):
+        return member_id in self.members
+
+    def touch(self, member: Member) -> List[Member]:
+        """Keep `member`, returning those no longer kept to make room."""
+        if member.id in self.members:
+            self.members.move_to_end(member.id)
+        self.members[member.id] = member
+        self.guild._add_member(member)
+        evicted = []
+        while len(self.members) > self.capacity:
+            _, oldest = self.members.popitem(last=False)
+            if self.kept_anyway(oldest):
+                continue
+            self.guild._remove_member(oldest)
+            evicted.append(oldest)
+        return evicted
+
+    def kept_anyway(self, member: Member) -> bool:
+        return (
+            member.id == self.guild._state.self_id
+            or self.guild._voice_state_for(member.id) is not None
+        )
+
+    def trim(self) -> int:
+        """Remove members cached by anything else, returning how many there were."""
+        stale = [
+            member
+            for member_id, member in self.guild._members.items()
+            if member_id not in self.members and not self.kept_anyway(member)
+        ]
+        for member in stale:
+            self.guild._remove_member(member)
+        return len(stale)
@@ -0,0 +1,70 @@
+"""Coalescing of bursts of member updates.
+
+Role bots and mass role changes fire many member updates for the same member within
+milliseconds. Rather than logging each, a member's updates are gathered over a short
+window and handed on as a single transition, from the member as they were before the
+first update to the member as they are after the last.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Set, Tuple
+
+from discord import Member
+
+from utils.logging import trace_func
+
+__all__ = ["MemberUpdateBuffer"]
+
+logger = logging.getLogger("parnassius.utils.member_updates")
+log = trace_func(logger)
+
+Key = Tuple[int, int]
+
+
+class MemberUpdateBuffer:
+    @log
+    def __init__(
+        self,
+        handle: Callable[[Member, Member], Awaitable[None]],
+        *,
+        window: float,
+    ):
+        self.handle = handle
+        self.window = window
+        # The member before their first pending update, and after their latest
+        self.pending: Dict[Key, Tuple[Member, Member]] = {}
+        self.timers: Dict[Key, asyncio.TimerHandle] = {}
+        self.tasks: Set[asyncio.Task] = set()
+
+    def add(self, before: Member, after: Member, *, earlier: bool = False):
+        """Add an update, `earlier` if it came before any pending but is added after."""
+        key = (after.guild.id, after.id)
+        if key in self.pending:
+            first, latest = self.pending[key]
+            self.pending[key] = (before, latest) if earlier else (first, after)
+            return
+        self.pending[key] = (before, after)
+        loop = asyncio.get_event_loop()
+        self.timers[key] = loop.call_later(self.window, self.flush, key)
+
+    def flush(self, key: Key):
+        self.timers.pop(key, None)
+        if (update := self.pending.pop(key, None)) is None:
+            return
+        task = asyncio.ensure_future(self.handle(*update))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    @log
+    def flush_all(self):
+        for key, timer in list(self.timers.items()):
+            timer.cancel()
+            self.flush(key)
+
+    @log
+    async def close(self):
+        """Hand on every pending update now, and wait until they have been handled."""
+        self.flush_all()
+        if self.tasks:
+            await asyncio.wait(list(self.tasks))
@@ -0,0 +1,173 @@
+"""A persistent journal of messages, so deletions are logged across restarts.
+
+Messages are appended to one SQLite database per day in WAL mode, keyed by message id.
+A background thread writes them in batches, so recording a message never blocks the
+event loop, and lookups run in the default executor. Retention drops whole day
+segments once they age out, which keeps compaction to a file deletion.
+"""
+
+import asyncio
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+from time import monotonic
+from typing import List, Optional
+
+from utils.logging import trace_func
+from utils.message_store import StoredMessage
+
+__all__ = ["MessageJournal"]
+
+logger = logging.getLogger("parnassius.utils.message_journal")
+log = trace_func(logger)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    attachments TEXT NOT NULL
+)
+"""
+SEGMENT_PREFIX = "messages-"
+SEGMENT_SUFFIX = ".sqlite3"
+
+# Placed on the queue to stop the writer
+STOP = object()
+
+
+class MessageJournal:
+    @log
+    def __init__(
+        self,
+        directory: Path,
+        *,
+        retention_days: int,
+        flush_interval: float = 1.0,
+        batch_size: int = 500,
+    ):
+        self.directory = directory
+        self.retention = timedelta(days=retention_days)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.SimpleQueue()
+        self.writer = threading.Thread(
+            target=self.write_forever, name="message-journal", daemon=True
+        )
+
+    @log
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    @log
+    def close(self):
+        if self.writer.is_alive():
+            self.queue.put(STOP)
+            self.writer.join()
+
+    def record(self, message: StoredMessage):
+        """Journal a message, or a new version of one. Never blocks."""
+        self.queue.put(message)
+
+    async def get(self, message_id: int) -> Optional[StoredMessage]:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.lookup, message_id)
+
+    def segment_path(self, day: date) -> Path:
+        return self.directory / f"{SEGMENT_PREFIX}{day.isoformat()}{SEGMENT_SUFFIX}"
+
+    def segments(self) -> List[Path]:
+        """Every segment on disk, newest first."""
+        paths = self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")
+        return sorted(paths, reverse=True)
+
+    def lookup(self, message_id: int) -> Optional[StoredMessage]:
+        # Newest first, as an edit journals the message again in a newer segment
+        for path in self.segments():
+            try:
+                connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            except sqlite3.Error:
+                continue
+            try:
+                row = connection.execute(
+                    "SELECT id, channel_id, author_id, content, attachments "
+                    "FROM messages WHERE id = ?",
+                    (message_id,),
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read journal segment {path}: {e}")
+                row = None
+            finally:
+                connection.close()
+            if row is not None:
+                id_, channel_id, author_id, content, attachments = row
+                urls = tuple(attachments.split("\n")) if attachments else ()
+                return StoredMessage(id_, channel_id, author_id, content, urls)
+        return None
+
+    def open_segment(self, day: date) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.segment_path(day))
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(SCHEMA)
+        return connection
+
+    def expire_segments(self, today: date):
+        oldest = self.segment_path(today - self.retention)
+        for path in self.segments():
+            if path < oldest:
+                logger.info(f"Removing expired journal segment {path}")
+                for suffix in ("", "-wal", "-shm"):
+                    Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+    def write(self, connection: sqlite3.Connection, batch: List[StoredMessage]):
+        rows = [
+            (m.id, m.channel_id, m.author_id, m.content, "\n".join(m.attachments))
+            for m in batch
+        ]
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def write_forever(self):
+        day = date.today()
+        connection = self.open_segment(day)
+        self.expire_segments(day)
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            if date.today() != day:
+                # Fold the finished segment's WAL back in before it goes read-only
+                connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                connection.close()
+                day = date.today()
+                connection = self.open_segment(day)
+                self.expire_segments(day)
+            if batch:
+                try:
+                    self.write(connection, batch)
+                except sqlite3.Error as e:
+                    logger.exception(e)
+        connection.close()
@@ -0,0 +1,126 @@
+"""A compact, byte-budgeted store of recent messages for edit and delete logging.
+
+discord.py only keeps the last `max_messages` full `Message` objects, each of which
+drags its author, mentions, embeds and more along with it. The logging cog only needs
+a message's content and where it came from, so this keeps just that in `__slots__`
+records and bounds the store by their total size rather than by count, evicting the
+least recently used messages first.
+
+`python -m benchmarks.message_store` measures about 340 bytes per stored message
+beyond its content on CPython 3.11, against which `StoredMessage.size` overestimates
+by roughly 60 bytes. A 32 MiB budget therefore holds around 90,000 messages of
+typical length.
+"""
+
+import logging
+import sys
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from discord import Message
+
+from utils.logging import trace_func
+
+__all__ = ["StoredMessage", "MessageStore"]
+
+logger = logging.getLogger("parnassius.utils.message_store")
+log = trace_func(logger)
+
+# Estimated cost of a store entry beyond its record's own fields:
+# the OrderedDict slot and linked list node, and the key
+ENTRY_OVERHEAD = 100 + sys.getsizeof(2**63)
+
+
+class StoredMessage:
+    __slots__ = ("id", "channel_id", "author_id", "content", "attachments")
+
+    def __init__(
+        self,
+        id: int,
+        channel_id: int,
+        author_id: int,
+        content: str,
+        attachments: Tuple[str, ...] = (),
+    ):
+        self.id = id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.content = content
+        self.attachments = attachments
+
+    @classmethod
+    def from_message(cls, message: Message) -> "StoredMessage":
+        return cls(
+            message.id,
+            message.channel.id,
+            message.author.id,
+            message.content,
+            tuple(a.url for a in message.attachments),
+        )
+
+    def __repr__(self):
+        return (
+            f"<StoredMessage id={self.id} channel_id={self.channel_id} "
+            f"author_id={self.author_id}>"
+        )
+
+    @property
+    def size(self) -> int:
+        """An estimate of the bytes this record keeps alive."""
+        return (
+            sys.getsizeof(self)
+            + 3 * sys.getsizeof(self.id)
+            + sys.getsizeof(self.content)
+            + sys.getsizeof(self.attachments)
+            + sum(sys.getsizeof(a) for a in self.attachments)
+            + ENTRY_OVERHEAD
+        )
+
+
+class MessageStore:
+    @log
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.messages: "OrderedDict[int, StoredMessage]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __contains__(self, message_id: int) -> bool:
+        return message_id in self.messages
+
+    def add(self, record: StoredMessage):
+        self.pop(record.id)
+        self.messages[record.id] = record
+        self.bytes += record.size
+        while self.bytes > self.max_bytes and self.messages:
+            _, evicted = self.messages.popitem(last=False)
+            self.bytes -= evicted.size
+
+    def get(self, message_id: int) -> Optional[StoredMessage]:
+        record = self.messages.get(message_id)
+        if record is not None:
+            self.messages.move_to_end(message_id)
+        return record
+
+    def pop(self, message_id: int) -> Optional[StoredMessage]:
+        record = self.messages.pop(message_id, None)
+        if record is not None:
+            self.bytes -= record.size
+        return record
+
+    def edit(self, message_id: int, content: str) -> Optional[StoredMessage]:
+        """Replace a stored message's content, returning the previous record."""
+        previous = self.pop(message_id)
+        if previous is not None:
+            self.add(
+                StoredMessage(
+                    previous.id,
+                    previous.channel_id,
+                    previous.author_id,
+                    content,
+                    previous.attachments,
+                )
+            )
+        return previous
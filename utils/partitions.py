@@ -0,0 +1,145 @@
+"""Maintenance of the monthly partitions of `moderation_actions`.
+
+Partitioning only exists on PostgreSQL; on other databases these are no-ops.
+Partitions are named `moderation_actions_yYYYYmMM` and cover one calendar month.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator, List, Tuple
+
+from sqlalchemy import text
+
+from utils.logging import trace_func
+
+__all__ = ["Partition", "list_partitions", "ensure_partitions", "archive_partitions"]
+
+logger = logging.getLogger("parnassius.utils.partitions")
+log = trace_func(logger)
+
+TABLE = "moderation_actions"
+DEFAULT_PARTITION = f"{TABLE}_default"
+ARCHIVE = f"{TABLE}_archive"
+PARTITION_NAME = re.compile(rf"{TABLE}_y(\d{{4}})m(\d{{2}})")
+
+
+def month_start(when: datetime) -> datetime:
+    return datetime(when.year, when.month, 1)
+
+
+def next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def months(start: datetime, count: int) -> Iterator[Tuple[datetime, datetime]]:
+    month = month_start(start)
+    for _ in range(count):
+        following = next_month(month)
+        yield month, following
+        month = following
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    start: datetime
+    end: datetime
+
+    @classmethod
+    def for_month(cls, start: datetime) -> "Partition":
+        return cls(f"{TABLE}_y{start.year}m{start.month:02}", start, next_month(start))
+
+
+def is_partitioned(connection) -> bool:
+    return connection.dialect.name == "postgresql"
+
+
+@log
+def list_partitions(connection) -> List[Partition]:
+    """The monthly partitions currently attached, oldest first."""
+    if not is_partitioned(connection):
+        return []
+    names = connection.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table"
+        ),
+        {"table": TABLE},
+    ).scalars()
+    partitions = []
+    for name in names:
+        if match := PARTITION_NAME.fullmatch(name):
+            year, month = map(int, match.groups())
+            partitions.append(Partition.for_month(datetime(year, month, 1)))
+    return sorted(partitions, key=lambda p: p.start)
+
+
+@log
+def ensure_partitions(connection, months_ahead: int) -> List[Partition]:
+    """Create any missing partitions from this month to `months_ahead` months ahead.
+
+    Rows that landed in the default partition because their month had no partition
+    yet are moved into the new one.
+    """
+    if not is_partitioned(connection):
+        return []
+    existing = {p.name for p in list_partitions(connection)}
+    created = []
+    for start, _ in months(datetime.utcnow(), months_ahead + 1):
+        partition = Partition.for_month(start)
+        if partition.name in existing:
+            continue
+        bounds = {"start": partition.start, "end": partition.end}
+        in_range = "timestamp >= :start AND timestamp < :end"
+        connection.execute(
+            text(
+                "CREATE TEMPORARY TABLE moving AS "
+                f"SELECT * FROM {DEFAULT_PARTITION} WHERE {in_range}"
+            ),
+            bounds,
+        )
+        connection.execute(
+            text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}"), bounds
+        )
+        connection.execute(
+            text(
+                f"CREATE TABLE {partition.name} PARTITION OF {TABLE} "
+                "FOR VALUES FROM (:start) TO (:end)"
+            ),
+            bounds,
+        )
+        connection.execute(text(f"INSERT INTO {TABLE} SELECT * FROM moving"))
+        connection.execute(text("DROP TABLE moving"))
+        logger.info(f"Created partition {partition.name}")
+        created.append(partition)
+    return created
+
+
+@log
+def archive_partitions(connection, older_than: datetime) -> Tuple[List[Partition], int]:
+    """Move every partition ending before `older_than` into the archive table.
+
+    Returns the archived partitions and the number of rows moved.
+    """
+    if not is_partitioned(connection):
+        return [], 0
+    archived = []
+    rows = 0
+    for partition in list_partitions(connection):
+        if partition.end > older_than:
+            break
+        connection.execute(
+            text(f"ALTER TABLE {TABLE} DETACH PARTITION {partition.name}")
+        )
+        result = connection.execute(
+            text(f"INSERT INTO {ARCHIVE} SELECT * FROM {partition.name}")
+        )
+        connection.execute(text(f"DROP TABLE {partition.name}"))
+        logger.info(f"Archived partition {partition.name} ({result.rowcount} rows)")
+        archived.append(partition)
+        rows += result.rowcount
+    return archived, rows
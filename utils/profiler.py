@@ -0,0 +1,195 @@
+"""Statistical profiling of the running bot, without restarting it under a profiler.
+
+A sampling thread records the stack of every other thread at a fixed interval, while
+a task on the loop records where each asyncio task is suspended, which no thread's
+stack shows. The samples are written out in the collapsed stack format read by
+flamegraph tools, and summarised as a table of the functions seen most often.
+
+Memory is profiled by diffing two `tracemalloc` snapshots, grouped by the line that
+allocated the memory.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from time import monotonic
+from types import CodeType
+from typing import Dict, List, Tuple
+
+from utils.logging import trace_func
+
+__all__ = ["Profile", "sample", "memory_diff"]
+
+logger = logging.getLogger("parnassius.utils.profiler")
+log = trace_func(logger)
+
+Stack = Tuple[CodeType, ...]
+# Samples are labelled with paths relative to the working directory where possible
+ROOT = os.getcwd() + os.sep
+
+
+def describe(code: CodeType) -> str:
+    filename = code.co_filename
+    if filename.startswith(ROOT):
+        filename = filename[len(ROOT) :]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+@dataclass
+class Profile:
+    # Samples of each stack, outermost frame first, by root (a thread or "asyncio")
+    stacks: Counter = field(default_factory=Counter)
+    thread_samples: int = 0
+    task_samples: int = 0
+    duration: float = 0.0
+
+    def collapsed(self) -> str:
+        """The samples in the collapsed stack format, one stack per line."""
+        lines = []
+        for (root, stack), count in self.stacks.most_common():
+            frames = ";".join([root, *(describe(c).replace(";", ":") for c in stack)])
+            lines.append(f"{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def top(self, count: int) -> str:
+        """The functions seen most often, by samples in them and in what they call."""
+        own: Dict[CodeType, int] = Counter()
+        total: Dict[CodeType, int] = Counter()
+        samples = sum(self.stacks.values()) or 1
+        for (_, stack), n in self.stacks.items():
+            if not stack:
+                continue
+            own[stack[-1]] += n
+            for code in set(stack):
+                total[code] += n
+        lines = [
+            f"{self.thread_samples} thread samples and {self.task_samples} task "
+            f"samples over {self.duration:.1f}s",
+            "",
+            f"{'Own':>7} {'Total':>7}  Function",
+        ]
+        for code, n in sorted(total.items(), key=lambda i: (-own[i[0]], -i[1]))[:count]:
+            lines.append(
+                f"{own[code] / samples:7.1%} {n / samples:7.1%}  {describe(code)}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+def thread_stack(frame) -> Stack:
+    stack = []
+    while frame is not None:
+        stack.append(frame.f_code)
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def task_stack(task: asyncio.Task) -> Stack:
+    """The coroutines a task is suspended in, following what each awaits."""
+    stack = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(frame.f_code)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return tuple(stack)
+
+
+def sample_threads(
+    profile: Profile, interval: float, stop: threading.Event, names: Dict[int, str]
+):
+    me = threading.get_ident()
+    while not stop.wait(interval):
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            root = names.get(ident) or f"thread {ident}"
+            profile.stacks[(root, thread_stack(frame))] += 1
+        profile.thread_samples += 1
+
+
+@log
+async def sample(
+    seconds: float, *, interval: float = 0.01, task_interval: float = 0.05
+) -> Profile:
+    """Sample every thread and task for `seconds`."""
+    profile = Profile()
+    stop = threading.Event()
+    names = {t.ident: f"thread {t.name}" for t in threading.enumerate()}
+    sampler = threading.Thread(
+        target=sample_threads,
+        args=(profile, interval, stop, names),
+        name="profiler",
+        daemon=True,
+    )
+    current = asyncio.current_task()
+    start = monotonic()
+    sampler.start()
+    try:
+        while monotonic() - start < seconds:
+            for task in asyncio.all_tasks():
+                if task is not current:
+                    profile.stacks[("asyncio", task_stack(task))] += 1
+            profile.task_samples += 1
+            await asyncio.sleep(task_interval)
+    finally:
+        stop.set()
+        await asyncio.get_event_loop().run_in_executor(None, sampler.join)
+    profile.duration = monotonic() - start
+    return profile
+
+
+def format_memory_diff(differences: List[tracemalloc.StatisticDiff], count: int) -> str:
+    growth = sum(d.size_diff for d in differences)
+    lines = [
+        f"Net change {growth / 1024:+.1f} KiB",
+        "",
+        f"{'Change':>12} {'Size':>12} {'Blocks':>9}  Allocated at",
+    ]
+    for d in differences[:count]:
+        frame = d.traceback[0]
+        filename = frame.filename
+        if filename.startswith(ROOT):
+            filename = filename[len(ROOT) :]
+        lines.append(
+            f"{d.size_diff / 1024:+10.1f}Ki {d.size / 1024:10.1f}Ki "
+            f"{d.count_diff:+9}  {filename}:{frame.lineno}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+@log
+async def memory_diff(seconds: float, *, count: int) -> str:
+    """A table of the lines whose allocations grew most over `seconds`.
+
+    Tracing is only on while profiling, as it slows every allocation down.
+    """
+    loop = asyncio.get_event_loop()
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ]
+    try:
+        before = await loop.run_in_executor(None, tracemalloc.take_snapshot)
+        await asyncio.sleep(seconds)
+        after = await loop.run_in_executor(None, tracemalloc.take_snapshot)
+    finally:
+        if started:
+            tracemalloc.stop()
+    differences = await loop.run_in_executor(
+        None,
+        lambda: after.filter_traces(filters).compare_to(
+            before.filter_traces(filters), "lineno"
+        ),
+    )
+    return format_memory_diff(differences, count)
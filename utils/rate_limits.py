@@ -0,0 +1,90 @@
+"""The Discord rate limits discord.py's HTTP client waits out, by bucket.
+
+discord.py 1.7 reports them only in its HTTP logging, so they are read from there by
+handlers on the `discord.http` logger. Requests are rate-limited per bucket, a route's
+path with its channel or guild, so a limit on one bucket does not hold up requests in
+any other, except while the global rate limit is hit.
+"""
+
+import logging
+from time import monotonic
+from typing import Dict, NamedTuple, Optional
+
+__all__ = [
+    "RateLimit",
+    "RateLimits",
+    "add_http_handler",
+    "bucket",
+    "parse_record",
+    "remove_http_handler",
+]
+
+# Messages discord.py logs on waiting out a rate limit, as of 1.7
+BUCKET_EXHAUSTED = "A rate limit bucket has been exhausted (bucket: %s, retry: %s)."
+RATE_LIMITED = (
+    "We are being rate limited. Retrying in %.2f seconds. "
+    'Handled under the bucket "%s"'
+)
+GLOBAL_RATE_LIMITED = "Global rate limit has been hit. Retrying in %.2f seconds."
+
+http_logger = logging.getLogger("discord.http")
+
+
+class RateLimit(NamedTuple):
+    # "exhausted", "429" or "global"
+    cause: str
+    # None for the global rate limit
+    bucket: Optional[str]
+    wait: float
+
+
+def bucket(path: str, *, guild_id: int = None, channel_id: int = None) -> str:
+    """The bucket of requests to `path`, as discord.py 1.7's `Route.bucket` has it."""
+    return f"{channel_id}:{guild_id}:{path}"
+
+
+def parse_record(record: logging.LogRecord) -> Optional[RateLimit]:
+    if record.msg == BUCKET_EXHAUSTED:
+        return RateLimit("exhausted", record.args[0], float(record.args[1]))
+    if record.msg == RATE_LIMITED:
+        return RateLimit("429", record.args[1], float(record.args[0]))
+    if record.msg == GLOBAL_RATE_LIMITED:
+        return RateLimit("global", None, float(record.args[0]))
+    return None
+
+
+def add_http_handler(handler: logging.Handler):
+    # Bucket exhaustion is only logged at DEBUG. Records from discord.http are not
+    # written anywhere else, as the root handler only takes parnassius's own.
+    http_logger.setLevel(logging.DEBUG)
+    http_logger.addHandler(handler)
+
+
+def remove_http_handler(handler: logging.Handler):
+    http_logger.removeHandler(handler)
+    if not http_logger.handlers:
+        http_logger.setLevel(logging.NOTSET)
+
+
+class RateLimits(logging.Handler):
+    """Until when each bucket is rate-limited, from discord.py's HTTP logging."""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        # Monotonic times, of buckets still limited when last pruned
+        self.until: Dict[Optional[str], float] = {}
+
+    def emit(self, record: logging.LogRecord):
+        if (limit := parse_record(record)) is None:
+            return
+        now = monotonic()
+        # Every channel logged to has a bucket of its own, so only live ones are kept
+        self.until = {key: until for key, until in self.until.items() if until > now}
+        self.until[limit.bucket] = max(
+            self.until.get(limit.bucket, 0.0), now + limit.wait
+        )
+
+    def remaining(self, bucket: str) -> float:
+        """Seconds until requests in the bucket are no longer held by a rate limit."""
+        until = max(self.until.get(bucket, 0.0), self.until.get(None, 0.0))
+        return max(0.0, until - monotonic())
@@ -0,0 +1,90 @@
+"""Timing of the bot's start, from the first import to being ready.
+
+While profiling, every import statement that loads new modules is timed, both in
+total and excluding the imports it made in turn, along with the loading of each
+extension and the wait to connect. The report is logged once the bot is ready.
+"""
+
+import builtins
+import importlib.util
+import sys
+import threading
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+__all__ = ["StartupProfile"]
+
+
+@dataclass
+class ImportTime:
+    total: float = 0.0
+    own: float = 0.0
+
+
+@dataclass
+class StartupProfile:
+    started: float = field(default_factory=perf_counter)
+    imports: Dict[str, ImportTime] = field(default_factory=dict)
+    phases: List[Tuple[str, float]] = field(default_factory=list)
+    extensions: List[Tuple[str, float]] = field(default_factory=list)
+    # The time spent in the imports each enclosing import made, innermost last
+    _children: List[float] = field(default_factory=list)
+    _original_import: Optional[object] = None
+    _thread: Optional[int] = None
+    _phase_started: float = 0.0
+
+    def install(self):
+        """Time every import made on this thread from now on."""
+        self._original_import = builtins.__import__
+        self._thread = threading.get_ident()
+        builtins.__import__ = self._timed_import
+        self._phase_started = perf_counter()
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if threading.get_ident() != self._thread:
+            return self._original_import(name, globals, locals, fromlist, level)
+        loaded = len(sys.modules)
+        self._children.append(0.0)
+        start = perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = perf_counter() - start
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += elapsed
+            if len(sys.modules) > loaded:
+                if level:
+                    package = (globals or {}).get("__package__") or ""
+                    name = importlib.util.resolve_name("." * level + name, package)
+                timing = self.imports.setdefault(name, ImportTime())
+                timing.total += elapsed
+                timing.own += elapsed - children
+
+    def phase(self, name: str):
+        """Mark the end of a phase of starting, timed from the end of the last."""
+        now = perf_counter()
+        self.phases.append((name, now - self._phase_started))
+        self._phase_started = now
+
+    def extension(self, name: str, seconds: float):
+        self.extensions.append((name, seconds))
+
+    def report(self, count: int = 20) -> str:
+        lines = [f"Started in {perf_counter() - self.started:.3f}s", ""]
+        lines += [f"{seconds:8.3f}s  {name}" for name, seconds in self.phases]
+        lines += ["", "Extensions:"]
+        lines += [f"{seconds:8.3f}s  {name}" for name, seconds in self.extensions]
+        lines += ["", f"Slowest imports:\n{'Own':>9} {'Total':>9}  Module"]
+        slowest = sorted(self.imports.items(), key=lambda i: -i[1].own)[:count]
+        lines += [
+            f"{timing.own:8.3f}s {timing.total:8.3f}s  {name}"
+            for name, timing in slowest
+        ]
+        return "\n".join(lines)
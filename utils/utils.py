@@ -1,9 +1,11 @@
 import logging
+import re
+from typing import AsyncIterable, AsyncIterator, Iterable, List, Tuple
 
-from utils.logging import log_func
+from utils.logging import trace_func
 
 logger = logging.getLogger("parnassius.utils.utils")
-log = log_func(logger)
+log = trace_func(logger)
 
 
 @log
@@ -23,3 +25,58 @@ def format_list_of_members(members, /, *, ping=True):
     else:
         el = [str(member) for member in members]
     return comma_separate(el)
+
+
+# A Discord ID, alone or in a mention
+SNOWFLAKE = re.compile(r"<@!?(\d{15,20})>|(?<!\d)(\d{15,20})(?!\d)")
+SNOWFLAKE_BYTES = re.compile(rb"(?<!\d)\d{15,20}(?!\d)")
+DIGITS = b"0123456789"
+
+
+@log
+def find_snowflakes(text: str, /) -> Tuple[List[int], str]:
+    """The IDs in some text, and the text without them."""
+    ids = [int(a or b) for a, b in SNOWFLAKE.findall(text)]
+    return ids, " ".join(SNOWFLAKE.sub(" ", text).split())
+
+
+async def iter_snowflakes(chunks: AsyncIterable[bytes], /) -> AsyncIterator[int]:
+    """The IDs in a stream of text, however it is split into chunks."""
+    carry = b""
+    # Whether the chunk continues a run of digits too long to be an ID
+    overlong = False
+    async for chunk in chunks:
+        if overlong:
+            chunk = chunk.lstrip(DIGITS)
+            overlong = not chunk
+        data = carry + chunk
+        # Digits at the end may carry on into the next chunk
+        complete = data.rstrip(DIGITS)
+        carry = data[len(complete) :]
+        if len(carry) > 20:
+            complete, carry, overlong = data, b"", True
+        for match in SNOWFLAKE_BYTES.finditer(complete):
+            yield int(match[0])
+    for match in SNOWFLAKE_BYTES.finditer(carry):
+        yield int(match[0])
+
+
+@log
+def chunk_lines(lines: Iterable[str], /, *, limit: int = 2000) -> List[str]:
+    """Join lines into as few messages as fit within Discord's length limit."""
+    messages, current = [], ""
+    for line in lines:
+        while len(line) > limit:
+            if current:
+                messages.append(current)
+                current = ""
+            messages.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            messages.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        messages.append(current)
+    return messages